@@ -1,18 +1,37 @@
 # app.py
-from opensky_api import OpenSkyApi
-
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, Response, stream_with_context
 import sqlite3
+import math
 import os
+import time
 from dotenv import load_dotenv
-import bcrypt
 import google.generativeai as genai  # Import the Google Generative AI library
-import base64  # For encoding/decoding hashed passwords
 import json  # For parsing JSON responses
+from datetime import date
 
 # Import Amadeus Client and ResponseError
 from amadeus import Client, ResponseError
 
+import bookings
+import db
+import flight_search
+import gemini
+import jobs
+import live_flights
+import metrics
+import offers
+import recommendations
+import rollups
+import search_log
+import search_results
+import status_hub
+import tracks
+import upstream
+import user_stats
+from cache import SingleFlightCache
+from db import get_db
+from passwords import HashQueueFull, hasher
+
 # Configure Logging (Optional but Recommended)
 import logging
 
@@ -25,23 +44,73 @@ load_dotenv()
 app = Flask(__name__)
 app.secret_key = os.getenv('SECRET_KEY')  # Securely load SECRET_KEY
 
-# Configure Google Generative AI with your API key
+# Pooled, request-scoped SQLite connections (see db.py)
+db.init_app(app)
+
+# Per-route latency, SQL, upstream and render timings, served on /metrics
+metrics.init_app(app)
+
+# Background jobs: OpenSky ingestion into live_flights, search result pruning
+jobs.init_app(app)
+live_flights.init_app(app)
+search_results.init_app(app)
+
+# Configure Google Generative AI with your API key and create the shared model
 genai.configure(api_key=os.getenv("API_KEY"))
+gemini.init_app(app)
 
 # Initialize Amadeus API Client
 amadeus = Client(
     client_id=os.getenv('AMADEUS_CLIENT_ID'),
     client_secret=os.getenv('AMADEUS_CLIENT_SECRET'),
-    hostname='test'  # Use 'production' for the production environment
+    hostname='test',  # Use 'production' for the production environment
+    http=upstream.amadeus_transport  # Keep-alive connection pool instead of a new connection per call
 )
 
-# Initialize Database (Assuming you have an init_db function)
-import sqlite3
+# Cache of Amadeus flight offers; identical concurrent searches share one upstream call
+offer_cache = SingleFlightCache(
+    ttl=int(os.getenv('OFFER_CACHE_TTL', '300')),
+    maxsize=int(os.getenv('OFFER_CACHE_SIZE', '512')),
+)
+metrics.Stats('offer_cache', "Amadeus flight offer cache", offer_cache.stats,
+              counters=('hits', 'misses', 'refreshes', 'coalesced', 'errors', 'evictions', 'load_count',
+                        'load_seconds_total'))
+
+def _offer_search(origin, destination, departure_date, adults, max_results):
+    """Cache key and loader of one flight offer search."""
+    key = (origin, destination, departure_date, adults, max_results)
+    return key, lambda: offers.parse_offers(upstream.amadeus.call(
+        amadeus.shopping.flight_offers_search.get,
+        originLocationCode=origin,
+        destinationLocationCode=destination,
+        departureDate=departure_date,
+        adults=adults,
+        max=max_results
+    ).data)
+
+def search_flight_offers(origin, destination, departure_date, adults=1, max_results=10):
+    """
+    Returns the parsed flight offers (offers.Offer) for a search, served from `offer_cache` when possible.
+    """
+    return offer_cache.get_or_load(*_offer_search(origin, destination, departure_date, adults, max_results))
+
+def prewarm_flight_offers(origin, destination, departure_date, adults=1, max_results=10):
+    """Reload a search into `offer_cache` with a full TTL, whether or not it is still cached."""
+    return offer_cache.refresh(*_offer_search(origin, destination, departure_date, adults, max_results))
 
+# Rank popular searches and keep the hottest routes warm in offer_cache: each run reloads them
+# before they expire, as long as POPULAR_ROUTES_INTERVAL is shorter than OFFER_CACHE_TTL
+search_log.init_app(app, prewarm=prewarm_flight_offers)
+
+# Initialize Database
 def init_db():
-    # Connect to SQLite and enable foreign key support
-    conn = sqlite3.connect('database.db')
-    conn.execute("PRAGMA foreign_keys = ON;")
+    # Borrow a pooled connection (foreign keys and WAL are already enabled)
+    with db.pool.connection() as conn:
+        _create_tables(conn)
+        # Apply any schema migrations (indexes etc.) this database hasn't seen yet
+        db.migrate(conn)
+
+def _create_tables(conn):
     c = conn.cursor()
 
     # Create users table
@@ -82,115 +151,52 @@ def init_db():
         )
     ''')
 
-    # Commit changes and close the connection
-    conn.commit()
-    conn.close()
-
-# Call the init_db function to ensure tables are created when the app starts
-init_db()
-
-
-# Call the init_db function to ensure tables are created
-init_db()
-
-def get_recommendations(username):
-    """
-    Fetches the user's booked flights and preferences, then generates flight recommendations using the Gemini API.
-    Returns a list of recommended flights.
-    """
-    # Fetch booked flights
-    conn = sqlite3.connect('database.db')
-    conn.execute("PRAGMA foreign_keys = ON;")
-    c = conn.cursor()
+    # Create live_flights table (latest OpenSky state per aircraft)
     c.execute('''
-        SELECT flight_id, booking_price, origin, destination, departure_time, arrival_time, airline, flight_number
-        FROM bookings
-        WHERE username = ?
-    ''', (username,))
-    booked_flights = c.fetchall()
+        CREATE TABLE IF NOT EXISTS live_flights (
+            flight_id TEXT PRIMARY KEY,
+            airline TEXT,
+            flight_number TEXT,
+            origin TEXT,
+            destination TEXT,
+            departure_time TEXT,
+            arrival_time TEXT,
+            status TEXT,
+            last_updated TIMESTAMP,
+            callsign TEXT,
+            origin_country TEXT,
+            longitude REAL,
+            latitude REAL,
+            baro_altitude REAL,
+            velocity REAL,
+            heading REAL,
+            vertical_rate REAL,
+            squawk TEXT,
+            spi INTEGER,
+            on_ground BOOLEAN
+        )
+    ''')
 
-    # Fetch user preferences
+    # Create search_logs table
     c.execute('''
-        SELECT preferences
-        FROM users
-        WHERE username = ?
-    ''', (username,))
-    preferences_result = c.fetchone()
-    preferences = preferences_result[0] if preferences_result and preferences_result[0] else ''
-
-    conn.close()
-
-    # Format booked flights into a readable string
-    if booked_flights:
-        booked_flights_str = "\n".join([
-            f"Flight {flight[6]} {flight[7]} from {flight[2]} to {flight[3]} on {flight[4]}"
-            for flight in booked_flights
-        ])
-    else:
-        booked_flights_str = "No booked flights."
-
-    # Create a prompt for the Gemini API
-    prompt = f"""
-Based on the user's booked flights and preferences, recommend some flights for them.
-
-User's Booked Flights:
-{booked_flights_str}
-
-User's Preferences:
-{preferences}
-
-Please provide a list of 3 recommended flights in the following JSON format:
-
-[
-    {{
-        "Flight ID": "FL123",
-        "Airline": "Airline Name",
-        "Flight Number": "Flight Number",
-        "Origin": "Origin Airport (IATA Code)",
-        "Destination": "Destination Airport (IATA Code)",
-        "Departure Time": "mm/dd/yyyy HH:MM AM/PM",
-        "Arrival Time": "mm/dd/yyyy HH:MM AM/PM",
-        "Price": "$XXX"
-    }},
-    ...
-]
-"""
-
-    try:
-        # Initialize the Generative Model
-        model = genai.GenerativeModel("gemini-1.5-flash")
-
-        # Generate a response from the AI
-        response = model.generate_content(prompt)
-
-        # Extract the text from the response
-        recommendations_text = response.text.strip()
-
-        # Parse the recommendations_text into JSON
-        start = recommendations_text.find('[')
-        end = recommendations_text.rfind(']') + 1
-        if start == -1 or end == -1:
-            raise ValueError("AI did not return a valid JSON array.")
-
-        recommendations_json = recommendations_text[start:end]
+        CREATE TABLE IF NOT EXISTS search_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT,
+            origin TEXT,
+            destination TEXT,
+            departure_date TEXT,
+            search_time TIMESTAMP
+        )
+    ''')
 
-        # Load the JSON data
-        recommendations = json.loads(recommendations_json)
+    # Commit changes
+    conn.commit()
 
-        # Validate the structure of each recommended flight
-        valid_recommendations = []
-        for flight in recommendations:
-            required_keys = ["Flight ID", "Airline", "Flight Number", "Origin", "Destination", "Departure Time", "Arrival Time", "Price"]
-            if all(key in flight for key in required_keys):
-                valid_recommendations.append(flight)
-            else:
-                logger.warning(f"Incomplete flight data: {flight}")
+# Call the init_db function to ensure tables are created when the app starts
+init_db()
 
-        return valid_recommendations
-
-    except Exception as e:
-        logger.error(f"Error generating recommendations: {e}")
-        return []
+# Track history retention and vacuuming (needs the tables above)
+tracks.init_app(app)
 
 # Home Route
 @app.route('/')
@@ -214,12 +220,14 @@ def register():
             flash('Passwords do not match.', 'danger')
             return render_template('register.html')
         
-        # Hash the password
-        hashed = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
-        hashed_base64 = base64.b64encode(hashed).decode('utf-8')  # Encode to base64 string
+        # Hash the password on the bounded hashing pool (base64 string)
+        try:
+            hashed_base64 = hasher.hash_password(password)
+        except HashQueueFull:
+            flash('The server is busy. Please try again in a moment.', 'warning')
+            return render_template('register.html'), 429
         
-        conn = sqlite3.connect('database.db')
-        conn.execute("PRAGMA foreign_keys = ON;")
+        conn = get_db()
         c = conn.cursor()
         try:
             c.execute("INSERT INTO users (username, password) VALUES (?, ?)", (username, hashed_base64))
@@ -227,12 +235,12 @@ def register():
             flash('Registration successful! You can now log in.', 'success')
             return redirect(url_for('login'))
         except sqlite3.IntegrityError:
+            conn.rollback()
             flash('Username already exists. Please choose a different one.', 'danger')
         except Exception as e:
+            conn.rollback()
             flash('An unexpected error occurred during registration. Please try again.', 'danger')
             logger.error(f"Registration Error: {e}")
-        finally:
-            conn.close()
     
     return render_template('register.html')
 
@@ -249,22 +257,24 @@ def login():
             return render_template('login.html')
         
         # Verify credentials from the database
-        conn = sqlite3.connect('database.db')
-        conn.execute("PRAGMA foreign_keys = ON;")
-        c = conn.cursor()
+        c = get_db().cursor()
         c.execute("SELECT password FROM users WHERE username=?", (username,))
         user = c.fetchone()
-        conn.close()
         
         if user:
             try:
-                # Decode the stored hashed password from base64 string to bytes
-                stored_hashed = base64.b64decode(user[0].encode('utf-8'))
+                # Check the password on the bounded hashing pool
+                matches, needs_rehash = hasher.verify_password(password, user[0])
                 
-                if bcrypt.checkpw(password.encode('utf-8'), stored_hashed):
+                if matches:
+                    if needs_rehash:
+                        rehash_password(username, password)
                     session['user'] = username  # Store the username in session
                     flash('Login successful!', 'success')
                     return redirect(url_for('dashboard'))
+            except HashQueueFull:
+                flash('The server is busy. Please try again in a moment.', 'warning')
+                return render_template('login.html'), 429
             except Exception as e:
                 flash('An error occurred during login. Please try again.', 'danger')
                 logger.error(f"Login Error: {e}")
@@ -273,6 +283,21 @@ def login():
     
     return render_template('login.html')
 
+def rehash_password(username, password):
+    """
+    Re-hash a password with the current work factor after a successful login.
+    Best effort: if the hashing pool is busy it is simply retried next login.
+    """
+    try:
+        conn = get_db()
+        conn.execute("UPDATE users SET password=? WHERE username=?", (hasher.hash_password(password), username))
+        conn.commit()
+    except HashQueueFull:
+        pass
+    except sqlite3.Error as e:
+        get_db().rollback()
+        logger.error(f"Rehash Error: {e}")
+
 # Dashboard Route
 @app.route('/dashboard')
 def dashboard():
@@ -285,21 +310,8 @@ def dashboard():
 
 # Calculate user savings
 def calculate_savings(username):
-    conn = sqlite3.connect('database.db')
-    conn.execute("PRAGMA foreign_keys = ON;")
-    c = conn.cursor()
-    standard_price = 500
-    c.execute("SELECT SUM(booking_price) FROM bookings WHERE username=?", (username,))
-    result = c.fetchone()
-    if result and result[0] is not None:
-        user_spending = result[0]
-        c.execute("SELECT COUNT(*) FROM bookings WHERE username=?", (username,))
-        num_bookings = c.fetchone()[0]
-        savings = (standard_price * num_bookings) - user_spending
-    else:
-        savings = 0
-    conn.close()
-    return savings
+    # Served from the incrementally maintained user_stats row
+    return user_stats.get_stats(get_db(), username)['savings']
 
 # Search Flights Route
 @app.route('/search_flights', methods=['GET', 'POST'])
@@ -310,98 +322,178 @@ def search_flights():
 
     if request.method == 'POST':
         origin = request.form.get('origin', '').upper().strip()
-        destination = request.form.get('destination', '').upper().strip()
+        destinations = flight_search.parse_destinations(request.form.get('destination', ''))
         departure_date = request.form.get('departure_date')
+        flex_days = request.form.get('flex_days', 0, type=int)
 
         # Validate inputs
-        if not origin or not destination or not departure_date:
+        if not origin or not destinations or not departure_date:
             flash("Please provide all required fields.", "warning")
-            return render_template('search_flights.html')
+            return render_template('search_flights.html', max_flex_days=flight_search.MAX_FLEX_DAYS)
+
+        # Buffered; written to search_logs in the background
+        for destination in destinations:
+            search_log.log_search(session['user'], origin, destination, departure_date)
 
         try:
-            # Use Amadeus API to search for flights
-            response = amadeus.shopping.flight_offers_search.get(
-                originLocationCode=origin,
-                destinationLocationCode=destination,
-                departureDate=departure_date,
-                adults=1,
-                max=10
-            )
+            if len(destinations) == 1 and not flex_days:
+                # Use Amadeus API to search for flights (cached, already parsed)
+                flights = search_flight_offers(origin, destinations[0], departure_date)
+            else:
+                # Flexible search without JavaScript: wait for every query, then rank
+                queries = flight_search.expand_queries(origin, destinations, departure_date, flex_days)
+                flights, errors = flight_search.search_all(queries, search_flight_offers)
+                if errors:
+                    flash(f"{len(errors)} of {len(queries)} searches failed; showing the rest.", "warning")
 
-            flight_data = response.data
-            flights = []
-            for offer in flight_data:
-                flight = {
-                    'flight_id': offer['id'],
-                    'price': offer['price']['total'],
-                }
-
-                # Extract details from the first segment
-                if offer['itineraries'] and offer['itineraries'][0]['segments']:
-                    first_segment = offer['itineraries'][0]['segments'][0]
-                    flight['airline'] = first_segment['carrierCode']
-                    flight['flight_number'] = first_segment['carrierCode'] + first_segment['number']
-                    flight['origin'] = first_segment['departure']['iataCode']
-                    flight['destination'] = first_segment['arrival']['iataCode']
-                    flight['departure_time'] = first_segment['departure']['at']
-                    flight['arrival_time'] = first_segment['arrival']['at']
-                else:
-                    # Handle cases with no segments
-                    flight['airline'] = "N/A"
-                    flight['flight_number'] = "N/A"
-                    flight['origin'] = "N/A"
-                    flight['destination'] = "N/A"
-                    flight['departure_time'] = "N/A"
-                    flight['arrival_time'] = "N/A"
-
-                flights.append(flight)
-
-            # Store flights in session
-            session['flights'] = flights
-
-            return render_template('search_flights.html', flights=flights)
+            # Store flights server-side; the session only carries the search id
+            session.pop('flights', None)
+            session['search_id'] = search_results.save_results(get_db(), session['user'], flights)
+
+            return render_template('search_flights.html', flights=flights,
+                                   max_flex_days=flight_search.MAX_FLEX_DAYS)
 
         except ResponseError as error:
             flash(f"An error occurred while searching for flights: {error}", "danger")
+        except upstream.UpstreamUnavailable:
+            flash("Flight search is temporarily unavailable. Please try again shortly.", "warning")
+        except ValueError as e:
+            flash(f"Invalid search: {e}", "warning")
         except Exception as e:
             flash(f"An unexpected error occurred: {e}", "danger")
 
     else:
-        # GET request: generate recommendations
-        recommendations = get_recommendations(session['user'])
-        return render_template('search_flights.html', recommendations=recommendations)
-from opensky_api import OpenSkyApi
+        # GET request: render right away; recommendations are generated in the background
+        # and fetched from /api/recommendations unless they are already cached
+        cached = recommendations.get_cached(session['user'])
+        return render_template('search_flights.html', recommendations=cached,
+                               recommendations_pending=cached is None,
+                               max_flex_days=flight_search.MAX_FLEX_DAYS)
+
+    return render_template('search_flights.html', max_flex_days=flight_search.MAX_FLEX_DAYS)
+
+# Flexible Search Route (server-sent events, one event per completed query)
+@app.route('/search_flights/stream')
+def search_flights_stream():
+    if 'user' not in session:
+        return jsonify({'error': "Please log in first."}), 403
+
+    origin = request.args.get('origin', '').upper().strip()
+    destinations = flight_search.parse_destinations(request.args.get('destination', ''))
+    departure_date = request.args.get('departure_date', '')
+    flex_days = request.args.get('flex_days', 0, type=int)
+    if not origin or not destinations or not departure_date:
+        return jsonify({'error': "Please provide all required fields."}), 400
+    try:
+        queries = flight_search.expand_queries(origin, destinations, departure_date, flex_days)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    username = session['user']
+    for destination in destinations:
+        search_log.log_search(username, origin, destination, departure_date)
+
+    # Set before streaming starts so the session cookie carries it; each batch is saved under it
+    search_id = search_results.new_search_id()
+    session.pop('flights', None)
+    session['search_id'] = search_id
+
+    def events():
+        found = failed = 0
+        for query, flights, error in flight_search.fan_out(queries, search_flight_offers):
+            _, destination, day = query
+            if error is not None:
+                failed += 1
+                payload = {'destination': destination, 'departure_date': day, 'error': str(error)}
+                yield f"event: failed\ndata: {json.dumps(payload)}\n\n"
+                continue
+            with db.pool.connection() as conn:
+                search_results.save_results(conn, username, flights, search_id=search_id)
+            found += len(flights)
+            payload = {'destination': destination, 'departure_date': day,
+                       'flights': [offer.summary() for offer in flight_search.rank(flights)]}
+            yield f"event: results\ndata: {json.dumps(payload)}\n\n"
+        summary = {'queries': len(queries), 'failed': failed, 'flights': found, 'search_id': search_id}
+        yield f"event: done\ndata: {json.dumps(summary)}\n\n"
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# Recommendations Route (JSON, polled by search_flights.html)
+@app.route('/api/recommendations')
+def recommendations_status():
+    if 'user' not in session:
+        return jsonify({'error': "Please log in first."}), 403
+
+    result = recommendations.request_recommendations(session['user'])
+    if result is None:
+        return jsonify({'status': 'pending'}), 202
+    return jsonify({'status': 'ready', 'recommendations': result})
 
 @app.route('/analytics')
 def analytics():
-    conn = sqlite3.connect('database.db')
-    c = conn.cursor()
-
-    # Query to get booking counts per flight
-    c.execute("SELECT flight_id, COUNT(*) FROM bookings GROUP BY flight_id")
-    booking_data = c.fetchall()
-
-    # Query to get coupon usage counts
-    c.execute("SELECT coupon_code, COUNT(*) FROM coupons GROUP BY coupon_code")
-    coupon_data = c.fetchall()
+    if 'user' not in session:
+        flash("Please log in first.", "warning")
+        return redirect(url_for('login'))
 
-    conn.close()
-    return render_template('analytics.html', bookings=booking_data, coupons=coupon_data)
+    window = request.args.get('window', 'all')
+    if window not in rollups.WINDOWS:
+        window = 'all'
+    conn = get_db()
+
+    # Everything comes from the precomputed rollups, never the bookings/coupons tables
+    booking_data = [(key, count) for key, count, _ in rollups.top(conn, 'flight', window)]
+    coupon_data = [(key, count) for key, count, _ in rollups.top(conn, 'coupon', window)]
+    return render_template('analytics.html', bookings=booking_data, coupons=coupon_data,
+                           routes=rollups.top(conn, 'route', window),
+                           airlines=rollups.top(conn, 'airline', window),
+                           days=rollups.per_day(conn, window),
+                           window=window, windows=list(rollups.WINDOWS))
+
+# Analytics Rollups Route (JSON)
+@app.route('/api/analytics')
+def analytics_api():
+    if 'user' not in session:
+        return jsonify({'error': "Please log in first."}), 403
+
+    dimension = request.args.get('dimension', 'flight')
+    window = request.args.get('window', 'all')
+    limit = min(request.args.get('limit', 20, type=int), 500)
+    if dimension not in rollups.DIMENSIONS or window not in rollups.WINDOWS:
+        return jsonify({'error': f"dimension must be one of {list(rollups.DIMENSIONS)} "
+                                 f"and window one of {list(rollups.WINDOWS)}."}), 400
+
+    rows = rollups.top(get_db(), dimension, window, limit)
+    return jsonify({
+        'dimension': dimension,
+        'window': window,
+        'rows': [{'key': key, 'count': count, 'amount': amount} for key, count, amount in rows],
+    })
+
+# Flight Track Route (JSON): positions for a callsign or icao24 over a time window
+@app.route('/api/tracks/<string:flight>')
+def flight_track(flight):
+    if 'user' not in session:
+        return jsonify({'error': "Please log in first."}), 403
 
+    until = request.args.get('until', int(time.time()), type=int)
+    since = request.args.get('since', until - 3600, type=int)
+    if since > until or until - since > tracks.RETENTION_HOURS * 3600:
+        return jsonify({'error': f"The window must be at most {tracks.RETENTION_HOURS:g} hours."}), 400
 
+    conn = get_db()
+    icao24 = tracks.resolve_icao24(conn, flight)
+    if icao24 is None:
+        return jsonify({'error': "Unknown flight."}), 404
+    columns = ('ts', 'latitude', 'longitude', 'altitude', 'velocity', 'heading', 'on_ground')
+    points = [dict(zip(columns, row)) for row in tracks.get_track(conn, icao24, since, until)]
+    return jsonify({'icao24': icao24, 'since': since, 'until': until, 'points': points})
 
 @app.route('/flight_details/<string:flight_number>')
 def flight_details(flight_number):
-    api = OpenSkyApi()  # Initialize OpenSky API (no authentication needed)
-
     try:
-        # Fetch all available flight states
-        states = api.get_states()
-
-        # Filter the flight by matching the flight number with the callsign
-        flight_data = next(
-            (s for s in states.states if s.callsign and flight_number in s.callsign.strip()), None
-        )
+        # Look the flight up in the locally cached live state (refreshed in the background)
+        flight_data = live_flights.state_cache.lookup(flight_number)
 
         if flight_data:
             # If live data is available, render it
@@ -410,8 +502,7 @@ def flight_details(flight_number):
             )
 
         # If no live data is found, fetch the flight details from the database
-        conn = sqlite3.connect('database.db')
-        c = conn.cursor()
+        c = get_db().cursor()
         c.execute(
             '''
             SELECT airline, flight_number, origin, destination, departure_time, arrival_time, booking_price
@@ -419,7 +510,6 @@ def flight_details(flight_number):
             ''', (flight_number,)
         )
         saved_flight = c.fetchone()
-        conn.close()
 
         if saved_flight:
             return render_template(
@@ -448,46 +538,88 @@ def book_flight():
         flash("Invalid flight data.", "warning")
         return redirect(url_for('search_flights'))
     
-    # Retrieve flights from session
-    flights = session.get('flights', [])
-    
-    # Find the flight with the matching flight_id
-    flight_data = next((flight for flight in flights if flight['flight_id'] == flight_id), None)
+    # Look the offer up in the stored results of the user's last search
+    search_id = session.get('search_id')
+    flight_data = search_results.get_offer(get_db(), search_id, session['user'], flight_id) if search_id else None
     
     if not flight_data:
         flash("Flight data not found. Please search again.", "warning")
         return redirect(url_for('search_flights'))
     
-    # Extract flight details
-    airline = flight_data.get('airline', "N/A")
-    flight_number = flight_data.get('flight_number', "N/A")
-    origin = flight_data.get('origin', "N/A")
-    destination = flight_data.get('destination', "N/A")
-    departure_time = flight_data.get('departure_time', "N/A")
-    arrival_time = flight_data.get('arrival_time', "N/A")
-    price = flight_data.get('price', "N/A")
+    # The same offer from the same search is booked at most once (double clicks, resubmits)
+    idempotency_key = request.form.get('idempotency_key') or f"{search_id}:{flight_id}"
     
     # Save booking to the database
-    conn = sqlite3.connect('database.db')
-    conn.execute("PRAGMA foreign_keys = ON;")
-    c = conn.cursor()
     try:
-        c.execute('''
-            INSERT INTO bookings (
-                username, flight_id, booking_price, origin, destination, departure_time, arrival_time, airline, flight_number
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            session['user'], flight_id, float(price), origin, destination, departure_time, arrival_time, airline, flight_number
-        ))
-        conn.commit()
-        flash('Flight booked successfully!', 'success')
+        [(_, _, created)] = bookings.create_bookings(get_db(), session['user'], [(idempotency_key, flight_data)])
+        if created:
+            recommendations.invalidate(session['user'])
+            flash('Flight booked successfully!', 'success')
+        else:
+            flash('This flight is already booked.', 'info')
+    except bookings.InvalidOffer as e:
+        flash(f"This flight cannot be booked: {e} Please search again.", 'danger')
     except sqlite3.Error as e:
         flash(f"An error occurred while booking the flight: {e}", 'danger')
-    finally:
-        conn.close()
     
     return redirect(url_for('dashboard'))
 
+# Bulk Booking Route (JSON)
+@app.route('/api/bookings/bulk', methods=['POST'])
+def bulk_book_flights():
+    """
+    Book several offers in one transaction. Body:
+    {"bookings": [{"flight_id": "...", "search_id": "...", "idempotency_key": "..."}, ...]}
+    search_id defaults to the session's last search; idempotency_key is optional
+    but makes the request safe to retry.
+    """
+    if 'user' not in session:
+        return jsonify({'error': "Please log in first."}), 403
+
+    payload = request.get_json(silent=True)
+    items = payload.get('bookings') if isinstance(payload, dict) else None
+    if not isinstance(items, list) or not items or not all(isinstance(item, dict) for item in items):
+        return jsonify({'error': "Expected a JSON object with a non-empty 'bookings' list."}), 400
+    if len(items) > bookings.BULK_LIMIT:
+        return jsonify({'error': f"At most {bookings.BULK_LIMIT} bookings per request."}), 413
+
+    username = session['user']
+    conn = get_db()
+    results = [None] * len(items)
+    requests_to_book, positions = [], []
+    for i, item in enumerate(items):
+        search_id = item.get('search_id') or session.get('search_id')
+        flight_id = item.get('flight_id')
+        offer = search_results.get_offer(conn, search_id, username, str(flight_id)) if search_id and flight_id else None
+        if offer is None:
+            results[i] = {'flight_id': flight_id, 'idempotency_key': item.get('idempotency_key'),
+                          'status': 'not_found', 'error': "Flight data not found. Please search again."}
+            continue
+        try:
+            bookings.validate(offer)
+        except bookings.InvalidOffer as e:
+            results[i] = {'flight_id': flight_id, 'idempotency_key': item.get('idempotency_key'),
+                          'status': 'invalid', 'error': str(e)}
+            continue
+        key = item.get('idempotency_key')
+        requests_to_book.append((str(key) if key is not None else None, offer))
+        positions.append(i)
+
+    if requests_to_book:
+        try:
+            booked = bookings.create_bookings(conn, username, requests_to_book)
+        except sqlite3.Error as e:
+            logger.error(f"Error in bulk booking: {e}")
+            return jsonify({'error': "The bookings could not be saved; nothing was booked."}), 500
+        for i, (offer_request, (key, booking_id, created)) in zip(positions, zip(requests_to_book, booked)):
+            results[i] = {'flight_id': offer_request[1].flight_id, 'idempotency_key': key,
+                          'booking_id': booking_id, 'status': 'created' if created else 'duplicate'}
+
+    created = sum(1 for result in results if result['status'] == 'created')
+    if created:
+        recommendations.invalidate(username)
+    return jsonify({'created': created, 'results': results}), 201 if created else 200
+
 # Show Booked Flights Route
 @app.route('/show_booked_flights')
 def show_booked_flights():
@@ -496,79 +628,82 @@ def show_booked_flights():
         return redirect(url_for('login'))
 
     try:
-        conn = sqlite3.connect('database.db')
-        c = conn.cursor()
+        c = get_db().cursor()
 
-        # Fetch user's non-cancelled flights
+        # Fetch user's non-cancelled flights with their latest live status (if available):
+        # one covering-index lookup on the normalized callsign per booking
         c.execute('''
-            SELECT id, airline, flight_number, origin, destination, 
-                   departure_time, arrival_time, booking_price
-            FROM bookings
-            WHERE username = ? AND cancelled = 0
+            SELECT b.id, b.airline, b.flight_number, b.origin, b.destination,
+                   b.departure_time, b.arrival_time, b.booking_price,
+                   (SELECT l.status FROM live_flights l
+                    WHERE l.callsign = upper(replace(b.flight_number, ' ', ''))
+                    ORDER BY l.last_updated DESC LIMIT 1) AS status
+            FROM bookings b
+            WHERE b.username = ? AND b.cancelled = 0
+            ORDER BY b.departure_time
         ''', (session['user'],))
         flights = c.fetchall()
 
-        # Fetch live flight statuses (if available)
-        c.execute('SELECT flight_id, status FROM live_flights')
-        live_data = c.fetchall()
-
-        # Create a dictionary from the live flight data
-        live_flights = {flight_id: status for flight_id, status in live_data}
-
-        conn.close()
-
-        # Pass flights and live_flights to the template
-        return render_template('show_booked_flights.html', flights=flights, live_flights=live_flights)
+        return render_template('show_booked_flights.html', flights=flights)
 
     except Exception as e:
         flash(f"An error occurred while fetching booked flights: {e}", "danger")
         logger.exception(f"Error in /show_booked_flights route: {e}")
         return redirect(url_for('dashboard'))
 
-def fetch_live_flight_statuses():
-    """
-    Fetch live flight statuses from OpenSky API and update the live_flights table.
-    """
-    logger.info("Fetching live flight statuses from OpenSky API.")
-    try:
-        # Retrieve flight states from OpenSky API
-        states = opensky_api.get_states()
-        logger.info(f"Retrieved {len(states.states)} flight states from OpenSky.")
-
-        # Connect to the database
-        conn = sqlite3.connect('database.db')
-        c = conn.cursor()
+# Booked Flight Status Route (server-sent events, pushed as the ingestion job sees changes)
+@app.route('/api/booked_flights/stream')
+def booked_flights_stream():
+    if 'user' not in session:
+        return jsonify({'error': "Please log in first."}), 403
 
-        # Update live_flights table with status data
-        for s in states.states:
-            flight_id = s.icao24  # This is the flight's unique ID from OpenSky
-            status = "On Ground" if s.on_ground else "In Air"
-            last_updated = datetime.utcnow()
-
-            # Insert or replace data into the live_flights table
-            c.execute('''
-                INSERT OR REPLACE INTO live_flights (
-                    flight_id, airline, flight_number, origin, destination,
-                    departure_time, arrival_time, status, last_updated
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                flight_id, s.origin_country, s.callsign.strip() if s.callsign else "N/A",
-                "N/A", "N/A", "N/A", "N/A", status, last_updated
-            ))
+    # Callsigns of the user's active bookings, read once per stream ('N/A' = offer without a flight number)
+    callsigns = [row[0] for row in get_db().execute('''
+        SELECT DISTINCT upper(replace(flight_number, ' ', ''))
+        FROM bookings
+        WHERE username = ? AND cancelled = 0 AND flight_number != 'N/A'
+    ''', (session['user'],))]
+    flight = request.args.get('flight')
+    if flight:
+        callsigns = [callsign for callsign in callsigns if callsign == live_flights.normalize_callsign(flight)]
+    if not callsigns:
+        return jsonify({'error': "No active bookings to follow."}), 404
+
+    # Start from the cached snapshot; flights it does not track keep the status the page rendered
+    current = {}
+    for callsign in callsigns:
+        state = live_flights.state_cache.lookup(callsign)
+        if state is not None:
+            current[callsign] = state
+    try:
+        subscription = status_hub.hub.subscribe(callsigns, current=current.values())
+    except status_hub.HubFull as e:
+        return jsonify({'error': str(e)}), 503
+
+    def events():
+        snapshot = {callsign: status_hub.status_fields(state) for callsign, state in current.items()}
+        yield f"event: snapshot\ndata: {json.dumps(snapshot)}\n\n"
+        deadline = time.monotonic() + status_hub.STREAM_SECONDS
+        while time.monotonic() < deadline and not subscription.closed:
+            changes = subscription.get(timeout=status_hub.KEEPALIVE_SECONDS)
+            if changes:
+                yield f"event: status\ndata: {json.dumps(changes)}\n\n"
+            else:
+                yield ": keep-alive\n\n"
 
-        conn.commit()
-        logger.info("Live flights data updated successfully.")
-        conn.close()
-    except Exception as e:
-        logger.exception(f"Error fetching live flight statuses: {e}")
+    # No request context in the generator: the pooled connection goes back when the view returns
+    response = Response(events(), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # Also runs when the client disconnects before the generator has started
+    response.call_on_close(lambda: status_hub.hub.unsubscribe(subscription))
+    return response
 
 # Profile Route
 @app.route('/profile', methods=['GET', 'POST'])
 def profile():
     if 'user' in session:
         username = session['user']
-        conn = sqlite3.connect('database.db')
-        conn.execute("PRAGMA foreign_keys = ON;")
+        conn = get_db()
         c = conn.cursor()
 
         # Retrieve user preferences
@@ -576,31 +711,22 @@ def profile():
         result = c.fetchone()
         preferences = result[0] if result and result[0] else ''
 
-        # Fetch analytics data for the user
-        # Get flight booking counts for the user
-        c.execute("SELECT flight_id, COUNT(*) FROM bookings WHERE username=? GROUP BY flight_id", (username,))
-        booking_data = c.fetchall()
-
-        # Get coupon usage data for the user
-        c.execute("SELECT coupon_code, COUNT(*) FROM coupons WHERE username=? GROUP BY coupon_code", (username,))
-        coupon_data = c.fetchall()
-
-        conn.close()
+        # Fetch analytics data for the user (flight booking and coupon usage counts)
+        stats = user_stats.get_stats(conn, username)
+        booking_data = stats['flight_counts']
+        coupon_data = stats['coupon_counts']
 
         if request.method == 'POST':
             new_preferences = request.form.get('preferences', '').strip()
             # Save the updated preferences
             try:
-                conn = sqlite3.connect('database.db')
-                conn.execute("PRAGMA foreign_keys = ON;")
-                c = conn.cursor()
                 c.execute("UPDATE users SET preferences=? WHERE username=?", (new_preferences, username))
                 conn.commit()
+                recommendations.invalidate(username)
                 flash('Preferences updated successfully!', 'success')
             except sqlite3.Error as e:
+                conn.rollback()
                 flash(f"An error occurred while updating preferences: {e}", 'danger')
-            finally:
-                conn.close()
             return redirect(url_for('profile'))
 
         return render_template('profile.html', username=username, preferences=preferences,
@@ -609,24 +735,60 @@ def profile():
         flash('Please log in first.', 'warning')
         return redirect(url_for('login'))
 
-def get_flights_in_area(min_lat, max_lat, min_lon, max_lon):
-    api = OpenSkyApi()
+def get_flights_in_area(min_lat, max_lat, min_lon, max_lon, min_altitude=None, max_altitude=None,
+                        min_velocity=None, max_velocity=None):
+    """
+    Flights inside a bounding box, answered from the local live-state snapshot
+    instead of an OpenSky round-trip.
+    """
+    states = live_flights.state_cache.in_area(
+        min_lat, max_lat, min_lon, max_lon,
+        min_altitude=min_altitude, max_altitude=max_altitude,
+        min_velocity=min_velocity, max_velocity=max_velocity,
+    )
+    return [{
+        'icao24': s.icao24,
+        'airline': s.callsign,
+        'origin': s.origin_country,
+        'longitude': s.longitude,
+        'latitude': s.latitude,
+        'altitude': s.baro_altitude,
+        'velocity': s.velocity,
+        'heading': s.true_track,
+        'on_ground': s.on_ground,
+    } for s in states]
+
+# Flights In Area Route (JSON, for map views)
+@app.route('/api/flights_in_area')
+def flights_in_area():
+    if 'user' not in session:
+        return jsonify({'error': "Please log in first."}), 403
+
     try:
-        states = api.get_states(bbox=(min_lat, max_lat, min_lon, max_lon))
-        flights = []
-        for s in states.states:
-            flights.append({
-                'airline': s.callsign,
-                'origin': s.origin_country,
-                'longitude': s.longitude,
-                'latitude': s.latitude,
-                'altitude': s.baro_altitude,
-                'velocity': s.velocity
-            })
-        return flights
-    except Exception as e:
-        print(f"Error retrieving flight data: {e}")
-        return []
+        bbox = [float(request.args[key]) for key in ('min_lat', 'max_lat', 'min_lon', 'max_lon')]
+        filters = {
+            key: request.args.get(key, type=float)
+            for key in ('min_altitude', 'max_altitude', 'min_velocity', 'max_velocity')
+        }
+        limit = min(request.args.get('limit', 100, type=int), 1000)
+        offset = max(request.args.get('offset', 0, type=int), 0)
+    except (KeyError, ValueError):
+        return jsonify({'error': "min_lat, max_lat, min_lon and max_lon must be numbers."}), 400
+
+    # float() accepts "nan" and "inf"; out-of-range finite bounds are clamped by in_area
+    if not all(map(math.isfinite, bbox + [value for value in filters.values() if value is not None])):
+        return jsonify({'error': "Bounds and filters must be finite numbers."}), 400
+
+    if bbox[0] > bbox[1]:
+        return jsonify({'error': "min_lat must not be greater than max_lat."}), 400
+
+    flights = get_flights_in_area(*bbox, **filters)
+    return jsonify({
+        'total': len(flights),
+        'offset': offset,
+        'limit': limit,
+        'flights': flights[offset:offset + limit],
+    })
 
 # Add Coupon Route
 @app.route('/add_coupon', methods=['GET', 'POST'])
@@ -651,18 +813,19 @@ def add_coupon():
             return render_template('add_coupon.html')
         
         # Save coupon to the database associated with the current user
-        conn = sqlite3.connect('database.db')
-        conn.execute("PRAGMA foreign_keys = ON;")
+        conn = get_db()
         c = conn.cursor()
         try:
-            c.execute("INSERT INTO coupons (username, coupon_code, discount) VALUES (?, ?, ?)", 
-                      (session['user'], coupon_code, discount))
+            created_at = rollups.now_timestamp()
+            c.execute("INSERT INTO coupons (username, coupon_code, discount, created_at) VALUES (?, ?, ?, ?)", 
+                      (session['user'], coupon_code, discount, created_at))
+            user_stats.record_coupon(conn, session['user'], coupon_code, discount)
+            rollups.record_coupon(conn, created_at, coupon_code, discount)
             conn.commit()
             flash('Coupon added successfully!', 'success')
         except sqlite3.Error as e:
+            conn.rollback()
             flash(f"An error occurred while adding the coupon: {e}", "danger")
-        finally:
-            conn.close()
         
         return redirect(url_for('add_coupon'))
     
@@ -675,20 +838,90 @@ def cancel_flight(flight_id):
         flash("Please log in first.", "warning")
         return redirect(url_for('login'))
 
-    conn = sqlite3.connect('database.db')
+    conn = get_db()
     c = conn.cursor()
     try:
-        # Delete the selected flight
-        c.execute('DELETE FROM bookings WHERE id = ?', (flight_id,))
+        # Mark the user's own active booking cancelled (kept for rebooking) and take it out of the stats
+        c.execute('''
+            UPDATE bookings SET cancelled = 1, cancelled_at = ?
+            WHERE id = ? AND username = ? AND cancelled = 0
+            RETURNING flight_id, booking_price, booked_at, origin, destination, airline, flight_number
+        ''', (rollups.now_timestamp(), flight_id, session['user']))
+        booking = c.fetchone()
+        if booking is None:
+            conn.rollback()
+            flash("Booking not found.", "warning")
+            return redirect(url_for('rebook_flights'))
+        booking_flight_id, booking_price, booked_at, origin, destination, airline, flight_number = booking
+        user_stats.record_cancellation(conn, session['user'], booking_flight_id, booking_price)
+        rollups.record_cancellation(conn, booked_at, origin, destination, airline, flight_number, booking_price)
         conn.commit()
-        flash('Flight canceled successfully! Please rebook a new flight.', 'success')
+        recommendations.invalidate(session['user'])
+        flash('Flight canceled successfully! Choose a new flight below.', 'success')
     except sqlite3.Error as e:
+        conn.rollback()
         flash(f"An error occurred while canceling the flight: {e}", 'danger')
-    finally:
-        conn.close()
+        return redirect(url_for('rebook_flights'))
 
-    # Redirect to the search flights page after cancellation
-    return redirect(url_for('search_flights'))
+    # Go straight to alternatives on the same route and date
+    return redirect(url_for('rebook_flight', booking_id=flight_id))
+
+# Rebook Flight Route (alternatives for one cancelled booking)
+@app.route('/rebook_flight/<int:booking_id>', methods=['GET', 'POST'])
+def rebook_flight(booking_id):
+    if 'user' not in session:
+        flash("Please log in first.", "warning")
+        return redirect(url_for('login'))
+
+    username = session['user']
+    conn = get_db()
+
+    # Only the user's own cancelled bookings can be rebooked
+    cancelled = conn.execute(
+        "SELECT origin, destination, departure_time FROM bookings WHERE id = ? AND username = ? AND cancelled = 1",
+        (booking_id, username)
+    ).fetchone()
+    if cancelled is None:
+        flash("Cancelled booking not found.", "warning")
+        return redirect(url_for('rebook_flights'))
+
+    if request.method == 'POST':
+        new_flight_id = request.form.get('new_flight_id')
+        search_id = session.get('search_id')
+        offer = search_results.get_offer(conn, search_id, username, new_flight_id) if search_id and new_flight_id else None
+        if offer is None:
+            flash("Flight data not found. Please choose again.", "warning")
+            return redirect(url_for('rebook_flight', booking_id=booking_id))
+        try:
+            # One replacement per cancelled booking, however often the form is submitted
+            [(_, _, created)] = bookings.create_bookings(conn, username, [(f"rebook:{booking_id}", offer)])
+        except bookings.InvalidOffer as e:
+            flash(f"This flight cannot be booked: {e} Please choose again.", 'danger')
+            return redirect(url_for('rebook_flight', booking_id=booking_id))
+        except sqlite3.Error as e:
+            flash(f"An error occurred while booking the flight: {e}", 'danger')
+            return redirect(url_for('rebook_flight', booking_id=booking_id))
+        if created:
+            recommendations.invalidate(username)
+            flash('Flight rebooked successfully!', 'success')
+        else:
+            flash('This cancellation has already been rebooked.', 'info')
+        return redirect(url_for('show_booked_flights'))
+
+    origin, destination, departure_time = cancelled
+    departure_date = (departure_time or '')[:10]
+    try:
+        if departure_date < date.today().isoformat():
+            raise ValueError("the original departure date has passed")
+        # Usually served from offer_cache: popular routes are kept warm
+        alternatives = flight_search.rank(search_flight_offers(origin, destination, departure_date))
+    except (ValueError, ResponseError, upstream.UpstreamError) as e:
+        flash(f"No alternatives could be found automatically ({e}). Please search again.", "warning")
+        return redirect(url_for('search_flights'))
+
+    session.pop('flights', None)
+    session['search_id'] = search_results.save_results(conn, username, alternatives)
+    return render_template('change_flight.html', alternatives=alternatives)
 
 # Rebook Flights Route
 @app.route('/rebook_flights', methods=['GET', 'POST'])
@@ -697,18 +930,17 @@ def rebook_flights():
         flash("Please log in first.", "warning")
         return redirect(url_for('login'))
 
-    conn = sqlite3.connect('database.db')
-    c = conn.cursor()
+    c = get_db().cursor()
 
-    # Fetch the user's booked flights
+    # Fetch the user's active booked flights (served by the partial idx_bookings_active index)
     c.execute('''
         SELECT id, airline, flight_number, origin, destination, 
                departure_time, arrival_time, booking_price
         FROM bookings
-        WHERE username = ?
+        WHERE username = ? AND cancelled = 0
+        ORDER BY departure_time
     ''', (session['user'],))
     flights = c.fetchall()
-    conn.close()
 
     return render_template('rebook_flights.html', flights=flights)
 
@@ -716,17 +948,40 @@ def rebook_flights():
 @app.route('/show_coupons')
 def show_coupons():
     if 'user' in session:
-        conn = sqlite3.connect('database.db')
-        conn.execute("PRAGMA foreign_keys = ON;")
-        c = conn.cursor()
+        c = get_db().cursor()
         c.execute("SELECT coupon_code, discount FROM coupons WHERE username=?", (session['user'],))
         coupons = c.fetchall()
-        conn.close()
         return render_template('show_coupons.html', coupons=coupons)
     else:
         flash("Please log in first.", "warning")
         return redirect(url_for('login'))
 
+# Offer Cache Stats Route (monitoring)
+@app.route('/api/offer_cache_stats')
+def offer_cache_stats():
+    if 'user' not in session:
+        return jsonify({'error': "Please log in first."}), 403
+    return jsonify(offer_cache.stats())
+
+# Upstream Stats Route
+@app.route('/api/upstream_stats')
+def upstream_stats():
+    if 'user' not in session:
+        return jsonify({'error': "Please log in first."}), 403
+    return jsonify(upstream.snapshot())
+
+# Status Stream Stats Route
+@app.route('/api/status_hub_stats')
+def status_hub_stats():
+    if 'user' not in session:
+        return jsonify({'error': "Please log in first."}), 403
+    return jsonify(status_hub.hub.stats)
+
+# Metrics Route (Prometheus text format)
+@app.route('/metrics')
+def prometheus_metrics():
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
 # Logout Route
 @app.route('/logout')
 def logout():
@@ -755,14 +1010,8 @@ def get_response():
         return jsonify({'response': "Please enter a message."}), 400
     
     try:
-        # Initialize the Generative Model
-        model = genai.GenerativeModel("gemini-1.5-flash")
-        
-        # Generate a response from the AI
-        response = model.generate_content(user_message)
-        
-        # Extract the text from the response
-        bot_response = response.text
+        # Reply within the user's ongoing conversation (shared model, cached FAQ answers)
+        bot_response = gemini.reply(session['user'], user_message)
         
         # Log the conversation (Optional)
         logger.info(f"User: {user_message}")
@@ -775,5 +1024,31 @@ def get_response():
     
     return jsonify({'response': bot_response})
 
+# Streaming AI Chatbot Response Route (server-sent events)
+@app.route('/get_response/stream', methods=['POST'])
+def get_response_stream():
+    if 'user' not in session:
+        return jsonify({'response': "Please log in to use the chatbot."}), 403
+
+    user_message = request.form.get('message', '').strip()
+
+    if not user_message:
+        return jsonify({'response': "Please enter a message."}), 400
+
+    username = session['user']
+
+    def events():
+        try:
+            for text in gemini.stream_reply(username, user_message):
+                yield f"data: {json.dumps({'text': text})}\n\n"
+        except Exception as e:
+            logger.error(f"Error streaming from Gemini API: {e}")
+            apology = {'text': "I'm sorry, I can't assist with that right now."}
+            yield f"event: error\ndata: {json.dumps(apology)}\n\n"
+        yield "event: done\ndata: {}\n\n"
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
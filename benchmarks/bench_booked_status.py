@@ -0,0 +1,133 @@
+# benchmarks/bench_booked_status.py
+"""
+Cost of looking up live statuses for /show_booked_flights.
+
+"before" is the old approach: load every live_flights row into a dict on each
+page view. "after" is the indexed join on the normalized callsign restricted
+to the user's active bookings. Reports latency and peak Python memory per
+lookup, plus /show_booked_flights req/s. live_flights is topped up to
+`--live` rows; runs against a throwaway copy of database.db.
+
+    python benchmarks/bench_booked_status.py --live 15600 --bookings 20
+"""
+import argparse
+import os
+import random
+import shutil
+import string
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def seed(conn, username, live, bookings):
+    conn.execute("INSERT OR IGNORE INTO users (username, password) VALUES (?, ?)", (username, 'x'))
+    missing = live - conn.execute("SELECT COUNT(*) FROM live_flights").fetchone()[0]
+    conn.executemany(
+        "INSERT OR IGNORE INTO live_flights (flight_id, flight_number, callsign, status, last_updated) "
+        "VALUES (?, ?, ?, ?, datetime('now'))",
+        [
+            (f"b{i:05x}", callsign, callsign, random.choice(("In Air", "On Ground")))
+            for i, callsign in enumerate(
+                ''.join(random.choices(string.ascii_uppercase, k=3)) + str(random.randint(1, 9999))
+                for _ in range(max(missing, 0))
+            )
+        ]
+    )
+    # Half of the bookings are flights that are currently tracked
+    tracked = [row[0] for row in conn.execute(
+        "SELECT callsign FROM live_flights WHERE callsign != 'N/A' LIMIT ?", (bookings // 2,))]
+    flight_numbers = tracked + [f"ZZ{i}" for i in range(bookings - len(tracked))]
+    conn.executemany('''
+        INSERT INTO bookings (
+            username, flight_id, booking_price, origin, destination, departure_time, arrival_time, airline, flight_number
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', [
+        (username, str(i), 300.0, 'DEL', 'BOM', '2024-11-01T10:00:00', '2024-11-01T12:00:00', 'AI', flight_number)
+        for i, flight_number in enumerate(flight_numbers)
+    ])
+    conn.commit()
+
+
+def before(conn, username):
+    flights = conn.execute(
+        "SELECT id, airline, flight_number, origin, destination, departure_time, arrival_time, booking_price "
+        "FROM bookings WHERE username = ? AND cancelled = 0", (username,)).fetchall()
+    live_flights = {flight_id: status for flight_id, status in conn.execute(
+        "SELECT flight_id, status FROM live_flights")}
+    return flights, live_flights
+
+
+def after(conn, username):
+    return conn.execute('''
+        SELECT b.id, b.airline, b.flight_number, b.origin, b.destination,
+               b.departure_time, b.arrival_time, b.booking_price,
+               (SELECT l.status FROM live_flights l
+                WHERE l.callsign = upper(replace(b.flight_number, ' ', ''))
+                ORDER BY l.last_updated DESC LIMIT 1) AS status
+        FROM bookings b
+        WHERE b.username = ? AND b.cancelled = 0
+        ORDER BY b.departure_time
+    ''', (username,)).fetchall()
+
+
+def measure(func, conn, username, repeat):
+    func(conn, username)  # warm up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(conn, username)
+    elapsed = (time.perf_counter() - start) / repeat
+    tracemalloc.start()
+    func(conn, username)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--live', type=int, default=15600, help="live_flights rows")
+    parser.add_argument('--bookings', type=int, default=20, help="active bookings for the user")
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.environ['DATABASE'] = os.path.join(workdir, 'database.db')
+    os.environ['LIVE_FLIGHTS_INGEST'] = '0'
+    os.environ['BACKGROUND_JOBS'] = '0'
+    shutil.copy(os.path.join(ROOT, 'database.db'), os.environ['DATABASE'])
+
+    import app as flask_app
+    from db import pool
+
+    with pool.connection() as conn:
+        seed(conn, 'bench', args.live, args.bookings)
+        live = conn.execute("SELECT COUNT(*) FROM live_flights").fetchone()[0]
+        statuses = sum(1 for row in after(conn, 'bench') if row[8])
+        print(f"{live} live_flights rows, {args.bookings} bookings ({statuses} with a live status)")
+        print(f"{'':<8}{'ms/lookup':>12}{'peak KiB':>12}")
+        results = {}
+        for label, func in (('before', before), ('after', after)):
+            results[label] = measure(func, conn, 'bench', args.repeat)
+            print(f"{label:<8}{results[label][0] * 1000:>12.3f}{results[label][1] / 1024:>12.1f}")
+        print(f"speedup {results['before'][0] / results['after'][0]:.0f}x, "
+              f"memory {results['before'][1] / max(results['after'][1], 1):.0f}x less")
+
+    client = flask_app.app.test_client()
+    with client.session_transaction() as sess:
+        sess['user'] = 'bench'
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        assert client.get('/show_booked_flights').status_code == 200
+    print(f"/show_booked_flights: {args.repeat / (time.perf_counter() - start):.0f} req/s")
+
+    pool.close_all()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+# benchmarks/bench_db.py
+"""
+Requests/sec for /dashboard and /show_booked_flights with and without the
+connection pool.
+
+"before" reproduces the old connect-per-request code exactly: a plain
+`sqlite3.connect` with only `foreign_keys` on, against the database in its
+original rollback-journal mode. "after" reuses pooled connections with the
+pool's PRAGMAs (WAL, page cache, mmap, ...). Runs against a throwaway copy
+of database.db so the real file is never touched.
+
+    python benchmarks/bench_db.py --requests 2000 --bookings 200
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+ROUTES = ('/dashboard', '/show_booked_flights')
+
+
+def seed(conn, username, bookings):
+    conn.execute("INSERT OR IGNORE INTO users (username, password) VALUES (?, ?)", (username, 'x'))
+    conn.executemany('''
+        INSERT INTO bookings (
+            username, flight_id, booking_price, origin, destination, departure_time, arrival_time, airline, flight_number
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', [
+        (username, str(i), 300.0 + i % 200, 'DEL', 'BOM', '2024-11-01T10:00:00', '2024-11-01T12:00:00', 'AI', f'AI{i}')
+        for i in range(bookings)
+    ])
+    conn.commit()
+
+
+def baseline_open(path):
+    """The connection every request opened before the pool existed."""
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA foreign_keys = ON;")
+    return conn
+
+
+def use_baseline(pool, enabled):
+    """Switch the pool between the old per-request connect and its own pooled connections."""
+    pool.configure(size=0 if enabled else 8)
+    if enabled:
+        pool._open = lambda: baseline_open(pool.path)
+    else:
+        pool.__dict__.pop('_open', None)
+    # journal_mode is stored in the database file, so put it back the way each version had it
+    with sqlite3.connect(pool.path) as conn:
+        conn.execute(f"PRAGMA journal_mode = {'DELETE' if enabled else 'WAL'}")
+
+
+def run(client, route, requests):
+    start = time.perf_counter()
+    for _ in range(requests):
+        response = client.get(route)
+        assert response.status_code == 200, (route, response.status_code)
+    return requests / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--bookings', type=int, default=100)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.environ['DATABASE'] = os.path.join(workdir, 'database.db')
+    os.environ['LIVE_FLIGHTS_INGEST'] = '0'
+    os.environ['BACKGROUND_JOBS'] = '0'
+    shutil.copy(os.path.join(ROOT, 'database.db'), os.environ['DATABASE'])
+
+    import app as flask_app
+    from db import pool
+
+    with pool.connection() as conn:
+        seed(conn, 'bench', args.bookings)
+
+    client = flask_app.app.test_client()
+    with client.session_transaction() as sess:
+        sess['user'] = 'bench'
+
+    print(f"{'route':<22}{'before req/s':>14}{'after req/s':>14}{'speedup':>10}")
+    for route in ROUTES:
+        results = {}
+        for label, baseline in (('before', True), ('after', False)):
+            use_baseline(pool, baseline)
+            run(client, route, min(50, args.requests))  # warm up
+            results[label] = run(client, route, args.requests)
+        print(f"{route:<22}{results['before']:>14.0f}{results['after']:>14.0f}"
+              f"{results['after'] / results['before']:>9.2f}x")
+
+    pool.close_all()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,273 @@
+# benchmarks/bench_load.py
+"""
+Load test of the main routes against offline Amadeus, OpenSky and Gemini.
+
+Starts the app in a child process on a throwaway copy of database.db, with
+the stand-ins from benchmarks/fakes.py in place of the real services and
+OpenSky ingestion running, and serves it with the threaded werkzeug server.
+Each virtual user logs in and then repeats a journey over HTTP until the
+level's time is up:
+
+    login, dashboard, search_flights, book_flight (one of the results),
+    show_booked_flights, analytics, get_response
+
+Reports p50/p95/p99 latency and requests/sec per route and concurrency
+level. `--save` writes the results as a baseline and `--baseline` compares
+a run with one.
+
+    python benchmarks/bench_load.py --concurrency 1 8 32 --duration 30
+    python benchmarks/bench_load.py --save baseline.json
+    python benchmarks/bench_load.py --baseline baseline.json
+"""
+import argparse
+import json
+import os
+import random
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+ROUTES = ('login', 'dashboard', 'search_flights', 'book_flight', 'show_booked_flights', 'analytics', 'get_response')
+
+SEARCHES = (('DEL', 'BOM'), ('DEL', 'GOI'), ('BOM', 'BLR'), ('BLR', 'DEL'), ('JFK', 'LAX'), ('LHR', 'CDG'))
+
+MESSAGES = ("Can I change my flight?", "What is the baggage allowance?", "When does check-in open?")
+
+PASSWORD = 'bench-password'
+
+_RESULT = re.compile(r'name="flight_id" value="([^"]+)">\s*<input type="hidden" name="price" value="([^"]+)"')
+
+
+def serve(args):
+    """Child process: seed users, install the fakes and serve the app until killed."""
+    from werkzeug.serving import make_server
+
+    import app as flask_app
+    import fakes
+    from db import pool
+    from passwords import hasher
+
+    states = None
+    if args.opensky_file:
+        with open(args.opensky_file) as f:
+            states = json.load(f)
+    fakes.install(flask_app, args.amadeus_latency, args.opensky_latency, args.gemini_latency,
+                  opensky_states=states, aircraft=args.aircraft)
+
+    password = hasher.hash_password(PASSWORD)
+    with pool.connection() as conn:
+        conn.executemany("INSERT OR REPLACE INTO users (username, password) VALUES (?, ?)",
+                         [(f"bench{i}", password) for i in range(max(args.concurrency))])
+        conn.commit()
+
+    make_server('127.0.0.1', args.serve, flask_app.app, threaded=True).serve_forever()
+
+
+def start_server(args, workdir):
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+    env = dict(
+        os.environ,
+        DATABASE=os.path.join(workdir, 'database.db'),
+        LIVE_FLIGHTS_INGEST='1',
+        LIVE_FLIGHTS_INTERVAL=str(args.ingest_interval),
+        BCRYPT_ROUNDS=str(args.rounds),
+    )
+    for name in ('SECRET_KEY', 'AMADEUS_CLIENT_ID', 'AMADEUS_CLIENT_SECRET', 'API_KEY'):
+        env.setdefault(name, 'bench')
+    command = [sys.executable, os.path.abspath(__file__), '--serve', str(port)] + sys.argv[1:]
+    server = subprocess.Popen(command, env=env, cwd=ROOT, stderr=None if args.verbose else subprocess.DEVNULL)
+
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise SystemExit("The app exited during startup (run with --verbose to see why).")
+        try:
+            requests.get(url + '/login', timeout=1)
+            return server, url
+        except requests.ConnectionError:
+            time.sleep(0.2)
+    server.kill()
+    raise SystemExit("The app did not start within 120s.")
+
+
+class VirtualUser:
+    def __init__(self, url, username, routes, record):
+        self.url = url
+        self.username = username
+        self.routes = routes
+        self.record = record
+        self.http = requests.Session()
+
+    def request(self, route, method, path, expected, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = self.http.request(method, self.url + path, allow_redirects=False, timeout=60, **kwargs)
+            ok = response.status_code in expected
+        except requests.RequestException:
+            response, ok = None, False
+        if route in self.routes and self.record:
+            self.record(route, time.perf_counter() - start, ok)
+        return response if ok else None
+
+    def login(self):
+        return self.request('login', 'POST', '/login', (302,),
+                            data={'username': self.username, 'password': PASSWORD})
+
+    def journey(self):
+        if 'login' in self.routes:
+            self.login()
+        if 'dashboard' in self.routes:
+            self.request('dashboard', 'GET', '/dashboard', (200,))
+        if 'search_flights' in self.routes or 'book_flight' in self.routes:
+            origin, destination = random.choice(SEARCHES)
+            departure_date = (date.today() + timedelta(days=random.randint(7, 21))).isoformat()
+            response = self.request('search_flights', 'POST', '/search_flights', (200,), data={
+                'origin': origin, 'destination': destination, 'departure_date': departure_date,
+            })
+            results = _RESULT.findall(response.text.partition('Search Results')[2]) if response else []
+            if results and 'book_flight' in self.routes:
+                flight_id, price = random.choice(results)
+                self.request('book_flight', 'POST', '/book_flight', (302,),
+                             data={'flight_id': flight_id, 'price': price})
+        if 'show_booked_flights' in self.routes:
+            self.request('show_booked_flights', 'GET', '/show_booked_flights', (200,))
+        if 'analytics' in self.routes:
+            self.request('analytics', 'GET', '/analytics', (200,))
+        if 'get_response' in self.routes:
+            self.request('get_response', 'POST', '/get_response', (200,),
+                         data={'message': random.choice(MESSAGES)})
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+def run_level(url, concurrency, duration, routes):
+    latencies = {route: [] for route in ROUTES}
+    errors = dict.fromkeys(ROUTES, 0)
+    lock = threading.Lock()
+
+    def record(route, seconds, ok):
+        with lock:
+            if ok:
+                latencies[route].append(seconds)
+            else:
+                errors[route] += 1
+
+    users = [VirtualUser(url, f"bench{i}", routes, None) for i in range(concurrency)]
+    for user in users:
+        user.login()
+        user.record = record
+    stop = time.monotonic() + duration
+
+    def worker(user):
+        while time.monotonic() < stop:
+            user.journey()
+
+    threads = [threading.Thread(target=worker, args=(user,)) for user in users]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+
+    results = {}
+    for route in routes:
+        values = sorted(latencies[route])
+        results[route] = {
+            'requests': len(values),
+            'errors': errors[route],
+            'rps': len(values) / wall,
+            'p50_ms': percentile(values, 0.50) * 1000,
+            'p95_ms': percentile(values, 0.95) * 1000,
+            'p99_ms': percentile(values, 0.99) * 1000,
+        }
+    total = sum(len(latencies[route]) for route in routes)
+    results['total'] = {'requests': total, 'errors': sum(errors[route] for route in routes), 'rps': total / wall}
+    return results
+
+
+def report(level, results, baseline=None):
+    print(f"\nconcurrency {level}")
+    print(f"{'route':<22}{'req':>7}{'err':>6}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for route, result in results.items():
+        if route == 'total':
+            continue
+        line = (f"{route:<22}{result['requests']:>7}{result['errors']:>6}{result['rps']:>9.1f}"
+                f"{result['p50_ms']:>9.1f}{result['p95_ms']:>9.1f}{result['p99_ms']:>9.1f}")
+        before = (baseline or {}).get(route)
+        if before and before['p95_ms'] and before['rps']:
+            line += (f"   p95 {(result['p95_ms'] / before['p95_ms'] - 1) * 100:+.0f}%,"
+                     f" req/s {(result['rps'] / before['rps'] - 1) * 100:+.0f}%")
+        print(line)
+    total = results['total']
+    print(f"{'total':<22}{total['requests']:>7}{total['errors']:>6}{total['rps']:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32], help="virtual users per level")
+    parser.add_argument('--duration', type=float, default=30, help="seconds per level")
+    parser.add_argument('--routes', nargs='+', choices=ROUTES, default=list(ROUTES),
+                        help="routes in the journey (book_flight also runs the search it books from)")
+    parser.add_argument('--amadeus-latency', type=float, default=0.4, help="seconds per flight offer search")
+    parser.add_argument('--opensky-latency', type=float, default=1.5, help="seconds per state vector fetch")
+    parser.add_argument('--gemini-latency', type=float, default=0.8, help="seconds to the first chunk of a reply")
+    parser.add_argument('--opensky-file', help="recorded /states/all response (default: synthetic)")
+    parser.add_argument('--aircraft', type=int, default=15000, help="synthetic OpenSky snapshot size")
+    parser.add_argument('--ingest-interval', type=int, default=60, help="seconds between OpenSky ingestions")
+    parser.add_argument('--rounds', type=int, default=12, help="bcrypt work factor")
+    parser.add_argument('--save', metavar='PATH', help="write the results as a baseline")
+    parser.add_argument('--baseline', metavar='PATH', help="compare with a saved baseline")
+    parser.add_argument('--verbose', action='store_true', help="show the app's log")
+    parser.add_argument('--serve', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['levels']
+
+    workdir = tempfile.mkdtemp()
+    shutil.copy(os.path.join(ROOT, 'database.db'), os.path.join(workdir, 'database.db'))
+    server, url = start_server(args, workdir)
+    levels = {}
+    try:
+        print(f"{os.cpu_count()} CPUs, {args.duration:.0f}s per level, latency amadeus={args.amadeus_latency}s "
+              f"opensky={args.opensky_latency}s gemini={args.gemini_latency}s, bcrypt rounds={args.rounds}")
+        for level in args.concurrency:
+            levels[str(level)] = run_level(url, level, args.duration, args.routes)
+            report(level, levels[str(level)], baseline.get(str(level)))
+    finally:
+        server.terminate()
+        server.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'args': {k: v for k, v in vars(args).items() if k not in ('save', 'baseline', 'serve')},
+                       'levels': levels}, f, indent=2)
+        print(f"\nBaseline written to {args.save}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+# benchmarks/bench_login.py
+"""
+Login throughput at increasing concurrency.
+
+Each level runs `--logins` POST /login requests spread over N client threads
+and reports successful logins/sec, 429 rejections and p95 latency. Runs
+against a throwaway copy of database.db.
+
+    python benchmarks/bench_login.py --levels 1 4 16 64 --rounds 12
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def run_level(flask_app, concurrency, logins):
+    latencies = []
+    statuses = []
+    lock = threading.Lock()
+    per_thread = max(1, logins // concurrency)
+
+    def worker():
+        client = flask_app.test_client()
+        for _ in range(per_thread):
+            start = time.perf_counter()
+            response = client.post('/login', data={'username': 'bench', 'password': 'bench-password'})
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                statuses.append(response.status_code)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+
+    latencies.sort()
+    ok = statuses.count(302)
+    return {
+        'logins_per_sec': ok / wall,
+        'ok': ok,
+        'rejected': statuses.count(429),
+        'p95_ms': latencies[int(len(latencies) * 0.95) - 1] * 1000 if latencies else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--levels', type=int, nargs='+', default=[1, 4, 16, 64])
+    parser.add_argument('--logins', type=int, default=64, help="logins per concurrency level")
+    parser.add_argument('--rounds', type=int, default=12, help="bcrypt work factor")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.environ['DATABASE'] = os.path.join(workdir, 'database.db')
+    os.environ['LIVE_FLIGHTS_INGEST'] = '0'
+    os.environ['BACKGROUND_JOBS'] = '0'
+    os.environ['BCRYPT_ROUNDS'] = str(args.rounds)
+    shutil.copy(os.path.join(ROOT, 'database.db'), os.environ['DATABASE'])
+
+    import app as flask_app
+    from db import pool
+    from passwords import hasher
+
+    with pool.connection() as conn:
+        conn.execute("INSERT OR REPLACE INTO users (username, password) VALUES (?, ?)",
+                     ('bench', hasher.hash_password('bench-password')))
+        conn.commit()
+
+    print(f"bcrypt rounds={args.rounds}, {os.cpu_count()} CPUs")
+    print(f"{'concurrency':>12}{'logins/s':>10}{'ok':>6}{'429':>6}{'p95 ms':>10}")
+    for level in args.levels:
+        result = run_level(flask_app.app, level, args.logins)
+        print(f"{level:>12}{result['logins_per_sec']:>10.1f}{result['ok']:>6}"
+              f"{result['rejected']:>6}{result['p95_ms']:>10.1f}")
+
+    pool.close_all()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+# benchmarks/bench_parser.py
+"""
+Per-offer cost of parsing and storing Amadeus flight offers.
+
+Parses the recorded responses in benchmarks/fixtures (or the files given)
+with the old first-segment dict parser and with offers.parse_offers, then
+compares the in-memory size held by the offer cache, serialized size and
+time for the search_results row (JSON) and pickle, plus the cost of
+loading a stored row back.
+
+    python benchmarks/bench_parser.py --repeat 2000
+
+Record a fresh response from the Amadeus test API (needs AMADEUS_CLIENT_ID
+and AMADEUS_CLIENT_SECRET):
+
+    python benchmarks/bench_parser.py --record DEL BOM 2024-11-20
+    python benchmarks/bench_parser.py --record DEL GOI 2024-11-20 --return-date 2024-11-27
+
+Recordings are saved as flight_offers_{origin}_{destination}_{date}.json,
+with `_{return date}` before the extension for round trips.
+"""
+import argparse
+import glob
+import json
+import os
+import pickle
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(ROOT, 'benchmarks', 'fixtures')
+sys.path.insert(0, ROOT)
+
+from offers import Offer, parse_offers  # noqa: E402
+
+
+def parse_first_segment(flight_data):
+    """The parser search_flights used before offers.py, kept as the baseline."""
+    flights = []
+    for offer in flight_data:
+        flight = {
+            'flight_id': offer['id'],
+            'price': offer['price']['total'],
+        }
+        if offer['itineraries'] and offer['itineraries'][0]['segments']:
+            first_segment = offer['itineraries'][0]['segments'][0]
+            flight['airline'] = first_segment['carrierCode']
+            flight['flight_number'] = first_segment['carrierCode'] + first_segment['number']
+            flight['origin'] = first_segment['departure']['iataCode']
+            flight['destination'] = first_segment['arrival']['iataCode']
+            flight['departure_time'] = first_segment['departure']['at']
+            flight['arrival_time'] = first_segment['arrival']['at']
+        else:
+            for field in ('airline', 'flight_number', 'origin', 'destination', 'departure_time', 'arrival_time'):
+                flight[field] = "N/A"
+        flights.append(flight)
+    return flights
+
+
+def record(origin, destination, departure_date, return_date=None):
+    from amadeus import Client
+    from dotenv import load_dotenv
+
+    load_dotenv(os.path.join(ROOT, '.env'))
+    amadeus = Client(client_id=os.getenv('AMADEUS_CLIENT_ID'),
+                     client_secret=os.getenv('AMADEUS_CLIENT_SECRET'), hostname='test')
+    params = {'returnDate': return_date} if return_date else {}
+    response = amadeus.shopping.flight_offers_search.get(
+        originLocationCode=origin, destinationLocationCode=destination,
+        departureDate=departure_date, adults=1, max=10, **params)
+    name = f"flight_offers_{origin}_{destination}_{departure_date}"
+    if return_date:
+        name += f"_{return_date}"
+    path = os.path.join(FIXTURES, f"{name}.json")
+    with open(path, 'w') as f:
+        json.dump(response.result, f, indent=2)
+    print(f"Recorded {len(response.data)} offers to {path}")
+
+
+def deep_size(obj, seen=None):
+    """Bytes held by obj and everything it references (strings shared by both parsers included)."""
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_size(k, seen) + deep_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple)):
+        size += sum(deep_size(item, seen) for item in obj)
+    return size
+
+
+def timed(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('files', nargs='*', help="recorded responses (default: benchmarks/fixtures/*.json)")
+    parser.add_argument('--repeat', type=int, default=2000)
+    parser.add_argument('--record', nargs=3, metavar=('ORIGIN', 'DESTINATION', 'DATE'))
+    parser.add_argument('--return-date', metavar='DATE', help="record a round trip returning on DATE")
+    args = parser.parse_args()
+
+    if args.record:
+        record(*args.record, return_date=args.return_date)
+        return
+
+    data = []
+    for path in args.files or sorted(glob.glob(os.path.join(FIXTURES, '*.json'))):
+        with open(path) as f:
+            data.extend(json.load(f)['data'])
+    n = len(data)
+    segments = sum(len(it['segments']) for offer in data for it in offer['itineraries'])
+    print(f"{n} offers, {segments} segments, {args.repeat} repeats")
+
+    old_parse, dicts = timed(lambda: parse_first_segment(data), args.repeat)
+    new_parse, parsed = timed(lambda: parse_offers(data), args.repeat)
+    rows = [offer.to_json() for offer in parsed]
+    old_rows = [json.dumps(flight) for flight in dicts]
+
+    results = [
+        ('parse', old_parse, new_parse),
+        ('to JSON row', timed(lambda: [json.dumps(d) for d in dicts], args.repeat)[0],
+         timed(lambda: [o.to_json() for o in parsed], args.repeat)[0]),
+        ('from JSON row', timed(lambda: [json.loads(r) for r in old_rows], args.repeat)[0],
+         timed(lambda: [Offer.from_json(r) for r in rows], args.repeat)[0]),
+        ('pickle', timed(lambda: pickle.dumps(dicts), args.repeat)[0],
+         timed(lambda: pickle.dumps(parsed), args.repeat)[0]),
+    ]
+    print(f"{'per offer':<16}{'first-segment dict':>20}{'full Offer':>14}")
+    for name, old, new in results:
+        print(f"{name:<16}{old / n * 1e6:>18.2f}us{new / n * 1e6:>12.2f}us")
+
+    print(f"{'bytes per offer':<16}{'first-segment dict':>20}{'full Offer':>14}")
+    print(f"{'JSON row':<16}{sum(map(len, old_rows)) / n:>20.0f}{sum(map(len, rows)) / n:>14.0f}")
+    print(f"{'pickle':<16}{len(pickle.dumps(dicts)) / n:>20.0f}{len(pickle.dumps(parsed)) / n:>14.0f}")
+    print(f"{'in memory':<16}{deep_size(dicts) / n:>20.0f}{deep_size(parsed) / n:>14.0f}")
+    # What offer_cache held before it stored parsed offers
+    print(f"{'raw response':<16}{len(json.dumps(data)) / n:>20.0f} JSON, {deep_size(data) / n:.0f} in memory")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,253 @@
+# benchmarks/fakes.py
+"""
+Offline stand-ins for Amadeus, OpenSky and Gemini.
+
+`install(app)` swaps them in for the real clients of an imported app, so
+every route runs without network access and each call sleeps for a
+configurable latency (+/- 25% jitter) instead. They replace the clients
+underneath upstream.py, so timeouts, retries, circuit breakers and the
+caches behave as they do against the real services.
+
+- Amadeus replays the recorded flight-offer responses in benchmarks/fixtures
+  (flight_offers_*.json, as saved by `bench_parser.py --record`), relabelled
+  with the requested route and date
+- OpenSky replays a recorded /states/all response, or a synthetic snapshot
+  sized like the real one (~15k aircraft) whose aircraft move along their
+  heading between fetches
+- Gemini answers with canned chat replies, streamed in chunks, and canned
+  recommendation JSON
+
+Record an OpenSky snapshot to replay with `--opensky-file`:
+
+    python benchmarks/fakes.py --record-opensky benchmarks/fixtures/opensky_states.json
+"""
+import argparse
+import glob
+import json
+import math
+import os
+import random
+import string
+import threading
+import time
+import zlib
+from datetime import datetime
+from types import SimpleNamespace
+
+from opensky_api import OpenSkyStates
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# Size of the real worldwide OpenSky snapshot
+AIRCRAFT = 15000
+
+CHAT_REPLIES = (
+    "You can change or cancel a booking from the Booked Flights page; cancelled flights can be "
+    "rebooked onto an alternative on the same route.",
+    "Most airlines allow one cabin bag of up to 7 kg in economy. Checked baggage allowances depend "
+    "on the fare, so please check the airline's website before you fly.",
+    "Online check-in usually opens 48 hours before departure and closes an hour before. You will need "
+    "your booking reference and the passenger's name.",
+)
+
+RECOMMENDATIONS = [
+    {
+        "Flight ID": f"FL{100 + i}",
+        "Airline": airline,
+        "Flight Number": f"{airline}{number}",
+        "Origin": origin,
+        "Destination": destination,
+        "Departure Time": "12/01/2024 09:30 AM",
+        "Arrival Time": "12/01/2024 11:45 AM",
+        "Price": f"${price}",
+    }
+    for i, (airline, number, origin, destination, price) in enumerate((
+        ("AI", 101, "DEL", "BOM", 95), ("6E", 2043, "DEL", "GOI", 120), ("UK", 835, "BOM", "BLR", 80),
+    ))
+]
+
+
+def _sleep(seconds):
+    if seconds > 0:
+        time.sleep(seconds * random.uniform(0.75, 1.25))
+
+
+# Amadeus
+
+class FakeFlightOffersSearch:
+    def __init__(self, payloads, latency):
+        self.payloads = payloads
+        self.latency = latency
+
+    def get(self, originLocationCode, destinationLocationCode, departureDate, max=250, **params):
+        _sleep(self.latency)
+        # The same search always replays the same recording
+        route = f"{originLocationCode}-{destinationLocationCode}".encode()
+        payload = self.payloads[zlib.crc32(route) % len(self.payloads)]
+        result = relabel(payload, originLocationCode, destinationLocationCode, departureDate)
+        result['data'] = result['data'][:max]
+        return SimpleNamespace(result=result, data=result['data'])
+
+
+class FakeAmadeus:
+    """Has the one Amadeus SDK call the app makes: shopping.flight_offers_search.get."""
+
+    def __init__(self, latency=0.4, paths=None):
+        payloads = []
+        for path in paths or sorted(glob.glob(os.path.join(FIXTURES, 'flight_offers_*.json'))):
+            with open(path) as f:
+                payloads.append(json.load(f))
+        self.shopping = SimpleNamespace(flight_offers_search=FakeFlightOffersSearch(payloads, latency))
+
+
+def relabel(payload, origin, destination, departure_date):
+    """
+    Copy of a recorded response moved onto another route and date: the
+    outbound itinerary starts at `origin` and ends at `destination` (the
+    return leg the other way round), and every time shifts by whole days.
+    """
+    result = json.loads(json.dumps(payload))
+    for offer in result['data']:
+        itineraries = offer['itineraries']
+        first = itineraries[0]['segments'][0]['departure']['at'][:10]
+        shift = datetime.strptime(departure_date, '%Y-%m-%d') - datetime.strptime(first, '%Y-%m-%d')
+        for i, itinerary in enumerate(itineraries):
+            segments = itinerary['segments']
+            start, end = (origin, destination) if i == 0 else (destination, origin)
+            segments[0]['departure']['iataCode'] = start
+            segments[-1]['arrival']['iataCode'] = end
+            for segment in segments:
+                for point in (segment['departure'], segment['arrival']):
+                    point['at'] = (datetime.fromisoformat(point['at']) + shift).isoformat()
+    return result
+
+
+# OpenSky
+
+class FakeOpenSkyApi:
+    """
+    OpenSkyApi.get_states() replaying `states` (a /states/all response), or a
+    synthetic snapshot of `aircraft` aircraft when no recording is given.
+    """
+
+    def __init__(self, latency=1.5, states=None, aircraft=AIRCRAFT, seed=0):
+        self.latency = latency
+        self._rows = states['states'] if states else synthetic_states(aircraft, seed)
+        self._moved_at = time.time()
+        self._lock = threading.Lock()
+
+    def get_states(self, time_secs=0, icao24=None, bbox=()):
+        _sleep(self.latency)
+        with self._lock:
+            now = time.time()
+            advance(self._rows, now - self._moved_at, now)
+            self._moved_at = now
+            rows = [list(row) for row in self._rows]
+        return OpenSkyStates({'time': int(now), 'states': rows})
+
+
+def synthetic_states(aircraft=AIRCRAFT, seed=0):
+    """State vector rows in the /states/all layout; about a fifth of the aircraft are on the ground."""
+    rng = random.Random(seed)
+    now = int(time.time())
+    rows = []
+    for i in range(aircraft):
+        on_ground = rng.random() < 0.2
+        callsign = ''.join(rng.choices(string.ascii_uppercase, k=3)) + str(rng.randint(1, 9999))
+        altitude = None if on_ground else rng.uniform(500, 12000)
+        rows.append([
+            f"{i:06x}", callsign.ljust(8), rng.choice(("India", "United States", "Germany", "Brazil")),
+            now, now, rng.uniform(-180, 180), rng.uniform(-85, 85), altitude, on_ground,
+            rng.uniform(0, 15) if on_ground else rng.uniform(100, 260), rng.uniform(0, 360),
+            0.0 if on_ground else rng.uniform(-10, 10), None, altitude, f"{rng.randint(0, 7777):04d}",
+            False, 0,
+        ])
+    return rows
+
+
+def advance(rows, seconds, now):
+    """Move every aircraft along its heading for `seconds`."""
+    for row in rows:
+        longitude, latitude, velocity, heading = row[5], row[6], row[9], row[10]
+        row[3] = row[4] = int(now)
+        if latitude is None or longitude is None or not velocity or heading is None:
+            continue
+        distance = velocity * seconds / 111_000  # degrees of latitude
+        row[6] = max(-85.0, min(85.0, latitude + distance * math.cos(math.radians(heading))))
+        row[5] = (longitude + distance * math.sin(math.radians(heading)) + 180) % 360 - 180
+
+
+def record_opensky(path):
+    import requests
+
+    response = requests.get('https://opensky-network.org/api/states/all', timeout=60)
+    response.raise_for_status()
+    with open(path, 'w') as f:
+        json.dump(response.json(), f)
+    print(f"Recorded {len(response.json()['states'])} state vectors to {path}")
+
+
+# Gemini
+
+class FakeChatSession:
+    def __init__(self, model, history):
+        self.model = model
+        self.history = list(history or [])
+
+    def send_message(self, message, stream=False, request_options=None):
+        reply = random.choice(CHAT_REPLIES)
+        self.history = self.history + [
+            {'role': 'user', 'parts': [message]},
+            {'role': 'model', 'parts': [reply]},
+        ]
+        chunks = self.model._stream(reply)
+        return chunks if stream else SimpleNamespace(text=''.join(chunk.text for chunk in chunks))
+
+
+class FakeGenerativeModel:
+    """
+    GenerativeModel with `latency` seconds to the first chunk and
+    `chunk_latency` between the following chunks of a reply.
+    """
+
+    def __init__(self, latency=0.8, chunk_latency=0.05, chunk_words=8):
+        self.latency = latency
+        self.chunk_latency = chunk_latency
+        self.chunk_words = chunk_words
+
+    def start_chat(self, history=None):
+        return FakeChatSession(self, history)
+
+    def generate_content(self, prompt, request_options=None, **kwargs):
+        _sleep(self.latency)
+        return SimpleNamespace(text=f"```json\n{json.dumps(RECOMMENDATIONS, indent=2)}\n```")
+
+    def _stream(self, reply):
+        words = reply.split(' ')
+        for i in range(0, len(words), self.chunk_words):
+            _sleep(self.latency if i == 0 else self.chunk_latency)
+            yield SimpleNamespace(text=' '.join(words[i:i + self.chunk_words]) + ' ')
+
+
+def install(flask_app, amadeus_latency=0.4, opensky_latency=1.5, gemini_latency=0.8,
+            opensky_states=None, aircraft=AIRCRAFT):
+    """Point an imported `app` module (and the modules it uses) at the fakes."""
+    import gemini
+    import live_flights
+
+    flask_app.amadeus = FakeAmadeus(amadeus_latency)
+    live_flights.opensky_api = FakeOpenSkyApi(opensky_latency, opensky_states, aircraft)
+    with gemini._models_lock:
+        gemini._models[gemini.MODEL_NAME] = FakeGenerativeModel(gemini_latency)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--record-opensky', metavar='PATH', required=True,
+                        help="save the current /states/all response to PATH")
+    args = parser.parse_args()
+    record_opensky(args.record_opensky)
+
+
+if __name__ == '__main__':
+    main()
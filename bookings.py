@@ -0,0 +1,110 @@
+# bookings.py
+"""
+Creating bookings, singly or in bulk, with idempotency keys.
+
+Every booking carries an idempotency key, unique per user among active
+bookings (a partial unique index on bookings). A request whose key was
+already used returns the booking made the first time instead of creating
+another one, so double clicks and client retries are safe; once that
+booking is cancelled, the key books anew. Keys that are not supplied are
+generated, so every row can be looked up by key after the batch insert.
+
+A batch is written in one IMMEDIATE transaction: look up the keys that
+already exist, insert the rest with a single `executemany`, update
+user_stats and the analytics rollups once for the whole batch, and read
+the new booking ids back by key. Offers are validated before the
+transaction starts, so a bad offer fails the batch without touching the
+database.
+"""
+import json
+import math
+import os
+import uuid
+
+import rollups
+import user_stats
+
+# Most bookings accepted in one bulk request
+BULK_LIMIT = int(os.getenv('BULK_BOOKING_LIMIT', '100'))
+
+INSERT_BOOKING = '''
+    INSERT INTO bookings (
+        username, flight_id, booking_price, origin, destination, departure_time, arrival_time, airline, flight_number,
+        booked_at, idempotency_key
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+
+class InvalidOffer(ValueError):
+    """Raised for an offer that cannot be booked, e.g. because its price is not a number."""
+
+
+def validate(offer):
+    """Raise InvalidOffer unless `offer` has a finite, non-negative price."""
+    try:
+        amount = offer.amount
+    except (TypeError, ValueError):
+        amount = None
+    if amount is None or not math.isfinite(amount) or amount < 0:
+        raise InvalidOffer(f"Flight {offer.flight_id} has an invalid price ({offer.price!r}).")
+
+
+def _ids_by_key(conn, username, keys):
+    rows = conn.execute(
+        "SELECT idempotency_key, id FROM bookings "
+        "WHERE username = ? AND cancelled = 0 AND idempotency_key IN (SELECT value FROM json_each(?))",
+        (username, json.dumps(keys))
+    )
+    return dict(rows.fetchall())
+
+
+def create_bookings(conn, username, requests):
+    """
+    Book a list of (idempotency_key or None, offers.Offer) for `username`.
+
+    Returns one (idempotency_key, booking_id, created) per request, in order;
+    `created` is False when the key had already been used (in an earlier
+    request or earlier in this batch). Raises InvalidOffer before writing if
+    any offer cannot be booked, and sqlite3.Error after rolling back; in
+    both cases nothing was booked.
+    """
+    for _, offer in requests:
+        validate(offer)
+    keys = [key or uuid.uuid4().hex for key, _ in requests]
+    booked_at = rollups.now_timestamp()
+
+    # Take the write lock up front so a concurrent retry cannot slip in between check and insert
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        existing = _ids_by_key(conn, username, keys)
+        new = {}
+        for key, (_, offer) in zip(keys, requests):
+            if key not in existing and key not in new:
+                new[key] = offer
+
+        if new:
+            conn.executemany(INSERT_BOOKING, [
+                (username, offer.flight_id, offer.amount, offer.origin, offer.destination, offer.departure_time,
+                 offer.arrival_time, offer.airline, offer.flight_number, booked_at, key)
+                for key, offer in new.items()
+            ])
+            user_stats.record_bookings(conn, username, [(offer.flight_id, offer.amount) for offer in new.values()])
+            rollups.record_bookings(conn, [
+                (booked_at, offer.origin, offer.destination, offer.airline, offer.flight_number, offer.amount)
+                for offer in new.values()
+            ])
+            ids = _ids_by_key(conn, username, list(new))
+        else:
+            ids = {}
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+    ids.update(existing)
+    results, seen = [], set()
+    for key in keys:
+        # Only the first occurrence of a new key within the batch created a booking
+        results.append((key, ids[key], key in new and key not in seen))
+        seen.add(key)
+    return results
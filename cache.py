@@ -0,0 +1,143 @@
+# cache.py
+"""
+In-process caches for slow upstream calls.
+
+`SingleFlightCache` is a size-bounded LRU with a per-entry TTL. Concurrent
+misses for the same key are coalesced: the first caller runs the loader and
+everyone else waits for its result instead of issuing their own upstream call.
+`refresh` reloads an entry before it expires (e.g. from a pre-warming job),
+so readers keep getting hits while the new value is loaded.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class _Flight:
+    """A load in progress that other callers can wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlightCache:
+    def __init__(self, ttl=300, maxsize=512):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'refreshes': 0,
+            'coalesced': 0,
+            'errors': 0,
+            'evictions': 0,
+            'load_count': 0,
+            'load_seconds_total': 0.0,
+            'load_seconds_max': 0.0,
+        }
+
+    def get(self, key):
+        """Return a fresh cached value or None, without loading."""
+        with self._lock:
+            return self._get_fresh(key)
+
+    def _get_fresh(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_or_load(self, key, loader):
+        """
+        Return the cached value for `key`, calling `loader()` on a miss.
+        Exceptions from the loader are re-raised to every waiting caller and
+        nothing is cached.
+        """
+        return self._load(key, loader, refresh=False)
+
+    def refresh(self, key, loader):
+        """
+        Call `loader()` and cache its result with a full TTL even if the entry
+        is still fresh; the old value keeps being served meanwhile. Joins a
+        load of the same key that is already in progress. On error the old
+        entry is kept.
+        """
+        return self._load(key, loader, refresh=True)
+
+    def _load(self, key, loader, refresh):
+        with self._lock:
+            if not refresh:
+                value = self._get_fresh(key)
+                if value is not None:
+                    self._stats['hits'] += 1
+                    return value
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self._stats['refreshes' if refresh else 'misses'] += 1
+            else:
+                self._stats['coalesced'] += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        start = time.perf_counter()
+        try:
+            flight.value = loader()
+        except Exception as e:
+            flight.error = e
+            with self._lock:
+                self._stats['errors'] += 1
+            raise
+        else:
+            if flight.value is not None:
+                self.set(key, flight.value)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self._flights.pop(key, None)
+                self._stats['load_count'] += 1
+                self._stats['load_seconds_total'] += elapsed
+                self._stats['load_seconds_max'] = max(self._stats['load_seconds_max'], elapsed)
+            flight.done.set()
+        return flight.value
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, size=len(self._entries), maxsize=self.maxsize, ttl=self.ttl)
+        lookups = stats['hits'] + stats['misses'] + stats['coalesced']
+        stats['hit_ratio'] = stats['hits'] / lookups if lookups else 0.0
+        stats['load_seconds_avg'] = (
+            stats['load_seconds_total'] / stats['load_count'] if stats['load_count'] else 0.0
+        )
+        return stats
@@ -0,0 +1,451 @@
+# db.py
+"""
+Shared SQLite data-access layer.
+
+Routes call `get_db()` to borrow a pooled connection for the lifetime of the
+request; it is stored on Flask's `g` and handed back to the pool in
+`teardown_appcontext`. Background jobs that run outside a request use
+`pool.connection()` instead.
+"""
+import ast
+import glob
+import logging
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import click
+from flask import g
+
+import metrics
+import rollups
+
+logger = logging.getLogger(__name__)
+
+DATABASE = os.getenv('DATABASE', 'database.db')
+
+# Pragmas applied once, when a pooled connection is first opened
+PRAGMAS = (
+    "PRAGMA foreign_keys = ON;",
+    "PRAGMA journal_mode = WAL;",       # readers no longer block the writer
+    "PRAGMA synchronous = NORMAL;",     # safe with WAL, avoids an fsync per commit
+    "PRAGMA cache_size = -16000;",      # ~16 MB page cache per connection
+    "PRAGMA mmap_size = 268435456;",    # 256 MB memory-mapped reads
+    "PRAGMA temp_store = MEMORY;",
+    "PRAGMA busy_timeout = 5000;",
+)
+
+# Number of compiled statements each connection keeps for reuse
+STATEMENT_CACHE_SIZE = 256
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Reports the time of every statement to metrics (fetching rows is not included)."""
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            metrics.observe_sql(time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            metrics.observe_sql(time.perf_counter() - start)
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connection whose cursors, and its own execute shortcuts, are instrumented."""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    # The C implementations would bypass InstrumentedCursor
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+class ConnectionPool:
+    """
+    Bounded pool of SQLite connections shared by all worker threads.
+
+    A connection is only ever used by one thread at a time (whoever checked it
+    out), so `check_same_thread` is disabled to let it move between threads.
+    With `size=0` every checkout opens a fresh connection and closes it on
+    release, which is the old connect-per-request behaviour.
+    """
+
+    def __init__(self, path=DATABASE, size=8):
+        self.path = path
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+
+    def _open(self):
+        conn = sqlite3.connect(
+            self.path,
+            cached_statements=STATEMENT_CACHE_SIZE,
+            check_same_thread=False,
+            factory=InstrumentedConnection,
+        )
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._open()
+
+    def release(self, conn):
+        # Never hand a half-finished transaction to the next borrower
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            if self._idle.qsize() < self.size:
+                self._idle.put_nowait(conn)
+                return
+        conn.close()
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def configure(self, path=None, size=None):
+        """Point the pool at a different database and drop idle connections."""
+        if path is not None:
+            self.path = path
+        if size is not None:
+            self.size = size
+        self.close_all()
+
+    def close_all(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+pool = ConnectionPool(size=int(os.getenv('DB_POOL_SIZE', '8')))
+
+
+def get_db():
+    """Return the connection for the current request, borrowing one if needed."""
+    if 'db' not in g:
+        g.db = pool.acquire()
+    return g.db
+
+
+def release_db(exception=None):
+    conn = g.pop('db', None)
+    if conn is not None:
+        pool.release(conn)
+
+
+# Per-user stats recounted from active bookings and all coupons (migration 10)
+_USER_STATS_FROM_BOOKINGS = """
+    INSERT OR REPLACE INTO user_stats (username, booking_count, total_spend, flight_counts)
+    SELECT username, SUM(n), SUM(spend), json_group_object(flight_id, n)
+    FROM (
+        SELECT username, COALESCE(flight_id, '') AS flight_id, COUNT(*) AS n,
+               COALESCE(SUM(booking_price), 0) AS spend
+        FROM bookings WHERE cancelled = 0 GROUP BY username, COALESCE(flight_id, '')
+    )
+    GROUP BY username
+"""
+_USER_STATS_FROM_COUPONS = """
+    INSERT INTO user_stats (username, coupon_count, coupon_discount, coupon_counts)
+    SELECT username, SUM(n), SUM(discount), json_group_object(coupon_code, n)
+    FROM (
+        SELECT username, COALESCE(coupon_code, '') AS coupon_code, COUNT(*) AS n,
+               COALESCE(SUM(discount), 0) AS discount
+        FROM coupons GROUP BY username, COALESCE(coupon_code, '')
+    )
+    WHERE true
+    GROUP BY username
+    ON CONFLICT(username) DO UPDATE SET
+        coupon_count = excluded.coupon_count,
+        coupon_discount = excluded.coupon_discount,
+        coupon_counts = excluded.coupon_counts
+"""
+
+# Schema migrations, applied in order and tracked with PRAGMA user_version.
+# Each step is a SQL string or a callable taking the connection (for backfills).
+# Append new entries; never edit one that has already shipped.
+MIGRATIONS = [
+    (1, "indexes for per-user bookings/coupons and flight lookups", [
+        # Dashboard savings, profile, recommendations, show/rebook flights
+        "CREATE INDEX IF NOT EXISTS idx_bookings_user_cancelled "
+        "ON bookings (username, cancelled, booking_price)",
+        "CREATE INDEX IF NOT EXISTS idx_bookings_user_flight ON bookings (username, flight_id)",
+        # flight_details fallback and analytics per-flight counts
+        "CREATE INDEX IF NOT EXISTS idx_bookings_flight_number ON bookings (flight_number)",
+        "CREATE INDEX IF NOT EXISTS idx_bookings_flight_id ON bookings (flight_id)",
+        # show_coupons and the per-user GROUP BY coupon_code in profile
+        "CREATE INDEX IF NOT EXISTS idx_coupons_user_code ON coupons (username, coupon_code, discount)",
+        # analytics coupon usage
+        "CREATE INDEX IF NOT EXISTS idx_coupons_code ON coupons (coupon_code)",
+        # Live status lookups by callsign
+        "CREATE INDEX IF NOT EXISTS idx_live_flights_callsign ON live_flights (callsign)",
+    ]),
+    (2, "server-side store for flight search results", [
+        """
+        CREATE TABLE IF NOT EXISTS search_results (
+            search_id TEXT NOT NULL,
+            flight_id TEXT NOT NULL,
+            username TEXT NOT NULL,
+            offer TEXT NOT NULL,       -- JSON-encoded flight offer
+            created_at REAL NOT NULL,  -- unix timestamp, used for pruning
+            PRIMARY KEY (search_id, flight_id)
+        ) WITHOUT ROWID
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_search_results_created ON search_results (created_at)",
+    ]),
+    (3, "per-user booking/coupon stats, backfilled from existing rows", [
+        """
+        CREATE TABLE IF NOT EXISTS user_stats (
+            username TEXT PRIMARY KEY,
+            booking_count INTEGER NOT NULL DEFAULT 0,
+            total_spend REAL NOT NULL DEFAULT 0,
+            coupon_count INTEGER NOT NULL DEFAULT 0,
+            coupon_discount REAL NOT NULL DEFAULT 0,
+            flight_counts TEXT NOT NULL DEFAULT '{}',  -- JSON {flight_id: count}
+            coupon_counts TEXT NOT NULL DEFAULT '{}',  -- JSON {coupon_code: count}
+            FOREIGN KEY (username) REFERENCES users(username) ON DELETE CASCADE
+        )
+        """,
+        """
+        INSERT OR REPLACE INTO user_stats (username, booking_count, total_spend, flight_counts)
+        SELECT username, SUM(n), SUM(spend), json_group_object(flight_id, n)
+        FROM (
+            SELECT username, COALESCE(flight_id, '') AS flight_id, COUNT(*) AS n,
+                   COALESCE(SUM(booking_price), 0) AS spend
+            FROM bookings GROUP BY username, COALESCE(flight_id, '')
+        )
+        GROUP BY username
+        """,
+        """
+        INSERT INTO user_stats (username, coupon_count, coupon_discount, coupon_counts)
+        SELECT username, SUM(n), SUM(discount), json_group_object(coupon_code, n)
+        FROM (
+            SELECT username, COALESCE(coupon_code, '') AS coupon_code, COUNT(*) AS n,
+                   COALESCE(SUM(discount), 0) AS discount
+            FROM coupons GROUP BY username, COALESCE(coupon_code, '')
+        )
+        WHERE true
+        GROUP BY username
+        ON CONFLICT(username) DO UPDATE SET
+            coupon_count = excluded.coupon_count,
+            coupon_discount = excluded.coupon_discount,
+            coupon_counts = excluded.coupon_counts
+        """,
+    ]),
+    (4, "booking/coupon timestamps and analytics rollups", [
+        "ALTER TABLE bookings ADD COLUMN booked_at TEXT",
+        "ALTER TABLE coupons ADD COLUMN created_at TEXT",
+        """
+        CREATE TABLE IF NOT EXISTS analytics_rollups (
+            dimension TEXT NOT NULL,   -- flight, route, airline, coupon or total
+            bucket TEXT NOT NULL,      -- 'YYYY-MM-DD HH', or '*' for all time
+            key TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            amount REAL NOT NULL DEFAULT 0,  -- revenue for bookings, discount for coupons
+            PRIMARY KEY (dimension, bucket, key)
+        ) WITHOUT ROWID
+        """,
+        rollups.backfill,
+    ]),
+    (5, "index for recent search_logs rankings", [
+        "CREATE INDEX IF NOT EXISTS idx_search_logs_time "
+        "ON search_logs (search_time, origin, destination, departure_date)",
+    ]),
+    (6, "booking idempotency keys", [
+        "ALTER TABLE bookings ADD COLUMN idempotency_key TEXT",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_bookings_idempotency "
+        "ON bookings (username, idempotency_key) WHERE idempotency_key IS NOT NULL",
+    ]),
+    (7, "soft-delete cancellations and an index of active bookings", [
+        "ALTER TABLE bookings ADD COLUMN cancelled_at TEXT",
+        "CREATE INDEX IF NOT EXISTS idx_bookings_active "
+        "ON bookings (username, departure_time) WHERE cancelled = 0",
+    ]),
+    (8, "normalized live_flights callsigns with a covering status index", [
+        # Same normalization as live_flights.normalize_callsign; older rows only filled flight_number
+        "UPDATE live_flights SET callsign = upper(replace(trim(COALESCE(callsign, flight_number, '')), ' ', ''))",
+        "DROP INDEX IF EXISTS idx_live_flights_callsign",
+        "CREATE INDEX IF NOT EXISTS idx_live_flights_callsign_status "
+        "ON live_flights (callsign, last_updated, status)",
+    ]),
+    (9, "flight track history and live_flights retention", [
+        """
+        CREATE TABLE IF NOT EXISTS flight_tracks (
+            icao24 TEXT NOT NULL,
+            ts INTEGER NOT NULL,               -- position time, unix seconds
+            bucket INTEGER NOT NULL,           -- ts // 3600; retention works a bucket at a time
+            latitude REAL,
+            longitude REAL,
+            altitude REAL,
+            velocity REAL,
+            heading REAL,
+            vertical_rate REAL,
+            on_ground INTEGER,
+            resolution INTEGER NOT NULL DEFAULT 0,  -- 0 = raw, else seconds per point after downsampling
+            PRIMARY KEY (icao24, ts)
+        ) WITHOUT ROWID
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_flight_tracks_bucket ON flight_tracks (bucket, resolution)",
+        "CREATE INDEX IF NOT EXISTS idx_live_flights_updated ON live_flights (last_updated)",
+    ]),
+    (10, "recount user stats and rollups without cancelled bookings", [
+        # Migration 3 counted cancelled bookings, and migration 4 put bookings without booked_at
+        # in the hour it ran, where their cancellation could never take them back out
+        "DELETE FROM user_stats",
+        _USER_STATS_FROM_BOOKINGS,
+        _USER_STATS_FROM_COUPONS,
+        rollups.backfill,
+    ]),
+    (11, "no placeholder callsigns in live_flights", [
+        # Aircraft without a callsign were stored as 'N/A' (or '' by migration 8) and matched such bookings
+        "UPDATE live_flights SET callsign = NULL WHERE callsign IN ('', 'N/A')",
+    ]),
+    (12, "idempotency keys only held by active bookings", [
+        # A cancelled booking no longer answers for its key, so the same offer can be booked again
+        "DROP INDEX IF EXISTS idx_bookings_idempotency",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_bookings_idempotency "
+        "ON bookings (username, idempotency_key) WHERE idempotency_key IS NOT NULL AND cancelled = 0",
+    ]),
+]
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn):
+    """Apply every migration newer than the database's user_version."""
+    current = schema_version(conn)
+    for version, description, statements in MIGRATIONS:
+        if version <= current:
+            continue
+        logger.info(f"Applying schema migration {version}: {description}")
+        with conn:
+            for statement in statements:
+                if callable(statement):
+                    statement(conn)
+                else:
+                    conn.execute(statement)
+            # PRAGMA does not accept bound parameters
+            conn.execute(f"PRAGMA user_version = {int(version)}")
+    # Refresh planner statistics so the new indexes are actually chosen
+    if schema_version(conn) != current:
+        conn.execute("ANALYZE")
+
+
+# ---------------------------------------------------------------------------
+# Query plan audit
+# ---------------------------------------------------------------------------
+
+_DML = re.compile(r'^\s*(SELECT|INSERT|UPDATE|DELETE|REPLACE|WITH)\b', re.IGNORECASE)
+# Table scans without an index; scanning a virtual table such as json_each(?) only walks the bound parameter
+_FULL_SCAN = re.compile(r'^SCAN\b(?!.*\b(USING|VIRTUAL TABLE)\b)')
+
+
+def collect_statements(paths):
+    """
+    Find every literal SQL string passed to `execute`/`executemany` in the given
+    Python files. Returns a list of (location, sql) tuples.
+    """
+    statements = []
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            tree = ast.parse(f.read(), filename=path)
+        for node in ast.walk(tree):
+            if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+                    and node.func.attr in ('execute', 'executemany') and node.args):
+                continue
+            arg = node.args[0]
+            if isinstance(arg, ast.Constant) and isinstance(arg.value, str) and _DML.match(arg.value):
+                statements.append((path, node.lineno, ' '.join(arg.value.split())))
+    statements.sort()
+    return [(f"{os.path.basename(path)}:{lineno}", sql) for path, lineno, sql in statements]
+
+
+def is_hot(sql):
+    """Statements that filter or join are expected to be served by an index."""
+    return bool(re.search(r'\b(WHERE|JOIN)\b', sql, re.IGNORECASE))
+
+
+def explain(conn, sql):
+    """Return the EXPLAIN QUERY PLAN detail lines for a statement."""
+    params = [None] * sql.count('?')
+    return [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+
+
+def audit_query_plans(conn, paths):
+    """
+    Run EXPLAIN QUERY PLAN for every statement found in `paths`.
+    Returns a list of (location, sql, plan, problem) tuples, where `problem` is
+    None, 'scan' (a hot query that does a full table scan) or an error message.
+    """
+    report = []
+    for location, sql in collect_statements(paths):
+        try:
+            plan = explain(conn, sql)
+        except sqlite3.Error as e:
+            report.append((location, sql, [], str(e)))
+            continue
+        scans = [detail for detail in plan if _FULL_SCAN.match(detail)]
+        problem = 'scan' if scans and is_hot(sql) else None
+        report.append((location, sql, plan, problem))
+    return report
+
+
+@click.command('explain-queries')
+@click.option('--verbose', '-v', is_flag=True, help="Print the plan for every statement.")
+def explain_queries_command(verbose):
+    """Fail if any hot SQL statement still does a full table scan."""
+    from flask import current_app
+
+    paths = sorted(glob.glob(os.path.join(current_app.root_path, '*.py')))
+    with pool.connection() as conn:
+        report = audit_query_plans(conn, paths)
+
+    failures = 0
+    for location, sql, plan, problem in report:
+        if problem or verbose:
+            status = 'OK' if problem is None else ('FULL SCAN' if problem == 'scan' else 'ERROR')
+            click.echo(f"[{status}] {location}: {sql}")
+            for detail in plan:
+                click.echo(f"    {detail}")
+            if problem not in (None, 'scan'):
+                click.echo(f"    {problem}")
+        if problem:
+            failures += 1
+
+    click.echo(f"{len(report)} statements checked, {failures} problem(s).")
+    if failures:
+        raise SystemExit(1)
+
+
+def init_app(app):
+    app.config.setdefault('DATABASE', pool.path)
+    app.config.setdefault('DB_POOL_SIZE', pool.size)
+    pool.configure(path=app.config['DATABASE'], size=app.config['DB_POOL_SIZE'])
+    app.teardown_appcontext(release_db)
+    app.cli.add_command(explain_queries_command)
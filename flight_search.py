@@ -0,0 +1,107 @@
+# flight_search.py
+"""
+Fan-out for flexible searches.
+
+A plain search is one Amadeus query. A flexible search (a date window of
++/- N days and/or several destinations) expands into one query per
+(destination, date), runs them concurrently on a small bounded pool and
+hands back each query's flights as soon as it completes, so callers can
+show partial results instead of waiting for the slowest query. Merged
+results are ranked by price, then total duration.
+"""
+import logging
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError
+from datetime import date, timedelta
+
+logger = logging.getLogger(__name__)
+
+FANOUT_WORKERS = int(os.getenv('SEARCH_FANOUT_WORKERS', '4'))
+MAX_FLEX_DAYS = int(os.getenv('SEARCH_MAX_FLEX_DAYS', '3'))
+MAX_QUERIES = int(os.getenv('SEARCH_MAX_QUERIES', '21'))
+# Overall deadline for a fan-out; queries still running after it are reported as failed
+FANOUT_TIMEOUT = float(os.getenv('SEARCH_FANOUT_TIMEOUT', '30'))
+
+_pool = ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix='search-fanout')
+
+
+def rank_key(offer):
+    """Cheapest first; ties broken by the shorter trip. Unknown values sort last."""
+    try:
+        price = offer.amount
+    except (TypeError, ValueError):
+        price = float('inf')
+    duration = offer.duration
+    return price, duration if duration is not None else float('inf')
+
+
+def rank(flights):
+    return sorted(flights, key=rank_key)
+
+
+def parse_destinations(value):
+    """'BOM, goi BOM' -> ['BOM', 'GOI'] (order kept, duplicates dropped)."""
+    codes = [code.upper() for code in re.split(r'[\s,;]+', value or '') if code]
+    return list(dict.fromkeys(codes))
+
+
+def expand_queries(origin, destinations, departure_date, flex_days=0):
+    """
+    Every (origin, destination, date) to search, nearest date first. Dates in
+    the past are skipped. Raises ValueError for a bad date or too many queries.
+    """
+    center = date.fromisoformat(departure_date)
+    flex_days = max(0, min(flex_days, MAX_FLEX_DAYS))
+    offsets = sorted(range(-flex_days, flex_days + 1), key=abs)
+    today = date.today()
+    dates = [center + timedelta(days=offset) for offset in offsets]
+    queries = [
+        (origin, destination, day.isoformat())
+        for day in dates if day >= today
+        for destination in destinations if destination != origin
+    ]
+    if len(queries) > MAX_QUERIES:
+        raise ValueError(f"That search needs {len(queries)} queries; the limit is {MAX_QUERIES}.")
+    return queries
+
+
+def query_prefix(query):
+    """Namespace for offer ids, which Amadeus only numbers per query."""
+    _, destination, departure_date = query
+    return f"{destination}-{departure_date}-"
+
+
+def fan_out(queries, search):
+    """
+    Run `search(origin, destination, departure_date)` (returning a list of
+    offers.Offer) for every query on the fan-out pool. Yields (query, flights,
+    error) in completion order; exactly one of flights/error is None.
+    """
+    futures = {_pool.submit(search, *query): query for query in queries}
+    try:
+        for future in as_completed(futures, timeout=FANOUT_TIMEOUT):
+            query = futures.pop(future)
+            try:
+                prefix = query_prefix(query)
+                flights = [offer._replace(flight_id=prefix + offer.flight_id) for offer in future.result()]
+            except Exception as e:
+                logger.warning(f"Flexible search query {query} failed: {e}")
+                yield query, None, e
+            else:
+                yield query, flights, None
+    except TimeoutError:
+        for future, query in futures.items():
+            future.cancel()
+            yield query, None, TimeoutError(f"No response within {FANOUT_TIMEOUT:.0f}s")
+
+
+def search_all(queries, search):
+    """Wait for every query; returns (ranked flights, [(query, error)])."""
+    flights, errors = [], []
+    for query, result, error in fan_out(queries, search):
+        if error is not None:
+            errors.append((query, error))
+        else:
+            flights.extend(result)
+    return rank(flights), errors
@@ -0,0 +1,202 @@
+# gemini.py
+"""
+Gemini models, chatbot sessions and streamed replies.
+
+Models are created once and shared through `get_model`. Each user gets a
+`ChatSession` so follow-up messages reuse the conversation instead of being
+sent stateless; sessions are bounded in number and length and evicted when
+idle. Standalone prompts (the first message of a conversation) are answered
+from an exact-match cache when the same prompt was asked before.
+
+Every reply records two latencies: time to the first chunk (what the user
+perceives) and total generation time.
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import google.generativeai as genai
+
+import metrics
+import upstream
+from cache import SingleFlightCache
+
+logger = logging.getLogger(__name__)
+
+MODEL_NAME = "gemini-1.5-flash"
+
+_models = {}
+_models_lock = threading.Lock()
+
+
+def get_model(name=MODEL_NAME):
+    """Return the shared GenerativeModel for `name`, creating it on first use."""
+    model = _models.get(name)
+    if model is None:
+        with _models_lock:
+            model = _models.get(name)
+            if model is None:
+                model = _models[name] = genai.GenerativeModel(name)
+    return model
+
+
+class ChatSessionStore:
+    """
+    One Gemini ChatSession per user, least recently used first out.
+
+    Sessions idle for longer than `idle_seconds` are dropped on the next
+    access, and each conversation keeps at most `max_turns` exchanges.
+    Callers must hold the returned lock while sending on the session.
+    """
+
+    def __init__(self, max_sessions=500, idle_seconds=1800, max_turns=20):
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds
+        self.max_turns = max_turns
+        self._sessions = OrderedDict()  # username -> [chat, lock, last_used]
+        self._lock = threading.Lock()
+
+    def _evict_idle(self, now):
+        while self._sessions:
+            username, entry = next(iter(self._sessions.items()))
+            if now - entry[2] < self.idle_seconds and len(self._sessions) <= self.max_sessions:
+                break
+            del self._sessions[username]
+
+    def get(self, username):
+        """Return (chat, lock) for the user, starting a new conversation if needed."""
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            entry = self._sessions.get(username)
+            if entry is None:
+                entry = self._sessions[username] = [get_model().start_chat(history=[]), threading.Lock(), now]
+                self._evict_idle(now)
+            entry[2] = now
+            self._sessions.move_to_end(username)
+            return entry[0], entry[1]
+
+    def discard(self, username):
+        with self._lock:
+            self._sessions.pop(username, None)
+
+    def trim(self, chat):
+        """Keep only the most recent `max_turns` user/model exchanges."""
+        history = chat.history
+        if len(history) > 2 * self.max_turns:
+            chat.history = history[-2 * self.max_turns:]
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+sessions = ChatSessionStore(
+    max_sessions=int(os.getenv('CHAT_SESSION_LIMIT', '500')),
+    idle_seconds=int(os.getenv('CHAT_IDLE_SECONDS', '1800')),
+    max_turns=int(os.getenv('CHAT_HISTORY_TURNS', '20')),
+)
+
+# Replies to standalone prompts, keyed by the normalized prompt text
+faq_cache = SingleFlightCache(
+    ttl=int(os.getenv('CHAT_CACHE_TTL', '3600')),
+    maxsize=int(os.getenv('CHAT_CACHE_SIZE', '1024')),
+)
+
+
+def normalize_prompt(message):
+    return ' '.join(message.lower().split())
+
+
+# Aggregate latency metrics for chatbot replies, in seconds
+chat_stats = {
+    'requests': 0,
+    'errors': 0,
+    'cache_hits': 0,
+    'first_chunk_seconds_total': 0.0,
+    'first_chunk_seconds_max': 0.0,
+    'total_seconds_total': 0.0,
+    'total_seconds_max': 0.0,
+}
+_stats_lock = threading.Lock()
+
+metrics.Stats('chat', "Chatbot replies", lambda: chat_stats,
+              counters=('requests', 'errors', 'cache_hits', 'first_chunk_seconds_total', 'total_seconds_total'))
+
+
+def _record(first_chunk, total, failed, cached=False):
+    with _stats_lock:
+        chat_stats['requests'] += 1
+        if failed:
+            chat_stats['errors'] += 1
+        if cached:
+            chat_stats['cache_hits'] += 1
+        if first_chunk is not None:
+            chat_stats['first_chunk_seconds_total'] += first_chunk
+            chat_stats['first_chunk_seconds_max'] = max(chat_stats['first_chunk_seconds_max'], first_chunk)
+        chat_stats['total_seconds_total'] += total
+        chat_stats['total_seconds_max'] = max(chat_stats['total_seconds_max'], total)
+    first_chunk_text = f"{first_chunk:.3f}s" if first_chunk is not None else "n/a"
+    logger.info(f"Chat reply: first chunk {first_chunk_text}, total {total:.3f}s"
+                f"{' (cached)' if cached else ''}")
+
+
+def stream_reply(username, message):
+    """
+    Yield the reply to `message` in the user's conversation as text chunks, as
+    soon as Gemini produces them. Exceptions propagate to the caller after the
+    latency has been recorded; the conversation is reset so it stays coherent.
+    """
+    start = time.perf_counter()
+    chat, lock = sessions.get(username)
+    with lock:
+        standalone = not chat.history
+        key = normalize_prompt(message)
+        cached = faq_cache.get(key) if standalone else None
+        if cached is not None:
+            # Keep the conversation consistent with what the user was shown
+            chat.history = [
+                {'role': 'user', 'parts': [message]},
+                {'role': 'model', 'parts': [cached]},
+            ]
+            _record(time.perf_counter() - start, time.perf_counter() - start, False, cached=True)
+            yield cached
+            return
+
+        first_chunk = None
+        failed = True
+        parts = []
+        try:
+            # Streamed replies are not retried: the user may already have seen part of one
+            with upstream.gemini.guard():
+                response = chat.send_message(
+                    message, stream=True, request_options={'timeout': upstream.gemini.timeout}
+                )
+                for chunk in response:
+                    text = chunk.text
+                    if not text:
+                        continue
+                    if first_chunk is None:
+                        first_chunk = time.perf_counter() - start
+                    parts.append(text)
+                    yield text
+            sessions.trim(chat)
+            failed = False
+        finally:
+            _record(first_chunk, time.perf_counter() - start, failed)
+            if failed:
+                sessions.discard(username)
+
+    if standalone:
+        faq_cache.set(key, ''.join(parts))
+
+
+def reply(username, message):
+    """Return the whole reply to `message` in the user's conversation."""
+    return ''.join(stream_reply(username, message))
+
+
+def init_app(app):
+    # Create the shared model up front rather than on the first request
+    get_model()
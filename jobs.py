@@ -0,0 +1,84 @@
+# jobs.py
+"""
+Background job scheduler shared by the ingestion and maintenance jobs.
+
+Feature modules register their jobs on `scheduler` from their own
+`init_app`. Nothing starts on import: a server starts the scheduler when it
+handles its first request, so CLI commands, benchmarks and other imports of
+app never run jobs, and BACKGROUND_JOBS=0 keeps a server from running them
+at all. With several worker processes, only the one that holds the jobs
+lock file runs them (one OpenSky ingestion per database); the others only
+serve requests.
+"""
+import logging
+import os
+import threading
+
+from flask_apscheduler import APScheduler
+
+try:
+    import fcntl
+except ImportError:  # Windows: no lock, fine for the single-process dev server
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+scheduler = APScheduler()
+
+_start_lock = threading.Lock()
+_lock_file = None
+_attempted = False
+
+
+def init_app(app):
+    app.config.setdefault('SCHEDULER_API_ENABLED', False)
+    app.config.setdefault('BACKGROUND_JOBS', os.getenv('BACKGROUND_JOBS', '1') == '1')
+    app.config.setdefault('JOBS_LOCK_FILE', os.getenv('JOBS_LOCK_FILE', app.config['DATABASE'] + '.jobs.lock'))
+    scheduler.init_app(app)
+    if app.config['BACKGROUND_JOBS']:
+        @app.before_request
+        def start_background_jobs():
+            if not _attempted:
+                start(app.config['JOBS_LOCK_FILE'])
+
+
+def add_interval_job(job_id, func, seconds):
+    """Register `func` to run every `seconds`, never overlapping itself."""
+    scheduler.add_job(
+        id=job_id,
+        func=func,
+        trigger='interval',
+        seconds=seconds,
+        max_instances=1,
+        coalesce=True,
+        replace_existing=True,
+    )
+
+
+def _acquire(lock_path):
+    """Take the jobs lock for the life of this process; False if another process has it."""
+    global _lock_file
+    if fcntl is None:
+        return True
+    lock_file = open(lock_path, 'a')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return False
+    _lock_file = lock_file
+    return True
+
+
+def start(lock_path):
+    """Start the scheduler in this process unless another process already runs the jobs (tried once)."""
+    global _attempted
+    with _start_lock:
+        if _attempted:
+            return
+        _attempted = True
+        if not _acquire(lock_path):
+            logger.info(f"Background jobs run in another process ({lock_path} is locked).")
+            return
+        if not scheduler.running:
+            scheduler.start()
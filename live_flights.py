@@ -0,0 +1,508 @@
+# live_flights.py
+"""
+OpenSky ingestion into the live_flights table.
+
+`fetch_live_flight_statuses` runs on the background scheduler: it pulls the
+current state vectors once per interval, diffs them against the previous
+snapshot and writes only the aircraft that appeared, changed beyond the
+tolerances below or disappeared, in one transaction (appending their track
+points in the same transaction), then publishes that delta to the status
+streams in status_hub. It also refreshes the in-process `state_cache` that
+request handlers read from. Only the process that runs the jobs talks to
+OpenSky; the state caches of other processes (other server workers, or an
+app started with LIVE_FLIGHTS_INGEST=0) are refreshed from the live_flights
+table it writes.
+"""
+import logging
+import math
+import os
+import threading
+import time
+from array import array
+from collections import namedtuple
+from datetime import datetime, timezone
+
+from opensky_api import OpenSkyApi
+
+import db
+import metrics
+import status_hub
+import tracks
+import upstream
+from jobs import add_interval_job, scheduler
+
+logger = logging.getLogger(__name__)
+
+# Shared OpenSky client (credentials are optional; anonymous access is rate limited)
+opensky_api = OpenSkyApi(os.getenv('OPENSKY_USERNAME'), os.getenv('OPENSKY_PASSWORD'))
+
+UPSERT_LIVE_FLIGHT = '''
+    INSERT INTO live_flights (
+        flight_id, airline, flight_number, origin, destination, departure_time, arrival_time,
+        status, last_updated, callsign, origin_country, longitude, latitude,
+        baro_altitude, velocity, heading, vertical_rate, squawk, spi, on_ground
+    ) VALUES (?, ?, ?, 'N/A', 'N/A', 'N/A', 'N/A', ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(flight_id) DO UPDATE SET
+        airline = excluded.airline,
+        flight_number = excluded.flight_number,
+        status = excluded.status,
+        last_updated = excluded.last_updated,
+        callsign = excluded.callsign,
+        origin_country = excluded.origin_country,
+        longitude = excluded.longitude,
+        latitude = excluded.latitude,
+        baro_altitude = excluded.baro_altitude,
+        velocity = excluded.velocity,
+        heading = excluded.heading,
+        vertical_rate = excluded.vertical_rate,
+        squawk = excluded.squawk,
+        spi = excluded.spi,
+        on_ground = excluded.on_ground
+'''
+
+DELETE_LIVE_FLIGHT = "DELETE FROM live_flights WHERE flight_id = ?"
+
+# Differences below these count as "unchanged" and are not written
+POSITION_TOLERANCE = float(os.getenv('LIVE_POSITION_TOLERANCE', '0.01'))  # degrees (~1 km)
+ALTITUDE_TOLERANCE = float(os.getenv('LIVE_ALTITUDE_TOLERANCE', '30'))  # metres
+VELOCITY_TOLERANCE = float(os.getenv('LIVE_VELOCITY_TOLERANCE', '5'))  # m/s
+HEADING_TOLERANCE = float(os.getenv('LIVE_HEADING_TOLERANCE', '5'))  # degrees
+# Unchanged rows are still rewritten this often, so last_updated-based pruning keeps them
+HEARTBEAT_SECONDS = float(os.getenv('LIVE_HEARTBEAT_SECONDS', '1800'))
+# Consecutive snapshots an aircraft may be missing from before its row is removed
+MISSING_CYCLES = int(os.getenv('LIVE_MISSING_CYCLES', '3'))
+
+# Metrics from the most recent ingestion cycle
+ingest_stats = {
+    'cycles': 0,
+    'failures': 0,
+    'rows': 0,
+    'inserted': 0,
+    'updated': 0,
+    'removed': 0,
+    'unchanged': 0,
+    'track_points': 0,
+    'fetch_seconds': 0.0,
+    'write_seconds': 0.0,
+    'cycle_seconds': 0.0,
+    'rows_per_second': 0.0,
+    'last_success': None,
+}
+
+
+def _last_success_timestamp():
+    last_success = ingest_stats['last_success']
+    if last_success is None:
+        return {}
+    return {(): datetime.fromisoformat(last_success).replace(tzinfo=timezone.utc).timestamp()}
+
+
+metrics.Stats('live_ingest', "OpenSky ingestion, most recent cycle", lambda: ingest_stats,
+              counters=('cycles', 'failures'))
+metrics.Gauge('live_ingest_last_success_timestamp_seconds', "Unix time of the last successful ingestion.",
+              (), _last_success_timestamp)
+
+
+def normalize_callsign(value):
+    """Callsigns are space padded by OpenSky; compare them upper-cased and stripped."""
+    return ''.join(value.split()).upper() if value else ''
+
+
+# Size of a spatial grid cell, in degrees of latitude/longitude
+GRID_CELL_DEGREES = 1.0
+
+
+def _cell(value):
+    return math.floor(value / GRID_CELL_DEGREES)
+
+
+def _clamp(value, low, high):
+    return max(low, min(high, value))
+
+
+def _cell_range(low, high):
+    return range(_cell(low), _cell(high) + 1)
+
+
+def _between(value, low, high):
+    if low is None and high is None:
+        return True
+    if value is None:
+        return False
+    return (low is None or value >= low) and (high is None or value <= high)
+
+
+def _differs(old, new, tolerance):
+    """NaN stands for "no value"; a value appearing or disappearing is a change."""
+    if old != old or new != new:
+        return (old != old) != (new != new)
+    return abs(new - old) > tolerance
+
+
+def _heading_differs(old, new):
+    if old != old or new != new:
+        return (old != old) != (new != new)
+    delta = abs(new - old) % 360.0
+    return min(delta, 360.0 - delta) > HEADING_TOLERANCE
+
+
+def _num(value):
+    return math.nan if value is None else float(value)
+
+
+class StateSnapshot:
+    """
+    The last written state of every aircraft, as parallel columns keyed by
+    icao24: float arrays for the numeric fields (NaN = missing), a byte array
+    for on_ground/spi, and lists for callsign and squawk. Freed slots are
+    reused, so the columns stay as long as the largest fleet seen.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self._slots = {}
+        self._free = []
+        self._icao24 = []
+        self._latitude = array('d')
+        self._longitude = array('d')
+        self._altitude = array('d')
+        self._velocity = array('d')
+        self._heading = array('d')
+        self._flags = array('B')
+        self._callsign = []
+        self._squawk = []
+        self._written_at = array('d')
+        self._missed = array('B')
+
+    def __len__(self):
+        return len(self._slots)
+
+    def _store(self, slot, s, now):
+        self._latitude[slot] = _num(s.latitude)
+        self._longitude[slot] = _num(s.longitude)
+        self._altitude[slot] = _num(s.baro_altitude)
+        self._velocity[slot] = _num(s.velocity)
+        self._heading[slot] = _num(s.true_track)
+        self._flags[slot] = bool(s.on_ground) | bool(s.spi) << 1
+        self._callsign[slot] = normalize_callsign(s.callsign)
+        self._squawk[slot] = s.squawk
+        self._written_at[slot] = now
+        self._missed[slot] = 0
+
+    def _allocate(self, icao24):
+        if self._free:
+            slot = self._free.pop()
+            self._icao24[slot] = icao24
+        else:
+            slot = len(self._icao24)
+            self._icao24.append(icao24)
+            for column in (self._latitude, self._longitude, self._altitude, self._velocity,
+                           self._heading, self._written_at):
+                column.append(math.nan)
+            self._flags.append(0)
+            self._missed.append(0)
+            self._callsign.append(None)
+            self._squawk.append(None)
+        self._slots[icao24] = slot
+        return slot
+
+    def _changed(self, slot, s):
+        return (
+            self._flags[slot] != (bool(s.on_ground) | bool(s.spi) << 1)
+            or self._callsign[slot] != normalize_callsign(s.callsign)
+            or self._squawk[slot] != s.squawk
+            or _differs(self._latitude[slot], _num(s.latitude), POSITION_TOLERANCE)
+            or _differs(self._longitude[slot], _num(s.longitude), POSITION_TOLERANCE)
+            or _differs(self._altitude[slot], _num(s.baro_altitude), ALTITUDE_TOLERANCE)
+            or _differs(self._velocity[slot], _num(s.velocity), VELOCITY_TOLERANCE)
+            or _heading_differs(self._heading[slot], _num(s.true_track))
+        )
+
+    def diff(self, states, now=None):
+        """
+        Compare a full snapshot with the last written one and record it as
+        written. Returns (inserted, updated, removed): new and changed state
+        vectors, and the icao24s of aircraft gone for MISSING_CYCLES snapshots.
+        """
+        now = time.time() if now is None else now
+        inserted, updated, present = [], [], set()
+        for s in states:
+            icao24 = s.icao24
+            if not icao24 or icao24 in present:
+                continue
+            present.add(icao24)
+            slot = self._slots.get(icao24)
+            if slot is None:
+                self._store(self._allocate(icao24), s, now)
+                inserted.append(s)
+            elif self._changed(slot, s) or now - self._written_at[slot] >= HEARTBEAT_SECONDS:
+                self._store(slot, s, now)
+                updated.append(s)
+            else:
+                self._missed[slot] = 0
+
+        removed = []
+        for icao24, slot in list(self._slots.items()):
+            if icao24 in present:
+                continue
+            self._missed[slot] = min(self._missed[slot] + 1, 255)
+            if self._missed[slot] >= MISSING_CYCLES:
+                removed.append(icao24)
+                del self._slots[icao24]
+                self._icao24[slot] = None
+                self._callsign[slot] = self._squawk[slot] = None
+                self._free.append(slot)
+        return inserted, updated, removed
+
+
+class LiveStateCache:
+    """
+    Latest OpenSky state vectors indexed by normalized callsign and icao24, plus
+    a fixed-size lat/lon grid for viewport queries.
+
+    The snapshot is replaced wholesale on every refresh, so readers never see a
+    half-built index. Once it is older than `ttl` seconds, lookups keep serving
+    the stale snapshot and kick off a single background refresh
+    (stale-while-revalidate) instead of blocking the request: from OpenSky in
+    the process that runs ingestion, from the live_flights table elsewhere.
+    """
+
+    def __init__(self, ttl=120):
+        self.ttl = ttl
+        self._by_callsign = {}
+        self._by_icao24 = {}
+        self._grid = {}
+        self._updated_at = None
+        self._refreshing = threading.Lock()
+
+    @property
+    def age(self):
+        if self._updated_at is None:
+            return None
+        return time.monotonic() - self._updated_at
+
+    def update(self, states):
+        by_callsign = {}
+        by_icao24 = {}
+        grid = {}
+        for s in states:
+            if s.icao24:
+                by_icao24[s.icao24.lower()] = s
+            callsign = normalize_callsign(s.callsign)
+            if callsign:
+                by_callsign[callsign] = s
+            if s.latitude is not None and s.longitude is not None:
+                grid.setdefault((_cell(s.latitude), _cell(s.longitude)), []).append(s)
+        self._by_callsign, self._by_icao24, self._grid = by_callsign, by_icao24, grid
+        self._updated_at = time.monotonic()
+
+    def lookup(self, flight_number):
+        """Return the live state for a callsign or icao24, or None."""
+        self._revalidate_if_stale()
+        key = normalize_callsign(flight_number)
+        return self._by_callsign.get(key) or self._by_icao24.get(key.lower())
+
+    def in_area(self, min_lat, max_lat, min_lon, max_lon,
+                min_altitude=None, max_altitude=None, min_velocity=None, max_velocity=None):
+        """
+        Return the states inside a bounding box, sorted by icao24 so callers can
+        paginate. A box with min_lon > max_lon wraps across the antimeridian.
+        Bounds are clamped to the globe, so the cells walked stay bounded.
+        """
+        self._revalidate_if_stale()
+        grid = self._grid
+        min_lat, max_lat = _clamp(min_lat, -90.0, 90.0), _clamp(max_lat, -90.0, 90.0)
+        min_lon, max_lon = _clamp(min_lon, -180.0, 180.0), _clamp(max_lon, -180.0, 180.0)
+        if min_lon <= max_lon:
+            lon_spans = [(min_lon, max_lon)]
+        else:
+            lon_spans = [(min_lon, 180.0), (-180.0, max_lon)]
+
+        matches = []
+        for lon_low, lon_high in lon_spans:
+            for lat_cell in _cell_range(min_lat, max_lat):
+                for lon_cell in _cell_range(lon_low, lon_high):
+                    for s in grid.get((lat_cell, lon_cell), ()):
+                        if (min_lat <= s.latitude <= max_lat
+                                and lon_low <= s.longitude <= lon_high
+                                and _between(s.baro_altitude, min_altitude, max_altitude)
+                                and _between(s.velocity, min_velocity, max_velocity)):
+                            matches.append(s)
+        matches.sort(key=lambda s: s.icao24)
+        return matches
+
+    def _revalidate_if_stale(self):
+        age = self.age
+        if age is not None and age < self.ttl:
+            return
+        # Only one refresh at a time; everyone else keeps using the old snapshot
+        if self._refreshing.acquire(blocking=False):
+            threading.Thread(target=self._refresh, name='live-state-refresh', daemon=True).start()
+
+    def _refresh(self):
+        try:
+            if ingesting():
+                states = fetch_states().states
+            else:
+                with db.pool.connection() as conn:
+                    states = load_states(conn)
+            if states:
+                self.update(states)
+        except Exception as e:
+            logger.error(f"Error refreshing live state cache: {e}")
+        finally:
+            self._refreshing.release()
+
+
+# A live_flights row under the StateVector attribute names that readers of state_cache use
+StoredState = namedtuple('StoredState', (
+    'icao24', 'callsign', 'origin_country', 'longitude', 'latitude', 'baro_altitude',
+    'velocity', 'true_track', 'vertical_rate', 'squawk', 'spi', 'on_ground',
+))
+
+
+def load_states(conn):
+    """The state of every aircraft as last written to live_flights."""
+    rows = conn.execute('''
+        SELECT flight_id, callsign, origin_country, longitude, latitude, baro_altitude,
+               velocity, heading, vertical_rate, squawk, spi, on_ground
+        FROM live_flights
+    ''')
+    return [StoredState(*row[:10], bool(row[10]), bool(row[11])) for row in rows]
+
+
+# Set by init_app; ingestion runs where it is enabled and the scheduler was started (see jobs.py)
+_ingest_enabled = False
+
+
+def ingesting():
+    """Whether this process runs the ingestion job, and so may call OpenSky."""
+    return _ingest_enabled and scheduler.running
+
+
+state_cache = LiveStateCache()
+
+# What the database holds, as far as ingestion knows; diffed against each new snapshot
+written_snapshot = StateSnapshot()
+
+
+def _get_states():
+    states = opensky_api.get_states()
+    if states is None:
+        # OpenSkyApi swallows HTTP errors and returns None; count it as a failure
+        raise upstream.UpstreamError("OpenSky returned no response")
+    return states
+
+
+def fetch_states():
+    """All current state vectors, through the OpenSky upstream guard."""
+    return upstream.opensky.call(_get_states)
+
+
+def state_to_row(s, last_updated):
+    """Map an OpenSky StateVector onto the UPSERT_LIVE_FLIGHT parameters."""
+    # Normalized so booked flight numbers can be matched with an index lookup; NULL when
+    # the aircraft sends none, so it never matches a booking (or offer) without a flight number
+    callsign = normalize_callsign(s.callsign) or None
+    return (
+        s.icao24,  # This is the flight's unique ID from OpenSky
+        s.origin_country,
+        callsign or "N/A",
+        "On Ground" if s.on_ground else "In Air",
+        last_updated,
+        callsign,
+        s.origin_country,
+        s.longitude,
+        s.latitude,
+        s.baro_altitude,
+        s.velocity,
+        s.true_track,
+        s.vertical_rate,
+        s.squawk,
+        int(bool(s.spi)),
+        int(bool(s.on_ground)),
+    )
+
+
+def write_states(conn, states, last_updated, snapshot_time=None, removed=()):
+    """
+    Upsert the given state vectors, append their track points and delete the
+    `removed` icao24s, all in one transaction. Returns (rows upserted, track
+    points appended).
+    """
+    rows = [state_to_row(s, last_updated) for s in states if s.icao24]
+    with conn:
+        conn.executemany(UPSERT_LIVE_FLIGHT, rows)
+        points = tracks.append_states(conn, states, snapshot_time)
+        conn.executemany(DELETE_LIVE_FLIGHT, [(icao24,) for icao24 in removed])
+    return len(rows), points
+
+
+def fetch_live_flight_statuses():
+    """
+    Fetch live flight statuses from OpenSky API and update the live_flights table.
+    """
+    cycle_start = time.perf_counter()
+    try:
+        states = fetch_states()
+        fetched = time.perf_counter()
+        if not states.states:
+            logger.warning("OpenSky returned no flight states.")
+            ingest_stats['failures'] += 1
+            return
+
+        state_cache.update(states.states)
+        # Naive UTC, the format tracks.prune compares last_updated against
+        last_updated = datetime.now(timezone.utc).replace(tzinfo=None).isoformat(sep=' ')
+        inserted, updated, removed = written_snapshot.diff(states.states)
+        try:
+            with db.pool.connection() as conn:
+                rows, points = write_states(conn, inserted + updated, last_updated, states.time, removed)
+        except Exception:
+            # The snapshot already counts this delta as written; start over with a full write
+            written_snapshot.clear()
+            raise
+        written = time.perf_counter()
+        # Push the same delta to open status streams
+        status_hub.hub.publish(inserted + updated, removed)
+    except Exception as e:
+        ingest_stats['failures'] += 1
+        logger.exception(f"Error fetching live flight statuses: {e}")
+        return
+
+    write_seconds = written - fetched
+    ingest_stats.update(
+        cycles=ingest_stats['cycles'] + 1,
+        rows=rows,
+        inserted=len(inserted),
+        updated=len(updated),
+        removed=len(removed),
+        unchanged=len(states.states) - len(inserted) - len(updated),
+        track_points=points,
+        fetch_seconds=fetched - cycle_start,
+        write_seconds=write_seconds,
+        cycle_seconds=written - cycle_start,
+        rows_per_second=rows / write_seconds if write_seconds else 0.0,
+        last_success=last_updated,
+    )
+    logger.info(
+        f"Live flights updated: delta {len(inserted)} new, {len(updated)} changed, {len(removed)} removed "
+        f"of {len(states.states)} states ({ingest_stats['unchanged']} unchanged, not written); "
+        f"{points} track points in {ingest_stats['cycle_seconds']:.2f}s "
+        f"(fetch {ingest_stats['fetch_seconds']:.2f}s, write {write_seconds:.2f}s, "
+        f"{ingest_stats['rows_per_second']:.0f} rows/s)"
+    )
+
+
+def init_app(app):
+    global _ingest_enabled
+    app.config.setdefault('LIVE_FLIGHTS_INGEST', os.getenv('LIVE_FLIGHTS_INGEST', '1') == '1')
+    app.config.setdefault('LIVE_FLIGHTS_INTERVAL', int(os.getenv('LIVE_FLIGHTS_INTERVAL', '60')))
+    # Serve a snapshot for up to two ingestion cycles before revalidating on read
+    app.config.setdefault('LIVE_STATE_TTL', 2 * app.config['LIVE_FLIGHTS_INTERVAL'])
+    state_cache.ttl = app.config['LIVE_STATE_TTL']
+    _ingest_enabled = app.config['LIVE_FLIGHTS_INGEST']
+    if app.config['LIVE_FLIGHTS_INGEST']:
+        add_interval_job('ingest_live_flights', fetch_live_flight_statuses, app.config['LIVE_FLIGHTS_INTERVAL'])
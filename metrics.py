@@ -0,0 +1,307 @@
+# metrics.py
+"""
+Per-request instrumentation, exported in Prometheus text format.
+
+`init_app` times every request and records, by route:
+
+- http_request_duration_seconds: latency, labelled with method and status
+- http_request_sql_statements / http_request_sql_seconds: statements run and
+  time spent in SQLite (db.py's pooled connections report every statement)
+- http_request_upstream_seconds: time spent calling Amadeus/OpenSky/Gemini
+- http_request_render_seconds: Jinja render time
+
+alongside process-wide series for every SQL statement, every upstream call
+(latency and errors by kind) and every template, plus the stats the
+modules keep themselves (ingestion, chatbot, offer cache, status streams)
+through `Stats`. Work a request hands to
+another thread (flight_search's fan-out pool, the body of a streamed
+response) is counted in the process-wide series only.
+
+With METRICS_PROFILE_SAMPLE_RATE above 0, that fraction of requests runs
+under cProfile, and the profile of any sampled request slower than
+METRICS_PROFILE_THRESHOLD seconds is written to METRICS_PROFILE_DIR.
+"""
+import cProfile
+import logging
+import os
+import random
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from flask import before_render_template, request, template_rendered
+
+logger = logging.getLogger(__name__)
+
+# Seconds; from a cached lookup to a slow upstream call
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SQL_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250, 1000)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_registry = []
+
+# Copied from app.config by init_app
+_config = {
+    'METRICS_PROFILE_SAMPLE_RATE': 0.0,
+    'METRICS_PROFILE_THRESHOLD': 1.0,
+    'METRICS_PROFILE_DIR': 'profiles',
+}
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{value}"' for name, value in extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def collect(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            yield f"{self.name}{_labels(self.labelnames, labels)} {value}"
+
+
+class Gauge:
+    """Read when scraped: `read()` returns {label values: value}."""
+
+    def __init__(self, name, documentation, labelnames, read):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.read = read
+        _registry.append(self)
+
+    def collect(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} gauge"
+        for labels, value in sorted(self.read().items()):
+            yield f"{self.name}{_labels(self.labelnames, labels)} {value}"
+
+
+class Stats:
+    """
+    A module's stats dict, read when scraped: each numeric value is exported
+    as `<prefix>_<key>`, as a counter for the keys in `counters` (which get
+    a `_total` suffix) and as a gauge otherwise.
+    """
+
+    def __init__(self, prefix, documentation, read, counters=()):
+        self.prefix = prefix
+        self.documentation = documentation
+        self.read = read
+        self.counters = frozenset(counters)
+        _registry.append(self)
+
+    def collect(self):
+        for key, value in self.read().items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            name = f"{self.prefix}_{key}"
+            kind = 'gauge'
+            if key in self.counters:
+                kind = 'counter'
+                if not name.endswith('_total'):
+                    name += '_total'
+            yield f"# HELP {name} {self.documentation} ({key})."
+            yield f"# TYPE {name} {kind}"
+            yield f"{name} {value}"
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [per-bucket counts (last is +Inf), sum]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def collect(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            series = sorted((labels, list(counts), total) for labels, (counts, total) in self._series.items())
+        for labels, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(float(bound))
+                yield f"{self.name}_bucket{_labels(self.labelnames, labels, [('le', le)])} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {total}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}"
+
+
+def render():
+    """Every registered metric in the Prometheus text exposition format."""
+    return '\n'.join(line for metric in _registry for line in metric.collect()) + '\n'
+
+
+request_seconds = Histogram(
+    'http_request_duration_seconds', "Request latency until the response is returned.",
+    ('route', 'method', 'status'))
+request_sql_statements = Histogram(
+    'http_request_sql_statements', "SQL statements run per request.", ('route',), COUNT_BUCKETS)
+request_sql_seconds = Histogram(
+    'http_request_sql_seconds', "Time per request spent executing SQL.", ('route',))
+request_upstream_seconds = Histogram(
+    'http_request_upstream_seconds', "Time per request spent calling upstream providers.", ('route',))
+request_render_seconds = Histogram(
+    'http_request_render_seconds', "Time per request spent rendering templates.", ('route',))
+
+sql_seconds = Histogram(
+    'sqlite_statement_duration_seconds', "Time to execute one SQL statement (all threads).", (), SQL_BUCKETS)
+upstream_seconds = Histogram(
+    'upstream_request_duration_seconds', "Latency of one upstream call attempt.", ('upstream',))
+upstream_errors = Counter(
+    'upstream_errors_total', "Failed upstream call attempts, by kind (transient, error, rejected).",
+    ('upstream', 'kind'))
+render_seconds = Histogram(
+    'template_render_duration_seconds', "Time to render one template.", ('template',))
+profiles_written = Counter('profiles_written_total', "Slow request profiles written to disk.")
+
+
+class _RequestTimings:
+    __slots__ = ('start', 'sql_statements', 'sql_seconds', 'upstream_seconds', 'render_seconds',
+                 'render_start', 'profiler')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.sql_statements = 0
+        self.sql_seconds = self.upstream_seconds = self.render_seconds = 0.0
+        self.render_start = None
+        self.profiler = None
+
+
+# Timings of the request being handled on this thread, None elsewhere (background jobs)
+_current = ContextVar('request_timings', default=None)
+
+
+def observe_sql(seconds):
+    sql_seconds.observe(seconds)
+    timings = _current.get()
+    if timings is not None:
+        timings.sql_statements += 1
+        timings.sql_seconds += seconds
+
+
+def observe_upstream(name, seconds):
+    upstream_seconds.observe(seconds, name)
+    timings = _current.get()
+    if timings is not None:
+        timings.upstream_seconds += seconds
+
+
+def _before_render(sender, template, context, **extra):
+    timings = _current.get()
+    if timings is not None:
+        timings.render_start = time.perf_counter()
+
+
+def _rendered(sender, template, context, **extra):
+    timings = _current.get()
+    if timings is not None and timings.render_start is not None:
+        elapsed = time.perf_counter() - timings.render_start
+        timings.render_start = None
+        timings.render_seconds += elapsed
+        render_seconds.observe(elapsed, template.name or '<string>')
+
+
+def _start_request():
+    timings = _RequestTimings()
+    _current.set(timings)
+    sample_rate = _config['METRICS_PROFILE_SAMPLE_RATE']
+    if sample_rate > 0 and random.random() < sample_rate:
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+            timings.profiler = profiler
+        except ValueError:
+            # Another profiler is already running (one per process on newer Pythons)
+            pass
+
+
+def _finish_request(response):
+    timings = _current.get()
+    if timings is None:
+        return response
+    elapsed = time.perf_counter() - timings.start
+    route = request.url_rule.rule if request.url_rule else '<unmatched>'
+    request_seconds.observe(elapsed, route, request.method, str(response.status_code))
+    request_sql_statements.observe(timings.sql_statements, route)
+    request_sql_seconds.observe(timings.sql_seconds, route)
+    request_upstream_seconds.observe(timings.upstream_seconds, route)
+    request_render_seconds.observe(timings.render_seconds, route)
+    if timings.profiler is not None:
+        timings.profiler.disable()
+        if elapsed >= _config['METRICS_PROFILE_THRESHOLD']:
+            _dump_profile(timings.profiler, route, elapsed)
+        timings.profiler = None
+    return response
+
+
+def _end_request(exception=None):
+    timings = _current.get()
+    if timings is not None and timings.profiler is not None:
+        # The response was never finished (e.g. a before_request handler failed)
+        timings.profiler.disable()
+    _current.set(None)
+
+
+def _dump_profile(profiler, route, elapsed):
+    directory = _config['METRICS_PROFILE_DIR']
+    name = re.sub(r'[^A-Za-z0-9]+', '_', route).strip('_') or 'root'
+    path = os.path.join(directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{name}-{elapsed * 1000:.0f}ms.prof")
+    try:
+        os.makedirs(directory, exist_ok=True)
+        profiler.dump_stats(path)
+    except OSError as e:
+        logger.warning(f"Could not write profile for {route}: {e}")
+        return
+    profiles_written.inc()
+    logger.warning(f"Slow request {request.method} {request.path} took {elapsed:.2f}s; profile written to {path}")
+
+
+def init_app(app):
+    app.config.setdefault('METRICS_PROFILE_SAMPLE_RATE', float(os.getenv('METRICS_PROFILE_SAMPLE_RATE', '0')))
+    app.config.setdefault('METRICS_PROFILE_THRESHOLD', float(os.getenv('METRICS_PROFILE_THRESHOLD', '1.0')))
+    app.config.setdefault('METRICS_PROFILE_DIR', os.getenv('METRICS_PROFILE_DIR', 'profiles'))
+    for key in _config:
+        _config[key] = app.config[key]
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_end_request)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_rendered, app)
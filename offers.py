@@ -0,0 +1,183 @@
+# offers.py
+"""
+Compact model of Amadeus flight offers.
+
+An offer keeps every itinerary (outbound and, for round trips, the return
+leg) and every segment in it, so connections are no longer dropped. All
+three types are NamedTuples: they have no per-instance __dict__, so the
+in-process offer cache holds them cheaply, and `json.dumps` writes them as
+nested arrays without field names, which is what the search_results table
+stores.
+
+Templates read the same attributes the old flight dicts had (airline,
+flight_number, origin, destination, departure_time, arrival_time, price),
+derived from the segments, plus duration and stops.
+"""
+import json
+import re
+from functools import lru_cache
+from typing import NamedTuple, Optional, Tuple
+
+_DURATION = re.compile(r'^P(?:(\d+)D)?T?(?:(\d+)H)?(?:(\d+)M)?')
+
+
+@lru_cache(maxsize=4096)
+def parse_duration(value):
+    """ISO 8601 duration ('PT2H10M', 'P1DT3H') -> minutes, or None."""
+    match = _DURATION.match(value or '')
+    if not match or not any(match.groups()):
+        return None
+    days, hours, minutes = (int(part or 0) for part in match.groups())
+    return days * 1440 + hours * 60 + minutes
+
+
+class Segment(NamedTuple):
+    carrier: str
+    number: str
+    origin: str
+    destination: str
+    departure_time: str
+    arrival_time: str
+    duration: Optional[int]
+
+    @property
+    def flight_number(self):
+        return self.carrier + self.number
+
+
+class Itinerary(NamedTuple):
+    duration: Optional[int]
+    segments: Tuple[Segment, ...]
+
+    @property
+    def stops(self):
+        return max(len(self.segments) - 1, 0)
+
+
+class Offer(NamedTuple):
+    flight_id: str
+    price: str
+    currency: str
+    itineraries: Tuple[Itinerary, ...]
+
+    # First and last segment of the outbound itinerary, or None
+    @property
+    def _first(self):
+        if self.itineraries and self.itineraries[0].segments:
+            return self.itineraries[0].segments[0]
+        return None
+
+    @property
+    def _last(self):
+        if self.itineraries and self.itineraries[0].segments:
+            return self.itineraries[0].segments[-1]
+        return None
+
+    @property
+    def airline(self):
+        return self._first.carrier if self._first else "N/A"
+
+    @property
+    def flight_number(self):
+        return self._first.flight_number if self._first else "N/A"
+
+    @property
+    def origin(self):
+        return self._first.origin if self._first else "N/A"
+
+    @property
+    def destination(self):
+        return self._last.destination if self._last else "N/A"
+
+    @property
+    def departure_time(self):
+        return self._first.departure_time if self._first else "N/A"
+
+    @property
+    def arrival_time(self):
+        return self._last.arrival_time if self._last else "N/A"
+
+    @property
+    def amount(self):
+        return float(self.price)
+
+    @property
+    def duration(self):
+        """Total minutes over all itineraries, or None if Amadeus gave none."""
+        known = [itinerary.duration for itinerary in self.itineraries if itinerary.duration is not None]
+        return sum(known) if known else None
+
+    @property
+    def stops(self):
+        return sum(itinerary.stops for itinerary in self.itineraries)
+
+    @property
+    def is_round_trip(self):
+        return len(self.itineraries) > 1
+
+    def summary(self):
+        """Flat dict for JSON responses and the search page's script."""
+        return {
+            'flight_id': self.flight_id,
+            'price': self.price,
+            'currency': self.currency,
+            'airline': self.airline,
+            'flight_number': self.flight_number,
+            'origin': self.origin,
+            'destination': self.destination,
+            'departure_time': self.departure_time,
+            'arrival_time': self.arrival_time,
+            'duration': self.duration,
+            'stops': self.stops,
+            'segments': [
+                [segment.flight_number, segment.origin, segment.destination,
+                 segment.departure_time, segment.arrival_time]
+                for itinerary in self.itineraries for segment in itinerary.segments
+            ],
+        }
+
+    def to_json(self):
+        return json.dumps(self, separators=(',', ':'))
+
+    @classmethod
+    def from_row(cls, row):
+        """Rebuild an offer from the nested lists `to_json` produced."""
+        flight_id, price, currency, itineraries = row
+        return cls(flight_id, price, currency, tuple(
+            Itinerary(duration, tuple(Segment(*segment) for segment in segments))
+            for duration, segments in itineraries
+        ))
+
+    @classmethod
+    def from_json(cls, text):
+        return cls.from_row(json.loads(text))
+
+
+# tuple.__new__ without the keyword handling of Segment(...); parsing builds many of these
+_segment = Segment._make
+
+
+def parse_offer(offer):
+    """Build an Offer from one raw Amadeus flight-offer dict."""
+    itineraries = []
+    for itinerary in offer.get('itineraries') or ():
+        segments = tuple(
+            _segment((
+                segment['carrierCode'],
+                segment['number'],
+                segment['departure']['iataCode'],
+                segment['arrival']['iataCode'],
+                segment['departure']['at'],
+                segment['arrival']['at'],
+                parse_duration(segment.get('duration')),
+            ))
+            for segment in itinerary.get('segments') or ()
+        )
+        itineraries.append(Itinerary(parse_duration(itinerary.get('duration')), segments))
+    price = offer['price']
+    return Offer(offer['id'], price['total'], price.get('currency', ''), tuple(itineraries))
+
+
+def parse_offers(flight_data):
+    """Parse a list of raw Amadeus offers (a response's `.data`)."""
+    return [parse_offer(offer) for offer in flight_data]
@@ -0,0 +1,73 @@
+# passwords.py
+"""
+Password hashing on a dedicated, bounded worker pool.
+
+bcrypt is deliberately CPU-heavy, so hashing and checking run on a small
+thread pool (bcrypt releases the GIL while it works) instead of directly on
+the request thread. At most `workers + queue_depth` jobs are admitted at once;
+beyond that `HashQueueFull` is raised so the route can answer 429 straight
+away instead of piling up behind a login storm.
+
+Hashes are stored base64-encoded, as they always have been in the users table.
+"""
+import base64
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+# bcrypt work factor for new hashes; existing hashes are upgraded on login
+BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', '12'))
+
+
+class HashQueueFull(Exception):
+    """Raised when the hashing pool is saturated."""
+
+
+class PasswordHasher:
+    def __init__(self, rounds=BCRYPT_ROUNDS, workers=None, queue_depth=32):
+        self.rounds = rounds
+        workers = workers or os.cpu_count() or 2
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt')
+        self._slots = threading.BoundedSemaphore(workers + queue_depth)
+
+    def _run(self, func, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HashQueueFull()
+        try:
+            future = self._executor.submit(func, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result()
+
+    def _hash(self, password):
+        hashed = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=self.rounds))
+        return base64.b64encode(hashed).decode('utf-8')
+
+    def hash_password(self, password):
+        """Return the base64-encoded bcrypt hash of `password`."""
+        return self._run(self._hash, password)
+
+    def verify_password(self, password, stored):
+        """
+        Check `password` against a stored base64 hash.
+        Returns (matches, needs_rehash); needs_rehash is True when the hash was
+        made with a different work factor than the configured one.
+        """
+        stored_hashed = base64.b64decode(stored.encode('utf-8'))
+        matches = self._run(bcrypt.checkpw, password.encode('utf-8'), stored_hashed)
+        return matches, matches and cost_of(stored_hashed) != self.rounds
+
+
+def cost_of(hashed):
+    """Work factor encoded in a bcrypt hash, e.g. 12 for b'$2b$12$...'."""
+    return int(hashed.split(b'$')[2])
+
+
+hasher = PasswordHasher(
+    workers=int(os.getenv('HASH_WORKERS', '0')) or None,
+    queue_depth=int(os.getenv('HASH_QUEUE_DEPTH', '32')),
+)
@@ -0,0 +1,188 @@
+# recommendations.py
+"""
+Gemini flight recommendations, generated off the request path.
+
+`request_recommendations` returns cached recommendations immediately, or
+queues a background job on a small thread pool and returns None so the page
+can render and poll for them. `invalidate` drops a user's cached result and
+pending job whenever their bookings or preferences change; a job that was
+already running finds it is no longer the user's pending one and discards
+its result. Nothing is kept per user beyond the bounded cache and the jobs
+still waiting to be collected.
+"""
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import db
+import gemini
+import upstream
+from cache import SingleFlightCache
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('RECOMMENDATION_WORKERS', '2')),
+    thread_name_prefix='recommendations',
+)
+# Entries are replaced via `invalidate`, so the TTL is only a backstop
+_cache = SingleFlightCache(
+    ttl=int(os.getenv('RECOMMENDATION_TTL', '86400')),
+    maxsize=int(os.getenv('RECOMMENDATION_CACHE_SIZE', '1024')),
+)
+_pending = {}  # username -> (token, future) of the job generating their recommendations
+_lock = threading.Lock()
+
+
+def _load_user_context(conn, username):
+    """Fetches the user's booked flights and preferences."""
+    c = conn.cursor()
+    c.execute('''
+        SELECT flight_id, booking_price, origin, destination, departure_time, arrival_time, airline, flight_number
+        FROM bookings
+        WHERE username = ? AND cancelled = 0
+    ''', (username,))
+    booked_flights = c.fetchall()
+
+    # Fetch user preferences
+    c.execute('''
+        SELECT preferences
+        FROM users
+        WHERE username = ?
+    ''', (username,))
+    preferences_result = c.fetchone()
+    preferences = preferences_result[0] if preferences_result and preferences_result[0] else ''
+    return booked_flights, preferences
+
+
+def get_recommendations(username):
+    """
+    Fetches the user's booked flights and preferences, then generates flight recommendations using the Gemini API.
+    Returns a list of recommended flights, or None if they could not be generated.
+    """
+    with db.pool.connection() as conn:
+        booked_flights, preferences = _load_user_context(conn, username)
+
+    # Format booked flights into a readable string
+    if booked_flights:
+        booked_flights_str = "\n".join([
+            f"Flight {flight[6]} {flight[7]} from {flight[2]} to {flight[3]} on {flight[4]}"
+            for flight in booked_flights
+        ])
+    else:
+        booked_flights_str = "No booked flights."
+
+    # Create a prompt for the Gemini API
+    prompt = f"""
+Based on the user's booked flights and preferences, recommend some flights for them.
+
+User's Booked Flights:
+{booked_flights_str}
+
+User's Preferences:
+{preferences}
+
+Please provide a list of 3 recommended flights in the following JSON format:
+
+[
+    {{
+        "Flight ID": "FL123",
+        "Airline": "Airline Name",
+        "Flight Number": "Flight Number",
+        "Origin": "Origin Airport (IATA Code)",
+        "Destination": "Destination Airport (IATA Code)",
+        "Departure Time": "mm/dd/yyyy HH:MM AM/PM",
+        "Arrival Time": "mm/dd/yyyy HH:MM AM/PM",
+        "Price": "$XXX"
+    }},
+    ...
+]
+"""
+
+    try:
+        # Use the shared Generative Model
+        model = gemini.get_model()
+
+        # Generate a response from the AI
+        response = upstream.gemini.call(
+            model.generate_content, prompt, request_options={'timeout': upstream.gemini.timeout}
+        )
+
+        # Extract the text from the response
+        recommendations_text = response.text.strip()
+
+        # Parse the recommendations_text into JSON
+        start = recommendations_text.find('[')
+        end = recommendations_text.rfind(']') + 1
+        if start == -1 or end == -1:
+            raise ValueError("AI did not return a valid JSON array.")
+
+        recommendations_json = recommendations_text[start:end]
+
+        # Load the JSON data
+        recommendations = json.loads(recommendations_json)
+
+        # Validate the structure of each recommended flight
+        valid_recommendations = []
+        for flight in recommendations:
+            required_keys = ["Flight ID", "Airline", "Flight Number", "Origin", "Destination", "Departure Time", "Arrival Time", "Price"]
+            if all(key in flight for key in required_keys):
+                valid_recommendations.append(flight)
+            else:
+                logger.warning(f"Incomplete flight data: {flight}")
+
+        return valid_recommendations
+
+    except Exception as e:
+        logger.error(f"Error generating recommendations: {e}")
+        return None
+
+
+def invalidate(username):
+    """Drop the user's cached recommendations (their bookings or preferences changed)."""
+    with _lock:
+        _cache.invalidate(username)
+        _pending.pop(username, None)
+
+
+def get_cached(username):
+    """Return the user's cached recommendations, or None."""
+    return _cache.get(username)
+
+
+def _compute(username, token):
+    result = get_recommendations(username)
+    if result is not None:
+        with _lock:
+            # Skip the write if the user was invalidated while we were generating
+            if _pending.get(username, (None,))[0] is token:
+                _cache.set(username, result)
+                del _pending[username]
+    return result
+
+
+def request_recommendations(username):
+    """
+    Return the user's recommendations if they are ready, otherwise make sure
+    they are being generated and return None.
+    """
+    with _lock:
+        cached = _cache.get(username)
+        if cached is not None:
+            _pending.pop(username, None)
+            return cached
+        if username in _pending:
+            _, future = _pending[username]
+            if future.done():
+                del _pending[username]
+        else:
+            token = object()
+            future = _executor.submit(_compute, username, token)
+            _pending[username] = (token, future)
+
+    if not future.done():
+        return None
+    # A failed generation is reported as "no recommendations" once and retried next time
+    return future.result() or []
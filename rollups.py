@@ -0,0 +1,158 @@
+# rollups.py
+"""
+Incrementally maintained rollups behind the /analytics page.
+
+Every booking and coupon write bumps a counter per dimension (flight, route,
+airline, coupon code and an overall total) in two buckets: the hour it
+happened in and the all-time bucket '*'. Reports therefore read a handful of
+rollup rows, never the bookings or coupons tables:
+
+- all-time figures are primary-key lookups on the '*' bucket
+- the 24h/7d/30d windows sum at most 24/168/720 hourly buckets per key
+
+Bookings made before booked_at was recorded have no hour, so they are
+counted in the all-time bucket only; `booking_buckets` is the one rule for
+where a booking is counted, used when it is added and when it is cancelled.
+"""
+from datetime import datetime, timedelta, timezone
+
+# Sorts before every 'YYYY-MM-DD HH' bucket, so hourly range scans never include it
+ALL_TIME = '*'
+
+# Window name -> length in hours (None = all time)
+WINDOWS = {'24h': 24, '7d': 24 * 7, '30d': 24 * 30, 'all': None}
+
+# Dimension -> SQL expression over a bookings row (coupons are handled separately)
+BOOKING_DIMENSIONS = {
+    'flight': "COALESCE(flight_number, '')",
+    'route': "COALESCE(origin, '') || '-' || COALESCE(destination, '')",
+    'airline': "COALESCE(airline, '')",
+    'total': "''",
+}
+DIMENSIONS = tuple(BOOKING_DIMENSIONS) + ('coupon',)
+
+_BUMP = '''
+    INSERT INTO analytics_rollups (dimension, bucket, key, count, amount) VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(dimension, bucket, key) DO UPDATE SET
+        count = count + excluded.count,
+        amount = amount + excluded.amount
+'''
+
+
+def _utcnow():
+    """Naive UTC, so stored timestamps keep their 'YYYY-MM-DD HH:MM:SS' format."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def now_timestamp():
+    return _utcnow().isoformat(sep=' ', timespec='seconds')
+
+
+def hour_bucket(timestamp):
+    """'2024-11-01 10:23:45' -> '2024-11-01 10'."""
+    return timestamp[:13]
+
+
+def booking_buckets(booked_at):
+    """The buckets a booking booked at `booked_at` (None if unknown) is counted in."""
+    return (hour_bucket(booked_at), ALL_TIME) if booked_at else (ALL_TIME,)
+
+
+def _booking_keys(origin, destination, airline, flight_number):
+    return {
+        'flight': flight_number or '',
+        'route': f"{origin or ''}-{destination or ''}",
+        'airline': airline or '',
+        'total': '',
+    }
+
+
+def _bump_booking(conn, booked_at, origin, destination, airline, flight_number, price, sign):
+    buckets = booking_buckets(booked_at)
+    conn.executemany(_BUMP, [
+        (dimension, bucket, key, sign, sign * (price or 0.0))
+        for dimension, key in _booking_keys(origin, destination, airline, flight_number).items()
+        for bucket in buckets
+    ])
+
+
+def record_bookings(conn, bookings):
+    """
+    Record many (booked_at, origin, destination, airline, flight_number, price)
+    bookings, summed per rollup row first so each row is written once.
+    """
+    totals = {}
+    for booked_at, origin, destination, airline, flight_number, price in bookings:
+        for dimension, key in _booking_keys(origin, destination, airline, flight_number).items():
+            for bucket in booking_buckets(booked_at):
+                count, amount = totals.get((dimension, bucket, key), (0, 0.0))
+                totals[(dimension, bucket, key)] = (count + 1, amount + (price or 0.0))
+    conn.executemany(_BUMP, [row + total for row, total in totals.items()])
+
+
+def record_cancellation(conn, booked_at, origin, destination, airline, flight_number, price):
+    """Take a booking back out of the buckets it was counted in."""
+    _bump_booking(conn, booked_at, origin, destination, airline, flight_number, price, -1)
+
+
+def record_coupon(conn, created_at, coupon_code, discount):
+    conn.executemany(_BUMP, [
+        ('coupon', bucket, coupon_code or '', 1, discount or 0.0)
+        for bucket in (hour_bucket(created_at), ALL_TIME)
+    ])
+
+
+def _window_start(window):
+    hours = WINDOWS[window]
+    if hours is None:
+        return None
+    return hour_bucket((_utcnow() - timedelta(hours=hours - 1)).isoformat(sep=' '))
+
+
+def top(conn, dimension, window='all', limit=20):
+    """Return [(key, count, amount)] for a dimension over a window, largest count first."""
+    start = _window_start(window)
+    if start is None:
+        rows = conn.execute('''
+            SELECT key, count, amount FROM analytics_rollups
+            WHERE dimension = ? AND bucket = ? AND count > 0
+            ORDER BY count DESC, key LIMIT ?
+        ''', (dimension, ALL_TIME, limit))
+    else:
+        rows = conn.execute('''
+            SELECT key, SUM(count), SUM(amount) FROM analytics_rollups
+            WHERE dimension = ? AND bucket >= ?
+            GROUP BY key HAVING SUM(count) > 0
+            ORDER BY 2 DESC, key LIMIT ?
+        ''', (dimension, start, limit))
+    return rows.fetchall()
+
+
+def per_day(conn, window='30d'):
+    """Return [(day, bookings, revenue)] for the window, most recent day first."""
+    start = _window_start(window if WINDOWS[window] else '30d')
+    return conn.execute('''
+        SELECT substr(bucket, 1, 10) AS day, SUM(count), SUM(amount) FROM analytics_rollups
+        WHERE dimension = 'total' AND key = '' AND bucket >= ?
+        GROUP BY day ORDER BY day DESC
+    ''', (start,)).fetchall()
+
+
+def backfill(conn):
+    """Rebuild every rollup from the bookings and coupons tables."""
+    conn.execute("DELETE FROM analytics_rollups")
+    now_hour = hour_bucket(now_timestamp())
+    for dimension, expression in BOOKING_DIMENSIONS.items():
+        # Same buckets as booking_buckets: hourly only when booked_at is known
+        for bucket, known in (("substr(booked_at, 1, 13)", "AND booked_at IS NOT NULL"), ("?", "")):
+            conn.execute(f'''
+                INSERT INTO analytics_rollups (dimension, bucket, key, count, amount)
+                SELECT ?, {bucket} AS b, {expression} AS k, COUNT(*), COALESCE(SUM(booking_price), 0)
+                FROM bookings WHERE cancelled = 0 {known} GROUP BY b, k
+            ''', (dimension,) + ((ALL_TIME,) if bucket == "?" else ()))
+    for bucket in ("COALESCE(substr(created_at, 1, 13), ?)", "?"):
+        conn.execute(f'''
+            INSERT INTO analytics_rollups (dimension, bucket, key, count, amount)
+            SELECT 'coupon', {bucket} AS b, COALESCE(coupon_code, '') AS k, COUNT(*), COALESCE(SUM(discount), 0)
+            FROM coupons GROUP BY b, k
+        ''', (now_hour if bucket != "?" else ALL_TIME,))
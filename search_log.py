@@ -0,0 +1,134 @@
+# search_log.py
+"""
+Buffered search logging and popular-route precomputation.
+
+`log_search` only appends to an in-memory buffer, so it never adds database
+latency to the search request. A background flusher writes the buffer to the
+search_logs table with one `executemany` whenever it reaches FLUSH_SIZE
+entries or every FLUSH_SECONDS, whichever comes first.
+
+A scheduled job ranks the most searched origin/destination/date combinations
+and pre-warms the flight offer cache for the hottest of them.
+"""
+import atexit
+import logging
+import os
+import threading
+from datetime import date, datetime, timedelta, timezone
+
+import db
+from jobs import add_interval_job
+
+logger = logging.getLogger(__name__)
+
+FLUSH_SIZE = int(os.getenv('SEARCH_LOG_FLUSH_SIZE', '100'))
+FLUSH_SECONDS = float(os.getenv('SEARCH_LOG_FLUSH_SECONDS', '5'))
+
+_buffer = []
+_buffer_lock = threading.Lock()
+_wake = threading.Event()
+_flusher = None
+
+# Latest ranking from refresh_popular_routes: [(origin, destination, departure_date, searches)]
+popular_routes = []
+
+
+def log_search(username, origin, destination, departure_date):
+    """Queue a search for logging; returns immediately."""
+    searched_at = datetime.now(timezone.utc).replace(tzinfo=None).isoformat(sep=' ')
+    entry = (username, origin, destination, departure_date, searched_at)
+    with _buffer_lock:
+        _buffer.append(entry)
+        full = len(_buffer) >= FLUSH_SIZE
+    _ensure_flusher()
+    if full:
+        _wake.set()
+
+
+def flush():
+    """Write everything buffered so far. Returns the number of rows written."""
+    global _buffer
+    with _buffer_lock:
+        pending, _buffer = _buffer, []
+    if not pending:
+        return 0
+    try:
+        with db.pool.connection() as conn:
+            with conn:
+                conn.executemany(
+                    "INSERT INTO search_logs (username, origin, destination, departure_date, search_time) "
+                    "VALUES (?, ?, ?, ?, ?)", pending
+                )
+    except Exception as e:
+        logger.exception(f"Error writing search logs: {e}")
+        # Put the rows back so the next flush retries them
+        with _buffer_lock:
+            _buffer = pending + _buffer
+        return 0
+    return len(pending)
+
+
+def _flush_loop():
+    while True:
+        _wake.wait(FLUSH_SECONDS)
+        _wake.clear()
+        flush()
+
+
+def _ensure_flusher():
+    global _flusher
+    if _flusher is None:
+        with _buffer_lock:
+            if _flusher is None:
+                _flusher = threading.Thread(target=_flush_loop, name='search-log-flusher', daemon=True)
+                _flusher.start()
+
+
+atexit.register(flush)
+
+
+def top_routes(conn, days=7, limit=20):
+    """Most searched (origin, destination, departure_date) over the last `days`, upcoming dates only."""
+    since = (datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=days)).isoformat(sep=' ')
+    return conn.execute('''
+        SELECT origin, destination, departure_date, COUNT(*) AS searches
+        FROM search_logs
+        WHERE search_time >= ? AND departure_date >= ?
+        GROUP BY origin, destination, departure_date
+        ORDER BY searches DESC
+        LIMIT ?
+    ''', (since, date.today().isoformat(), limit)).fetchall()
+
+
+def refresh_popular_routes(prewarm=None, prewarm_count=10):
+    """Recompute `popular_routes` and pre-warm offers for the top `prewarm_count` of them."""
+    global popular_routes
+    flush()
+    try:
+        with db.pool.connection() as conn:
+            popular_routes = top_routes(conn)
+    except Exception as e:
+        logger.exception(f"Error computing popular routes: {e}")
+        return
+
+    if prewarm is None:
+        return
+    warmed = 0
+    for origin, destination, departure_date, _ in popular_routes[:prewarm_count]:
+        try:
+            prewarm(origin, destination, departure_date)
+            warmed += 1
+        except Exception as e:
+            logger.warning(f"Could not pre-warm offers for {origin}-{destination} on {departure_date}: {e}")
+    logger.info(f"Popular routes refreshed: {len(popular_routes)} ranked, {warmed} pre-warmed.")
+
+
+def init_app(app, prewarm=None):
+    """Schedule the popular-routes job; `prewarm(origin, destination, departure_date)` loads offers."""
+    app.config.setdefault('POPULAR_ROUTES_INTERVAL', int(os.getenv('POPULAR_ROUTES_INTERVAL', '240')))
+    app.config.setdefault('PREWARM_ROUTES', int(os.getenv('PREWARM_ROUTES', '10')))
+    add_interval_job(
+        'refresh_popular_routes',
+        lambda: refresh_popular_routes(prewarm, app.config['PREWARM_ROUTES']),
+        app.config['POPULAR_ROUTES_INTERVAL'],
+    )
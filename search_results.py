@@ -0,0 +1,71 @@
+# search_results.py
+"""
+Server-side store for flight search results.
+
+A search writes its offers to the search_results table under a random search
+id; only that id goes into the (cookie) session. Booking then fetches the one
+chosen offer by primary key instead of scanning a list carried in the cookie.
+Offers are stored in the compact array form of offers.Offer.
+"""
+import logging
+import os
+import time
+import uuid
+
+import db
+from jobs import add_interval_job
+from offers import Offer
+
+logger = logging.getLogger(__name__)
+
+# How long a search stays bookable, in seconds
+RESULT_TTL = int(os.getenv('SEARCH_RESULT_TTL', '3600'))
+
+
+def new_search_id():
+    return uuid.uuid4().hex
+
+
+def save_results(conn, username, flights, search_id=None):
+    """
+    Store a list of offers.Offer and return the search id. Passing an existing
+    `search_id` adds to that search (flexible searches save each query as it
+    completes).
+    """
+    search_id = search_id or new_search_id()
+    now = time.time()
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO search_results (search_id, flight_id, username, offer, created_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [(search_id, offer.flight_id, username, offer.to_json(), now) for offer in flights]
+        )
+    return search_id
+
+
+def get_offer(conn, search_id, username, flight_id):
+    """Return one stored Offer, or None if it is unknown, expired or not the user's."""
+    row = conn.execute(
+        "SELECT offer FROM search_results "
+        "WHERE search_id = ? AND flight_id = ? AND username = ? AND created_at >= ?",
+        (search_id, flight_id, username, time.time() - RESULT_TTL)
+    ).fetchone()
+    return Offer.from_json(row[0]) if row else None
+
+
+def prune_search_results():
+    """Delete results older than RESULT_TTL."""
+    try:
+        with db.pool.connection() as conn:
+            with conn:
+                deleted = conn.execute(
+                    "DELETE FROM search_results WHERE created_at < ?", (time.time() - RESULT_TTL,)
+                ).rowcount
+        if deleted:
+            logger.info(f"Pruned {deleted} expired search results.")
+    except Exception as e:
+        logger.exception(f"Error pruning search results: {e}")
+
+
+def init_app(app):
+    add_interval_job('prune_search_results', prune_search_results, 600)
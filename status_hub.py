@@ -0,0 +1,185 @@
+# status_hub.py
+"""
+In-process fan-out of live flight status changes to server-sent-event streams.
+
+The ingestion job publishes the state vectors it has just written (already
+diffed by live_flights.StateSnapshot) once per cycle. The hub keeps an index
+of watched callsign -> subscriptions and forwards each state only to the
+subscriptions watching its callsign, and only the fields that changed since
+the hub last published that callsign. With nobody subscribed, publishing is
+a single check.
+
+A subscription holds its pending changes in a dict keyed by callsign rather
+than a queue: changes that arrive while a client is slow to read are merged
+into the entry for that callsign, so a stalled connection holds at most one
+entry per booked flight and never blocks the ingestion job.
+
+The hub is per process, fed by the ingestion job running in that process,
+and jobs.py runs the jobs in one process only. Streams opened in any other
+process get their snapshot and keep-alives but no pushes, so serve the app
+from a single process with threads, e.g.
+
+    gunicorn --workers 1 --threads 132 app:app
+
+Each open stream holds a worker thread for up to STREAM_SECONDS, so size the
+thread pool at MAX_SUBSCRIBERS plus the threads ordinary requests need (32
+in the example). Once MAX_SUBSCRIBERS streams are open, further streams get
+a 503 instead of starving page requests of threads.
+"""
+import os
+import threading
+
+import live_flights
+import metrics
+
+# Concurrent streams served; each holds a worker thread while it is open (see above)
+MAX_SUBSCRIBERS = int(os.getenv('STATUS_STREAM_MAX_SUBSCRIBERS', '100'))
+# Comment sent when nothing changed, so dead connections are noticed and proxies keep the stream open
+KEEPALIVE_SECONDS = float(os.getenv('STATUS_STREAM_KEEPALIVE', '15'))
+# Streams end after this long; the browser reconnects and re-reads the user's bookings
+STREAM_SECONDS = float(os.getenv('STATUS_STREAM_SECONDS', '600'))
+
+# Fields pushed to clients, in the order they are sent
+FIELDS = ('status', 'latitude', 'longitude', 'altitude', 'velocity', 'heading')
+
+_MISSING = object()
+
+
+class HubFull(Exception):
+    """Raised by subscribe() when MAX_SUBSCRIBERS streams are already open."""
+
+
+def status_fields(s):
+    """The pushed fields of an OpenSky state vector, or of no state (not tracked)."""
+    if s is None:
+        return dict.fromkeys(FIELDS, None)
+    return {
+        'status': "On Ground" if s.on_ground else "In Air",
+        'latitude': s.latitude,
+        'longitude': s.longitude,
+        'altitude': s.baro_altitude,
+        'velocity': s.velocity,
+        'heading': s.true_track,
+    }
+
+
+class Subscription:
+    """Changes pending for one stream, merged per callsign until it reads them."""
+
+    def __init__(self, callsigns):
+        self.callsigns = frozenset(filter(None, map(live_flights.normalize_callsign, callsigns)))
+        self._pending = {}
+        self._ready = threading.Condition()
+        self.closed = False
+
+    def _push(self, callsign, changes):
+        with self._ready:
+            self._pending.setdefault(callsign, {}).update(changes)
+            self._ready.notify()
+
+    def get(self, timeout=None):
+        """Wait up to `timeout` seconds; return {callsign: changed fields} (empty on timeout)."""
+        with self._ready:
+            if not self._pending and not self.closed:
+                self._ready.wait(timeout)
+            pending, self._pending = self._pending, {}
+        return pending
+
+    def close(self):
+        with self._ready:
+            self.closed = True
+            self._ready.notify()
+
+
+class StatusHub:
+    def __init__(self, max_subscribers=MAX_SUBSCRIBERS):
+        self.max_subscribers = max_subscribers
+        self._lock = threading.Lock()
+        self._watchers = {}  # callsign -> set of Subscription
+        self._last = {}  # callsign -> fields as last published
+        self._callsign_of = {}  # icao24 -> callsign, for watched callsigns
+        self._icao24_of = {}  # watched callsign -> icao24 last seen flying it
+        self._subscriptions = set()
+        self.stats = {'subscribers': 0, 'rejected': 0, 'published': 0, 'deliveries': 0}
+
+    def subscribe(self, callsigns, current=()):
+        """
+        Watch `callsigns`. `current` are the state vectors the caller sent the
+        client as its starting point; they seed the hub for callsigns nobody
+        watched yet, so the first change is a delta and a later removal of
+        that aircraft is noticed.
+        """
+        subscription = Subscription(callsigns)
+        with self._lock:
+            if len(self._subscriptions) >= self.max_subscribers:
+                self.stats['rejected'] += 1
+                raise HubFull(f"{self.max_subscribers} status streams are already open.")
+            self._subscriptions.add(subscription)
+            for callsign in subscription.callsigns:
+                self._watchers.setdefault(callsign, set()).add(subscription)
+            for s in current:
+                callsign = live_flights.normalize_callsign(s.callsign)
+                if callsign in subscription.callsigns and callsign not in self._last:
+                    self._last[callsign] = status_fields(s)
+                    if s.icao24:
+                        self._callsign_of[s.icao24] = callsign
+                        self._icao24_of[callsign] = s.icao24
+            self.stats['subscribers'] = len(self._subscriptions)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+            for callsign in subscription.callsigns:
+                watchers = self._watchers.get(callsign)
+                if watchers is None:
+                    continue
+                watchers.discard(subscription)
+                if not watchers:
+                    # Forget the callsign entirely once nobody watches it
+                    del self._watchers[callsign]
+                    self._last.pop(callsign, None)
+                    self._icao24_of.pop(callsign, None)
+            if not self._watchers:
+                self._callsign_of.clear()
+            self.stats['subscribers'] = len(self._subscriptions)
+        subscription.close()
+
+    def _publish(self, callsign, fields):
+        last = self._last.setdefault(callsign, {})
+        changes = {key: value for key, value in fields.items() if last.get(key, _MISSING) != value}
+        if not changes:
+            return
+        last.update(changes)
+        self.stats['published'] += 1
+        for subscription in self._watchers[callsign]:
+            subscription._push(callsign, changes)
+            self.stats['deliveries'] += 1
+
+    def publish(self, states, removed=()):
+        """
+        Forward written state vectors and the icao24s of aircraft that are no
+        longer tracked to the subscriptions watching their callsigns.
+        """
+        if not self._watchers:
+            return
+        with self._lock:
+            for s in states:
+                callsign = live_flights.normalize_callsign(s.callsign)
+                if callsign not in self._watchers:
+                    continue
+                if s.icao24:
+                    self._callsign_of[s.icao24] = callsign
+                    self._icao24_of[callsign] = s.icao24
+                self._publish(callsign, status_fields(s))
+            for icao24 in removed:
+                callsign = self._callsign_of.pop(icao24, None)
+                # Unless the callsign has since been seen on another aircraft
+                if callsign in self._watchers and self._icao24_of.get(callsign) == icao24:
+                    self._publish(callsign, status_fields(None))
+
+
+hub = StatusHub()
+
+metrics.Stats('status_stream', "Live status streams", lambda: hub.stats,
+              counters=('rejected', 'published', 'deliveries'))
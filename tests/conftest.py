@@ -0,0 +1,96 @@
+# tests/conftest.py
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# A recorded Amadeus response (10 one-way DEL-BOM offers)
+OFFERS_FIXTURE = os.path.join(ROOT, 'benchmarks', 'fixtures', 'flight_offers_DEL_BOM_2024-11-20.json')
+
+# app reads its configuration at import time; run it on a throwaway copy of the database
+_workdir = tempfile.mkdtemp()
+shutil.copy(os.path.join(ROOT, 'database.db'), os.path.join(_workdir, 'database.db'))
+os.environ.update(
+    DATABASE=os.path.join(_workdir, 'database.db'),
+    BACKGROUND_JOBS='0',
+    LIVE_FLIGHTS_INGEST='0',
+)
+for name in ('SECRET_KEY', 'AMADEUS_CLIENT_ID', 'AMADEUS_CLIENT_SECRET', 'API_KEY'):
+    os.environ.setdefault(name, 'test')
+
+
+@pytest.fixture(scope='session')
+def flask_app():
+    import app
+
+    app.app.config['TESTING'] = True
+    yield app.app
+    shutil.rmtree(_workdir, ignore_errors=True)
+
+
+@pytest.fixture
+def client(flask_app):
+    return flask_app.test_client()
+
+
+@pytest.fixture
+def make_state():
+    """Factory of OpenSky state vectors (attributes as opensky_api.StateVector)."""
+    def make(icao24='abc123', **fields):
+        now = int(time.time())
+        state = dict(
+            icao24=icao24, callsign='AI101   ', origin_country='India', time_position=now, last_contact=now,
+            longitude=77.1, latitude=28.5, baro_altitude=10000.0, on_ground=False, velocity=230.0,
+            true_track=90.0, vertical_rate=0.0, sensors=None, geo_altitude=10050.0, squawk='1234',
+            spi=False, position_source=0,
+        )
+        state.update(fields)
+        return SimpleNamespace(**state)
+    return make
+
+
+@pytest.fixture
+def user(flask_app, client):
+    """A new user, logged in on `client`."""
+    from db import pool
+
+    username = f"user-{uuid.uuid4().hex[:8]}"
+    with pool.connection() as conn:
+        conn.execute("INSERT INTO users (username, password) VALUES (?, 'x')", (username,))
+        conn.commit()
+    with client.session_transaction() as session:
+        session['user'] = username
+    return username
+
+
+@pytest.fixture
+def search(client, user):
+    """Recorded offers saved as the user's last search: (search_id, [offers.Offer])."""
+    import offers
+    import search_results
+    from db import pool
+
+    with open(OFFERS_FIXTURE) as f:
+        found = offers.parse_offers(json.load(f)['data'])
+    with pool.connection() as conn:
+        search_id = search_results.save_results(conn, user, found)
+        conn.commit()
+    with client.session_transaction() as session:
+        session['search_id'] = search_id
+    return search_id, found
+
+
+@pytest.fixture
+def logged_in(client):
+    with client.session_transaction() as session:
+        session['user'] = 'tester'
+    return client
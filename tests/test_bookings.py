@@ -0,0 +1,97 @@
+# tests/test_bookings.py
+import pytest
+
+import bookings
+import search_results
+from db import pool
+
+
+def bulk(client, *items):
+    response = client.post('/api/bookings/bulk', json={'bookings': list(items)})
+    return response.status_code, response.get_json()
+
+
+def active_bookings(username):
+    with pool.connection() as conn:
+        return conn.execute(
+            "SELECT COUNT(*) FROM bookings WHERE username = ? AND cancelled = 0", (username,)
+        ).fetchone()[0]
+
+
+def test_repeated_bulk_request_books_once(client, user, search):
+    _, found = search
+    items = [{'flight_id': offer.flight_id, 'idempotency_key': f"k{offer.flight_id}"} for offer in found[:3]]
+
+    status, first = bulk(client, *items)
+    assert status == 201 and first['created'] == 3
+    status, second = bulk(client, *items)
+    assert status == 200 and second['created'] == 0
+    assert [r['status'] for r in second['results']] == ['duplicate'] * 3
+    assert [r['booking_id'] for r in second['results']] == [r['booking_id'] for r in first['results']]
+    assert active_bookings(user) == 3
+
+
+def test_partially_duplicated_batch(client, user, search):
+    _, found = search
+    status, _ = bulk(client, {'flight_id': found[0].flight_id, 'idempotency_key': 'a'})
+    assert status == 201
+
+    status, result = bulk(
+        client,
+        {'flight_id': found[0].flight_id, 'idempotency_key': 'a'},  # booked by the earlier request
+        {'flight_id': found[1].flight_id, 'idempotency_key': 'b'},
+        {'flight_id': found[2].flight_id, 'idempotency_key': 'b'},  # repeats a key from this batch
+        {'flight_id': 'no-such-offer'},
+    )
+    assert status == 201 and result['created'] == 1
+    assert [r['status'] for r in result['results']] == ['duplicate', 'created', 'duplicate', 'not_found']
+    assert result['results'][1]['booking_id'] == result['results'][2]['booking_id']
+    assert active_bookings(user) == 2
+
+
+def test_bulk_limit(client, user, search, monkeypatch):
+    _, found = search
+    monkeypatch.setattr(bookings, 'BULK_LIMIT', 2)
+    status, result = bulk(client, *({'flight_id': offer.flight_id} for offer in found[:3]))
+    assert status == 413 and 'At most 2' in result['error']
+    assert active_bookings(user) == 0
+
+
+@pytest.mark.parametrize('price', ['abc', '', 'nan', '-5'])
+def test_invalid_offer_books_nothing(user, search, price):
+    _, found = search
+    with pool.connection() as conn:
+        with pytest.raises(bookings.InvalidOffer):
+            bookings.create_bookings(conn, user, [(None, found[0]), (None, found[1]._replace(price=price))])
+        assert not conn.in_transaction
+    assert active_bookings(user) == 0
+
+
+def test_invalid_offer_is_reported_per_item(client, user, search):
+    _, found = search
+    with pool.connection() as conn:
+        search_id = search_results.save_results(conn, user, [found[0]._replace(price='abc'), found[1]])
+        conn.commit()
+    status, result = bulk(client, {'flight_id': found[0].flight_id, 'search_id': search_id},
+                          {'flight_id': found[1].flight_id, 'search_id': search_id})
+    assert status == 201
+    assert [r['status'] for r in result['results']] == ['invalid', 'created']
+
+
+def test_offer_can_be_booked_again_after_cancelling(client, user, search):
+    search_id, found = search
+    flight_id, price = found[0].flight_id, found[0].price
+
+    client.post('/book_flight', data={'flight_id': flight_id, 'price': price})
+    with pool.connection() as conn:
+        [(booking_id,)] = conn.execute("SELECT id FROM bookings WHERE username = ?", (user,)).fetchall()
+    client.post(f'/cancel_flight/{booking_id}')
+    assert active_bookings(user) == 0
+
+    response = client.post('/book_flight', data={'flight_id': flight_id, 'price': price}, follow_redirects=True)
+    assert b'Flight booked successfully!' in response.data
+    assert active_bookings(user) == 1
+    # A retry of the new booking is still a duplicate
+    response = client.post('/book_flight', data={'flight_id': flight_id, 'price': price}, follow_redirects=True)
+    assert b'This flight is already booked.' in response.data
+    assert active_bookings(user) == 1
@@ -0,0 +1,67 @@
+# tests/test_flights_in_area.py
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import live_flights
+
+
+def state(icao24, latitude, longitude):
+    return SimpleNamespace(icao24=icao24, callsign='TEST1', origin_country='India',
+                           latitude=latitude, longitude=longitude, baro_altitude=10000.0,
+                           velocity=230.0, true_track=90.0, on_ground=False)
+
+
+@pytest.fixture
+def states():
+    live_flights.state_cache.update([state('a1', 28.5, 77.1), state('b2', -33.9, 151.2), state('c3', 51.5, -179.5)])
+    yield
+    live_flights.state_cache.update([])
+
+
+def query(client, **params):
+    return client.get('/api/flights_in_area', query_string=params)
+
+
+@pytest.mark.parametrize('value', ['nan', 'NaN', 'inf', '-inf', 'Infinity'])
+@pytest.mark.parametrize('key', ['min_lat', 'max_lat', 'min_lon', 'max_lon'])
+def test_non_finite_bounds_are_rejected(logged_in, states, key, value):
+    params = dict(min_lat=-10, max_lat=10, min_lon=-10, max_lon=10)
+    params[key] = value
+    response = query(logged_in, **params)
+    assert response.status_code == 400
+
+
+def test_non_finite_filters_are_rejected(logged_in, states):
+    response = query(logged_in, min_lat=-10, max_lat=10, min_lon=-10, max_lon=10, min_altitude='nan')
+    assert response.status_code == 400
+
+
+def test_out_of_range_bounds_cover_the_globe(logged_in, states):
+    start = time.perf_counter()
+    response = query(logged_in, min_lat=-1e12, max_lat=1e12, min_lon=-1e12, max_lon=1e12)
+    assert time.perf_counter() - start < 1
+    assert response.status_code == 200
+    assert [f['icao24'] for f in response.get_json()['flights']] == ['a1', 'b2', 'c3']
+
+
+def test_out_of_range_bounds_wrap_across_the_antimeridian(logged_in, states):
+    response = query(logged_in, min_lat=-90, max_lat=90, min_lon=1e12, max_lon=-170)
+    assert response.status_code == 200
+    assert [f['icao24'] for f in response.get_json()['flights']] == ['c3']
+
+
+def test_bounds_inside_the_globe(logged_in, states):
+    response = query(logged_in, min_lat=20, max_lat=30, min_lon=70, max_lon=80)
+    assert [f['icao24'] for f in response.get_json()['flights']] == ['a1']
+
+
+def test_in_area_clamps_bounds():
+    cache = live_flights.LiveStateCache()
+    cache.update([state('a1', 89.9, 179.9)])
+    assert [s.icao24 for s in cache.in_area(-1e12, 1e12, -1e12, 1e12)] == ['a1']
+
+
+def test_login_required(client):
+    assert query(client, min_lat=0, max_lat=1, min_lon=0, max_lon=1).status_code == 403
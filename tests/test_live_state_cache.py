@@ -0,0 +1,54 @@
+# tests/test_live_state_cache.py
+from types import SimpleNamespace
+
+import pytest
+
+import live_flights
+from db import pool
+
+
+@pytest.fixture
+def stored(flask_app, make_state):
+    states = [make_state('abc123'), make_state('def456', callsign='', on_ground=True, spi=True)]
+    with pool.connection() as conn:
+        live_flights.write_states(conn, states, '2026-01-01 00:00:00')
+    yield states
+    with pool.connection() as conn:
+        conn.execute("DELETE FROM live_flights WHERE flight_id IN ('abc123', 'def456')")
+        conn.execute("DELETE FROM flight_tracks WHERE icao24 IN ('abc123', 'def456')")
+        conn.commit()
+
+
+def refresh(cache):
+    cache._refreshing.acquire()
+    cache._refresh()
+
+
+def test_other_processes_refresh_from_the_table(stored, monkeypatch):
+    def fetch_states():
+        raise AssertionError("only the ingesting process may call OpenSky")
+
+    monkeypatch.setattr(live_flights, 'fetch_states', fetch_states)
+    monkeypatch.setattr(live_flights, '_ingest_enabled', False)
+    cache = live_flights.LiveStateCache(ttl=60)
+    refresh(cache)
+
+    state = cache.lookup(' ai101 ')
+    assert state.icao24 == 'abc123' and state.latitude == 28.5 and state.on_ground is False
+    grounded = cache.lookup('def456')
+    assert grounded.callsign is None and grounded.on_ground is True and grounded.spi is True
+
+
+def test_ingesting_process_refreshes_from_opensky(stored, make_state, monkeypatch):
+    monkeypatch.setattr(live_flights, 'fetch_states', lambda: SimpleNamespace(states=[make_state('fff000')]))
+    monkeypatch.setattr(live_flights, 'ingesting', lambda: True)
+    cache = live_flights.LiveStateCache(ttl=60)
+    refresh(cache)
+    assert cache.lookup('fff000') is not None and cache.lookup('abc123') is None
+
+
+def test_ingesting_needs_the_scheduler(monkeypatch):
+    monkeypatch.setattr(live_flights, '_ingest_enabled', True)
+    assert live_flights.ingesting() == live_flights.scheduler.running
+    monkeypatch.setattr(live_flights, '_ingest_enabled', False)
+    assert live_flights.ingesting() is False
@@ -0,0 +1,89 @@
+# tests/test_offer_cache.py
+import json
+import threading
+import time
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from cache import SingleFlightCache
+from conftest import OFFERS_FIXTURE
+
+
+def expires_at(cache, key):
+    return cache._entries[key][0]
+
+
+def test_refresh_reloads_a_fresh_entry():
+    cache = SingleFlightCache(ttl=300)
+    cache.get_or_load('k', lambda: 'old')
+    first = expires_at(cache, 'k')
+    time.sleep(0.01)
+    assert cache.refresh('k', lambda: 'new') == 'new'
+    assert cache.get('k') == 'new'
+    assert expires_at(cache, 'k') > first
+    assert cache.stats()['refreshes'] == 1
+
+
+def test_refresh_error_keeps_the_old_entry():
+    cache = SingleFlightCache(ttl=300)
+    cache.set('k', 'old')
+
+    def fail():
+        raise RuntimeError("upstream down")
+
+    with pytest.raises(RuntimeError):
+        cache.refresh('k', fail)
+    assert cache.get('k') == 'old'
+
+
+def test_readers_get_hits_while_a_refresh_loads():
+    cache = SingleFlightCache(ttl=300)
+    cache.set('k', 'old')
+    loading, release = threading.Event(), threading.Event()
+
+    def slow():
+        loading.set()
+        release.wait(5)
+        return 'new'
+
+    refresher = threading.Thread(target=cache.refresh, args=('k', slow))
+    refresher.start()
+    loading.wait(5)
+    assert cache.get_or_load('k', lambda: 'unexpected') == 'old'
+    release.set()
+    refresher.join()
+    assert cache.get('k') == 'new'
+
+
+def test_popular_routes_job_moves_expiry_forward(flask_app, monkeypatch):
+    import app
+    import search_log
+
+    with open(OFFERS_FIXTURE) as f:
+        payload = json.load(f)
+    calls = []
+
+    def get(**params):
+        calls.append(params)
+        return SimpleNamespace(data=payload['data'])
+
+    monkeypatch.setattr(app, 'amadeus', SimpleNamespace(
+        shopping=SimpleNamespace(flight_offers_search=SimpleNamespace(get=get))))
+    departure_date = (date.today() + timedelta(days=10)).isoformat()
+    search_log.log_search('tester', 'DEL', 'BOM', departure_date)
+    key = ('DEL', 'BOM', departure_date, 1, 10)
+    app.offer_cache.invalidate(key)
+
+    expiries = []
+    for _ in range(3):
+        search_log.refresh_popular_routes(app.prewarm_flight_offers)
+        expiries.append(expires_at(app.offer_cache, key))
+        time.sleep(0.01)
+
+    assert expiries == sorted(expiries) and len(set(expiries)) == 3
+    assert len([c for c in calls if c['originLocationCode'] == 'DEL']) == 3
+    # Searches in between are served from the refreshed entry
+    assert app.search_flight_offers('DEL', 'BOM', departure_date) == app.offer_cache.get(key)
+    assert len([c for c in calls if c['originLocationCode'] == 'DEL']) == 3
@@ -0,0 +1,74 @@
+# tests/test_recommendations.py
+import threading
+
+import pytest
+
+import recommendations
+
+FLIGHT = {'Flight ID': 'FL1'}
+
+
+@pytest.fixture
+def generate(monkeypatch):
+    """Stands in for Gemini: each call blocks until released and returns the queued result."""
+    started, release, results = threading.Semaphore(0), threading.Semaphore(0), []
+
+    def get_recommendations(username):
+        started.release()
+        release.acquire(timeout=5)
+        return results.pop(0)
+
+    monkeypatch.setattr(recommendations, 'get_recommendations', get_recommendations)
+    monkeypatch.setattr(recommendations, '_cache', recommendations.SingleFlightCache(ttl=60, maxsize=2))
+    monkeypatch.setattr(recommendations, '_pending', {})
+
+    def run(job, result):
+        """Let the started generation `job` finish with `result`."""
+        assert started.acquire(timeout=5)
+        results.append(result)
+        release.release()
+        job.result(timeout=5)
+    return run
+
+
+def request(username):
+    """Start generating the user's recommendations; returns the job."""
+    assert recommendations.request_recommendations(username) is None
+    _, job = recommendations._pending[username]
+    return job
+
+
+def test_result_is_cached_and_the_job_forgotten(generate):
+    generate(request('ann'), [FLIGHT])
+    assert recommendations._pending == {}
+    assert recommendations.request_recommendations('ann') == [FLIGHT]
+    assert recommendations.get_cached('ann') == [FLIGHT]
+
+
+def test_invalidated_result_is_discarded(generate):
+    job = request('ann')
+    recommendations.invalidate('ann')
+    generate(job, [{'Flight ID': 'stale'}])
+    assert recommendations.get_cached('ann') is None
+
+    generate(request('ann'), [FLIGHT])
+    assert recommendations.request_recommendations('ann') == [FLIGHT]
+
+
+def test_failure_is_reported_once_then_retried(generate):
+    generate(request('ann'), None)
+    assert recommendations.request_recommendations('ann') == []
+    assert recommendations._pending == {}
+    generate(request('ann'), [FLIGHT])
+    assert recommendations.request_recommendations('ann') == [FLIGHT]
+
+
+def test_nothing_is_kept_per_user_beyond_the_bounded_cache(generate):
+    for username in ('ann', 'bob', 'cat', 'dan'):
+        generate(request(username), [FLIGHT])
+    assert recommendations._pending == {}
+    assert [recommendations.get_cached(username) for username in ('ann', 'bob', 'cat', 'dan')] == \
+        [None, None, [FLIGHT], [FLIGHT]]
+    for username in ('cat', 'dan', 'eve'):
+        recommendations.invalidate(username)
+    assert len(recommendations._cache._entries) == 0 and recommendations._pending == {}
@@ -0,0 +1,107 @@
+# tests/test_state_snapshot.py
+import pytest
+
+from live_flights import (
+    ALTITUDE_TOLERANCE, HEARTBEAT_SECONDS, MISSING_CYCLES, POSITION_TOLERANCE, VELOCITY_TOLERANCE, StateSnapshot,
+)
+
+NOW = 1_700_000_000
+
+
+@pytest.fixture
+def snapshot(make_state):
+    """A snapshot that has written 'abc123' heading 358 degrees at NOW."""
+    snapshot = StateSnapshot()
+    state = make_state(true_track=358.0)
+    assert snapshot.diff([state], now=NOW) == ([state], [], [])
+    return snapshot
+
+
+def test_unchanged_state_is_not_rewritten(snapshot, make_state):
+    assert snapshot.diff([make_state(true_track=358.0)], now=NOW + 10) == ([], [], [])
+
+
+@pytest.mark.parametrize('fields', [
+    dict(latitude=28.5 + POSITION_TOLERANCE / 2, longitude=77.1 - POSITION_TOLERANCE / 2),
+    dict(baro_altitude=10000.0 + ALTITUDE_TOLERANCE),
+    dict(velocity=230.0 - VELOCITY_TOLERANCE),
+    dict(true_track=2.0),  # 4 degrees across north
+    dict(callsign='AI101'),  # same callsign once normalized
+    dict(geo_altitude=12000.0, vertical_rate=5.0),  # not compared
+])
+def test_changes_within_tolerance_are_ignored(snapshot, make_state, fields):
+    assert snapshot.diff([make_state(**{'true_track': 358.0, **fields})], now=NOW + 10) == ([], [], [])
+
+
+@pytest.mark.parametrize('fields', [
+    dict(latitude=28.5 + POSITION_TOLERANCE * 2),
+    dict(baro_altitude=10000.0 + ALTITUDE_TOLERANCE * 2),
+    dict(baro_altitude=None),  # a value disappearing
+    dict(velocity=230.0 + VELOCITY_TOLERANCE * 2),
+    dict(true_track=10.0),  # 12 degrees across north
+    dict(callsign='AI102   '),
+    dict(squawk='7700'),
+    dict(on_ground=True),
+    dict(spi=True),
+])
+def test_changes_beyond_tolerance_are_written(snapshot, make_state, fields):
+    state = make_state(**{'true_track': 358.0, **fields})
+    assert snapshot.diff([state], now=NOW + 10) == ([], [state], [])
+    # ...and become the new baseline
+    assert snapshot.diff([make_state(**{'true_track': 358.0, **fields})], now=NOW + 20) == ([], [], [])
+
+
+def test_small_drift_does_not_accumulate_unseen(snapshot, make_state):
+    step = POSITION_TOLERANCE * 0.6
+    assert snapshot.diff([make_state(latitude=28.5 + step, true_track=358.0)], now=NOW + 10) == ([], [], [])
+    # Compared with the last written position, not the last seen one
+    moved = make_state(latitude=28.5 + 2 * step, true_track=358.0)
+    assert snapshot.diff([moved], now=NOW + 20) == ([], [moved], [])
+
+
+def test_unchanged_state_is_rewritten_on_heartbeat(snapshot, make_state):
+    assert snapshot.diff([make_state(true_track=358.0)], now=NOW + HEARTBEAT_SECONDS - 1) == ([], [], [])
+    state = make_state(true_track=358.0)
+    assert snapshot.diff([state], now=NOW + HEARTBEAT_SECONDS) == ([], [state], [])
+    # The heartbeat restarts from the rewrite
+    assert snapshot.diff([make_state(true_track=358.0)], now=NOW + HEARTBEAT_SECONDS + 10) == ([], [], [])
+
+
+def test_aircraft_is_removed_after_missing_cycles(snapshot, make_state):
+    other = make_state('def456')
+    for cycle in range(1, MISSING_CYCLES):
+        assert snapshot.diff([other], now=NOW + cycle)[2] == []
+    assert snapshot.diff([other], now=NOW + MISSING_CYCLES) == ([], [], ['abc123'])
+    assert len(snapshot) == 1
+
+    # Back again: a new aircraft as far as the table is concerned
+    state = make_state(true_track=358.0)
+    assert snapshot.diff([state, other], now=NOW + MISSING_CYCLES + 1) == ([state], [], [])
+    assert len(snapshot) == 2
+
+
+def test_reappearing_resets_the_missing_count(snapshot, make_state):
+    for cycle in range(1, MISSING_CYCLES):
+        snapshot.diff([], now=NOW + cycle)
+    assert snapshot.diff([make_state(true_track=358.0)], now=NOW + MISSING_CYCLES) == ([], [], [])
+    for cycle in range(1, MISSING_CYCLES):
+        assert snapshot.diff([], now=NOW + MISSING_CYCLES + cycle) == ([], [], [])
+    assert snapshot.diff([], now=NOW + 2 * MISSING_CYCLES) == ([], [], ['abc123'])
+
+
+def test_freed_slots_are_reused(snapshot, make_state):
+    for cycle in range(1, MISSING_CYCLES + 1):
+        snapshot.diff([], now=NOW + cycle)
+    assert len(snapshot) == 0
+    state = make_state('def456', callsign='AI202   ')
+    assert snapshot.diff([state], now=NOW + 10) == ([state], [], [])
+    assert snapshot._icao24 == ['def456']
+    # Nothing of the previous occupant leaks into the comparison
+    assert snapshot.diff([make_state('def456', callsign='AI202')], now=NOW + 20) == ([], [], [])
+
+
+def test_duplicates_and_missing_icao24_are_skipped(make_state):
+    snapshot = StateSnapshot()
+    first = make_state()
+    assert snapshot.diff([first, make_state(latitude=40.0), make_state(icao24='')], now=NOW) == ([first], [], [])
+    assert len(snapshot) == 1
@@ -0,0 +1,104 @@
+# tests/test_tracks.py
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import live_flights
+import tracks
+from db import pool
+
+# Start of an hour bucket and of a DOWNSAMPLE_SECONDS slot, long before any real data
+T0 = 277_778 * tracks.BUCKET_SECONDS
+ICAO24S = ('aaa111', 'bbb222', 'ccc333')
+
+
+@pytest.fixture
+def conn(flask_app):
+    with pool.connection() as conn:
+        yield conn
+        placeholders = ', '.join('?' * len(ICAO24S))
+        conn.execute(f"DELETE FROM flight_tracks WHERE icao24 IN ({placeholders})", ICAO24S)
+        conn.execute(f"DELETE FROM live_flights WHERE flight_id IN ({placeholders})", ICAO24S)
+        conn.commit()
+
+
+def add_points(conn, make_state, icao24, *offsets):
+    with conn:
+        tracks.append_states(conn, [make_state(icao24, time_position=T0 + offset) for offset in offsets])
+
+
+def track(conn, icao24):
+    return [ts - T0 for ts, *_ in tracks.get_track(conn, icao24, T0 - 3600, T0 + 100 * 3600)]
+
+
+def naive_utc(ts):
+    return datetime.fromtimestamp(ts, timezone.utc).replace(tzinfo=None).isoformat(sep=' ')
+
+
+def test_append_keeps_every_aircraft_with_a_position(conn, make_state):
+    with conn:
+        points = tracks.append_states(conn, [
+            make_state('aaa111', time_position=T0),
+            make_state('bbb222', time_position=T0, on_ground=True, velocity=0.0),
+            make_state('ccc333', time_position=T0, latitude=None, longitude=None),
+        ])
+    assert points == 2
+    assert track(conn, 'aaa111') == [0]
+    assert tracks.get_track(conn, 'bbb222', T0, T0)[0][-1] == 1
+    assert track(conn, 'ccc333') == []
+
+    # An unchanged position timestamp adds nothing
+    add_points(conn, make_state, 'aaa111', 0)
+    assert track(conn, 'aaa111') == [0]
+
+
+def test_downsample_keeps_the_first_point_of_each_slot(conn, make_state, monkeypatch):
+    monkeypatch.setattr(tracks, 'DOWNSAMPLE_SECONDS', 300)
+    monkeypatch.setattr(tracks, 'RAW_HOURS', 2)
+    add_points(conn, make_state, 'aaa111', 0, 60, 120, 299, 300, 301, 900, 3599)
+    # Another aircraft's earlier point in the same slot does not count
+    add_points(conn, make_state, 'bbb222', 60, 90)
+    # Recent enough to stay raw
+    now = T0 + 4 * 3600
+    add_points(conn, make_state, 'aaa111', 3 * 3600, 3 * 3600 + 10)
+
+    assert tracks.downsample(conn, now=now) == 5
+    assert track(conn, 'aaa111') == [0, 300, 900, 3599, 3 * 3600, 3 * 3600 + 10]
+    assert track(conn, 'bbb222') == [60]
+    resolutions = dict(conn.execute(
+        "SELECT ts - ?, resolution FROM flight_tracks WHERE icao24 = 'aaa111'", (T0,)).fetchall())
+    assert resolutions == {0: 300, 300: 300, 900: 300, 3599: 300, 3 * 3600: 0, 3 * 3600 + 10: 0}
+
+    # Thinned buckets are not visited again
+    assert tracks.downsample(conn, now=now) == 0
+
+
+def test_downsample_leaves_points_appended_after_a_bucket_is_thinned(conn, make_state, monkeypatch):
+    monkeypatch.setattr(tracks, 'DOWNSAMPLE_SECONDS', 300)
+    monkeypatch.setattr(tracks, 'RAW_HOURS', 2)
+    add_points(conn, make_state, 'aaa111', 0, 30)
+    assert tracks.downsample(conn, now=T0 + 4 * 3600) == 1
+    # A late point for a thinned bucket is itself thinned on the next run
+    add_points(conn, make_state, 'aaa111', 10)
+    assert tracks.downsample(conn, now=T0 + 4 * 3600) == 1
+    assert track(conn, 'aaa111') == [0]
+
+
+def test_prune_drops_expired_buckets_and_stale_aircraft(conn, make_state, monkeypatch):
+    monkeypatch.setattr(tracks, 'RETENTION_HOURS', 48)
+    monkeypatch.setattr(tracks, 'LIVE_FLIGHT_TTL_HOURS', 24)
+    now = T0 + 50 * 3600
+    add_points(conn, make_state, 'aaa111', 0, 1800, 3600, 2 * 3600, 49 * 3600)
+    live_flights.write_states(conn, [make_state('bbb222', latitude=None, longitude=None)],
+                              naive_utc(now - 25 * 3600))
+    live_flights.write_states(conn, [make_state('ccc333', latitude=None, longitude=None)],
+                              naive_utc(now - 23 * 3600))
+
+    points, aircraft = tracks.prune(conn, now=now)
+    # Buckets older than now - RETENTION_HOURS go whole; the one straddling the cutoff stays
+    assert points == 3
+    assert track(conn, 'aaa111') == [2 * 3600, 49 * 3600]
+    assert aircraft == 1
+    remaining = {row[0] for row in conn.execute(
+        "SELECT flight_id FROM live_flights WHERE flight_id IN ('bbb222', 'ccc333')")}
+    assert remaining == {'ccc333'}
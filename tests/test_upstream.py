@@ -0,0 +1,82 @@
+# tests/test_upstream.py
+import asyncio
+import threading
+
+import pytest
+import requests
+from amadeus.client.response import Response
+
+import upstream
+
+
+def make_upstream(**kwargs):
+    kwargs.setdefault('retries', 2)
+    kwargs.setdefault('backoff_base', 0)
+    return upstream.Upstream('test', timeout=1, transient=(ConnectionError,), **kwargs)
+
+
+def test_acall_runs_the_guarded_call_in_a_worker_thread():
+    u = make_upstream()
+    threads = []
+
+    def func(value):
+        threads.append(threading.current_thread())
+        return value * 2
+
+    assert asyncio.run(u.acall(func, 21)) == 42
+    assert threads[0] is not threading.main_thread()
+    assert u.stats['calls'] == 1
+
+
+def test_acall_retries_transient_errors():
+    u = make_upstream()
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ConnectionError("reset")
+        return 'ok'
+
+    assert asyncio.run(u.acall(flaky)) == 'ok'
+    assert len(attempts) == 3 and u.stats['retries'] == 2
+
+
+def test_acall_fails_fast_while_the_circuit_is_open():
+    u = make_upstream(retries=0, breaker_threshold=1, breaker_reset=60)
+
+    def down():
+        raise ConnectionError("down")
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(u.acall(down))
+    with pytest.raises(upstream.UpstreamUnavailable):
+        asyncio.run(u.acall(down))
+
+
+def test_abandoned_call_is_not_a_success():
+    u = make_upstream(retries=0, breaker_threshold=1, breaker_reset=0)
+    with pytest.raises(ConnectionError):
+        with u.guard():
+            raise ConnectionError("down")
+
+    def stream():
+        with u.guard():
+            yield 1
+            yield 2
+
+    chunks = stream()
+    next(chunks)
+    chunks.close()  # GeneratorExit inside the guard
+    assert u.breaker.failures == 1
+    assert u.breaker.state == 'half-open'
+
+
+@pytest.mark.parametrize('name', ['Content-Type', 'content-type'])
+def test_sdk_parses_json_whatever_the_header_case(name):
+    raw = requests.Response()
+    raw.status_code = 200
+    raw.headers[name] = 'application/vnd.amadeus+json'
+    raw._content = b'{"data": [{"id": "1"}]}'
+    response = Response(upstream._UrllibResponse(raw), None)._parse(None)
+    assert response.parsed and response.data == [{'id': '1'}]
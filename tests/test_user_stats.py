@@ -0,0 +1,63 @@
+# tests/test_user_stats.py
+import db
+import rollups
+import user_stats
+from db import pool
+
+
+def rollup_rows(conn):
+    return sorted(
+        (dimension, bucket, key, count, round(amount, 2))
+        for dimension, bucket, key, count, amount in conn.execute(
+            "SELECT dimension, bucket, key, count, amount FROM analytics_rollups"
+        )
+        if count or round(amount, 2)
+    )
+
+
+def recount(conn, username):
+    """The user's stats and the rollups as a full recount gives them, without keeping it."""
+    conn.execute("SAVEPOINT recount")
+    try:
+        conn.execute("DELETE FROM user_stats")
+        conn.execute(db._USER_STATS_FROM_BOOKINGS)
+        conn.execute(db._USER_STATS_FROM_COUPONS)
+        rollups.backfill(conn)
+        return user_stats.get_stats(conn, username), rollup_rows(conn)
+    finally:
+        conn.execute("ROLLBACK TO recount")
+        conn.execute("RELEASE recount")
+
+
+def assert_matches_recount(username):
+    with pool.connection() as conn:
+        assert (user_stats.get_stats(conn, username), rollup_rows(conn)) == recount(conn, username)
+
+
+def active_booking_ids(username):
+    with pool.connection() as conn:
+        return [row[0] for row in conn.execute(
+            "SELECT id FROM bookings WHERE username = ? AND cancelled = 0 ORDER BY id", (username,)
+        )]
+
+
+def test_stats_match_a_recount_after_book_cancel_and_rebook(client, user, search):
+    _, found = search
+    response = client.post('/api/bookings/bulk', json={'bookings': [
+        {'flight_id': offer.flight_id} for offer in (found[0], found[1], found[1], found[2])
+    ]})
+    assert response.get_json()['created'] == 4
+    assert_matches_recount(user)
+
+    first, second = active_booking_ids(user)[:2]
+    for booking_id in (first, second):
+        assert client.post(f'/cancel_flight/{booking_id}').status_code == 302
+    assert_matches_recount(user)
+
+    for _ in range(2):  # the second submission is a no-op
+        client.post(f'/rebook_flight/{first}', data={'new_flight_id': found[3].flight_id})
+    assert len(active_booking_ids(user)) == 3
+    assert_matches_recount(user)
+    with pool.connection() as conn:
+        stats = user_stats.get_stats(conn, user)
+    assert stats['booking_count'] == 3
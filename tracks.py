@@ -0,0 +1,189 @@
+# tracks.py
+"""
+Append-only flight track history.
+
+Every ingestion cycle appends one position per aircraft that reports one,
+airborne or on the ground, to the flight_tracks table (a single
+`executemany`, in the same transaction as the live_flights upsert). Rows
+are keyed by (icao24, ts), so an aircraft's track for any time window is
+one primary-key range scan, and carry an hour `bucket` that retention
+works on a bucket at a time:
+
+- points older than TRACK_RAW_HOURS are downsampled to one per
+  TRACK_DOWNSAMPLE_SECONDS per aircraft
+- buckets older than TRACK_RETENTION_HOURS are dropped
+- live_flights rows for aircraft not seen for LIVE_FLIGHT_TTL_HOURS are
+  pruned, so that table no longer grows with every aircraft ever seen
+
+A maintenance job refreshes planner statistics and returns freed pages to
+the filesystem with an incremental vacuum, once the database has been
+switched to incremental auto-vacuum with `flask enable-incremental-vacuum`
+(a one-off full VACUUM, run during a maintenance window).
+"""
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+import click
+
+import db
+# live_flights imports this module; only its attributes are used, at call time
+import live_flights
+from jobs import add_interval_job
+
+logger = logging.getLogger(__name__)
+
+BUCKET_SECONDS = 3600
+
+RAW_HOURS = float(os.getenv('TRACK_RAW_HOURS', '2'))
+DOWNSAMPLE_SECONDS = int(os.getenv('TRACK_DOWNSAMPLE_SECONDS', '300'))
+RETENTION_HOURS = float(os.getenv('TRACK_RETENTION_HOURS', '48'))
+LIVE_FLIGHT_TTL_HOURS = float(os.getenv('LIVE_FLIGHT_TTL_HOURS', '24'))
+# Pages handed back per maintenance run
+VACUUM_PAGES = int(os.getenv('TRACK_VACUUM_PAGES', '2000'))
+
+APPEND_POINT = '''
+    INSERT OR IGNORE INTO flight_tracks (
+        icao24, ts, bucket, latitude, longitude, altitude, velocity, heading, vertical_rate, on_ground
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+
+def bucket_of(ts):
+    return int(ts) // BUCKET_SECONDS
+
+
+def append_states(conn, states, snapshot_time=None):
+    """
+    Queue one track point per state vector with a position on `conn`; the
+    caller commits. Returns the number of points offered (repeats of an
+    unchanged position timestamp are ignored by the primary key).
+    """
+    rows = []
+    for s in states:
+        if not s.icao24 or s.latitude is None or s.longitude is None:
+            continue
+        ts = int(s.time_position or s.last_contact or snapshot_time or time.time())
+        rows.append((
+            s.icao24, ts, bucket_of(ts), s.latitude, s.longitude, s.baro_altitude,
+            s.velocity, s.true_track, s.vertical_rate, int(bool(s.on_ground)),
+        ))
+    conn.executemany(APPEND_POINT, rows)
+    return len(rows)
+
+
+def get_track(conn, icao24, since, until):
+    """Return [(ts, latitude, longitude, altitude, velocity, heading, on_ground)] oldest first."""
+    return conn.execute('''
+        SELECT ts, latitude, longitude, altitude, velocity, heading, on_ground
+        FROM flight_tracks
+        WHERE icao24 = ? AND ts BETWEEN ? AND ?
+        ORDER BY ts
+    ''', (icao24, int(since), int(until))).fetchall()
+
+
+def resolve_icao24(conn, flight):
+    """icao24 for a callsign/flight number, or `flight` itself if it is already a known icao24."""
+    row = conn.execute(
+        "SELECT flight_id FROM live_flights WHERE callsign = ? ORDER BY last_updated DESC LIMIT 1",
+        (live_flights.normalize_callsign(flight),)
+    ).fetchone()
+    if row:
+        return row[0]
+    row = conn.execute("SELECT flight_id FROM live_flights WHERE flight_id = ?", (flight.lower(),)).fetchone()
+    return row[0] if row else None
+
+
+def downsample(conn, now=None):
+    """Thin raw points older than RAW_HOURS, one bucket per transaction. Returns points removed."""
+    cutoff = bucket_of((now or time.time()) - RAW_HOURS * 3600)
+    buckets = [row[0] for row in conn.execute(
+        "SELECT DISTINCT bucket FROM flight_tracks WHERE bucket < ? AND resolution = 0", (cutoff,))]
+    removed = 0
+    for bucket in buckets:
+        with conn:
+            # Keep the first point of every DOWNSAMPLE_SECONDS slot per aircraft
+            removed += conn.execute('''
+                DELETE FROM flight_tracks AS t
+                WHERE bucket = ? AND resolution = 0 AND EXISTS (
+                    SELECT 1 FROM flight_tracks AS earlier
+                    WHERE earlier.icao24 = t.icao24
+                      AND earlier.ts >= t.ts - t.ts % ? AND earlier.ts < t.ts
+                )
+            ''', (bucket, DOWNSAMPLE_SECONDS)).rowcount
+            conn.execute(
+                "UPDATE flight_tracks SET resolution = ? WHERE bucket = ? AND resolution = 0",
+                (DOWNSAMPLE_SECONDS, bucket)
+            )
+    return removed
+
+
+def prune(conn, now=None):
+    """Drop expired track buckets and stale live_flights rows. Returns (points, aircraft) removed."""
+    now = now or time.time()
+    with conn:
+        points = conn.execute(
+            "DELETE FROM flight_tracks WHERE bucket < ?", (bucket_of(now - RETENTION_HOURS * 3600),)
+        ).rowcount
+        # Naive UTC, as live_flights writes last_updated
+        stale = datetime.fromtimestamp(now, timezone.utc).replace(tzinfo=None) - timedelta(hours=LIVE_FLIGHT_TTL_HOURS)
+        stale = stale.isoformat(sep=' ')
+        aircraft = conn.execute("DELETE FROM live_flights WHERE last_updated < ?", (stale,)).rowcount
+    return points, aircraft
+
+
+def vacuum(conn):
+    """Refresh statistics and release free pages (only once auto_vacuum is INCREMENTAL)."""
+    conn.execute("PRAGMA analysis_limit = 1000")
+    conn.execute("ANALYZE flight_tracks")
+    conn.execute("ANALYZE live_flights")
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+        conn.execute(f"PRAGMA incremental_vacuum({int(VACUUM_PAGES)})").fetchall()
+
+
+def enable_incremental_vacuum(conn):
+    """
+    Switch the database to incremental auto-vacuum. Only takes effect after a
+    full VACUUM, which rewrites the whole file and holds the write lock while
+    it runs. Returns False if the mode was already set.
+    """
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+        return False
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+    return True
+
+
+@click.command('enable-incremental-vacuum')
+def enable_incremental_vacuum_command():
+    """Switch the database to incremental auto-vacuum (one-off full VACUUM)."""
+    start = time.perf_counter()
+    with db.pool.connection() as conn:
+        if not enable_incremental_vacuum(conn):
+            click.echo("Incremental auto-vacuum is already enabled.")
+            return
+    click.echo(f"Incremental auto-vacuum enabled in {time.perf_counter() - start:.1f}s.")
+
+
+def maintain_tracks():
+    """Scheduled: prune, downsample, then ANALYZE and incremental vacuum."""
+    try:
+        start = time.perf_counter()
+        with db.pool.connection() as conn:
+            # Prune first so expiring buckets are not thinned for nothing
+            points, aircraft = prune(conn)
+            thinned = downsample(conn)
+            vacuum(conn)
+        logger.info(
+            f"Track maintenance: {thinned} points downsampled away, {points} expired, "
+            f"{aircraft} stale aircraft pruned in {time.perf_counter() - start:.2f}s"
+        )
+    except Exception as e:
+        logger.exception(f"Error maintaining flight tracks: {e}")
+
+
+def init_app(app):
+    app.config.setdefault('TRACK_MAINTENANCE_INTERVAL', int(os.getenv('TRACK_MAINTENANCE_INTERVAL', '900')))
+    app.cli.add_command(enable_incremental_vacuum_command)
+    add_interval_job('maintain_tracks', maintain_tracks, app.config['TRACK_MAINTENANCE_INTERVAL'])
@@ -0,0 +1,279 @@
+# upstream.py
+"""
+One place to call the external providers (Amadeus, OpenSky, Gemini).
+
+Each provider gets an `Upstream` guard with:
+
+- a per-service timeout (passed to the underlying client),
+- retries with full-jitter exponential backoff for transient errors,
+- a circuit breaker that fails fast while the provider is down,
+- a concurrency limit, so a slow provider cannot tie up every worker.
+
+Sync code calls `upstream.amadeus.call(func, ...)` (or uses the `guard()`
+context manager directly for a single attempt); async code awaits
+`upstream.amadeus.acall(func, ...)`, which runs the same guarded call in a
+worker thread. Amadeus requests also go through a keep-alive
+`requests.Session` instead of a new urllib connection per call.
+
+Settings can be overridden per provider through the environment, e.g.
+UPSTREAM_AMADEUS_TIMEOUT, UPSTREAM_GEMINI_RETRIES, UPSTREAM_OPENSKY_CONCURRENCY,
+UPSTREAM_AMADEUS_BREAKER_THRESHOLD or UPSTREAM_OPENSKY_BREAKER_RESET.
+"""
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from urllib.error import URLError
+
+import requests
+from amadeus.client.errors import NetworkError, ServerError
+from google.api_core import exceptions as google_exceptions
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class UpstreamError(Exception):
+    """Base class for failures raised by the upstream layer itself."""
+
+
+class UpstreamUnavailable(UpstreamError):
+    """The circuit is open or the concurrency limit was hit; the call was not made."""
+
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failures. While open every call fails
+    fast; after `reset_seconds` a single trial call is let through (half-open)
+    and its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, threshold=5, reset_seconds=30):
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return 'half-open'
+        return 'open'
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def cancel_trial(self):
+        """Give back a half-open trial slot that was not used."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_in_flight or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+
+class Upstream:
+    def __init__(self, name, timeout, retries=2, backoff_base=0.2, backoff_max=2.0,
+                 concurrency=8, breaker_threshold=5, breaker_reset=30, transient=(Exception,)):
+        env = f"UPSTREAM_{name.upper()}_"
+        self.name = name
+        self.timeout = float(os.getenv(env + 'TIMEOUT', timeout))
+        self.retries = int(os.getenv(env + 'RETRIES', retries))
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.concurrency = int(os.getenv(env + 'CONCURRENCY', concurrency))
+        self.breaker = CircuitBreaker(
+            threshold=int(os.getenv(env + 'BREAKER_THRESHOLD', breaker_threshold)),
+            reset_seconds=float(os.getenv(env + 'BREAKER_RESET', breaker_reset)),
+        )
+        self.transient = transient
+        self._slots = threading.BoundedSemaphore(self.concurrency)
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            'calls': 0,
+            'errors': 0,
+            'retries': 0,
+            'rejected': 0,
+            'seconds_total': 0.0,
+            'seconds_max': 0.0,
+        }
+
+    def _bump(self, **deltas):
+        with self._stats_lock:
+            for key, value in deltas.items():
+                self.stats[key] += value
+
+    def is_transient(self, error):
+        return isinstance(error, self.transient)
+
+    @contextmanager
+    def guard(self):
+        """
+        Breaker check, concurrency slot and bookkeeping around a single attempt
+        (no retries). Use directly for calls that cannot be retried, such as a
+        reply that is being streamed to the user.
+        """
+        if not self.breaker.allow():
+            self._bump(rejected=1)
+            metrics.upstream_errors.inc(self.name, 'rejected')
+            raise UpstreamUnavailable(f"{self.name} is unavailable (circuit open)")
+        if not self._slots.acquire(timeout=self.timeout):
+            self._bump(rejected=1)
+            metrics.upstream_errors.inc(self.name, 'rejected')
+            self.breaker.cancel_trial()
+            raise UpstreamUnavailable(f"{self.name} is busy ({self.concurrency} calls in flight)")
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self._bump(errors=1)
+            if self.is_transient(e):
+                metrics.upstream_errors.inc(self.name, 'transient')
+                self.breaker.record_failure()
+            else:
+                # The provider answered; the request itself was bad
+                metrics.upstream_errors.inc(self.name, 'error')
+                self.breaker.record_success()
+            raise
+        except BaseException:
+            # e.g. the client went away mid-stream; says nothing about the provider either way,
+            # so only hand back a half-open trial for another call to make
+            self.breaker.cancel_trial()
+            raise
+        else:
+            self.breaker.record_success()
+        finally:
+            self._slots.release()
+            elapsed = time.perf_counter() - start
+            metrics.observe_upstream(self.name, elapsed)
+            with self._stats_lock:
+                self.stats['calls'] += 1
+                self.stats['seconds_total'] += elapsed
+                self.stats['seconds_max'] = max(self.stats['seconds_max'], elapsed)
+
+    def call(self, func, *args, **kwargs):
+        """Run `func(*args, **kwargs)` under the guard, retrying transient failures."""
+        attempt = 0
+        while True:
+            try:
+                with self.guard():
+                    return func(*args, **kwargs)
+            except UpstreamUnavailable:
+                raise
+            except Exception as e:
+                if attempt >= self.retries or not self.is_transient(e):
+                    raise
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+                attempt += 1
+                self._bump(retries=1)
+                logger.warning(f"{self.name} call failed ({e}); retry {attempt}/{self.retries} in {delay:.2f}s")
+                time.sleep(delay)
+
+    async def acall(self, func, *args, **kwargs):
+        """Async variant of `call`; the blocking client runs in a worker thread."""
+        return await asyncio.to_thread(self.call, func, *args, **kwargs)
+
+
+class _UrllibResponse:
+    """Presents a requests.Response the way the Amadeus SDK reads urllib responses."""
+
+    def __init__(self, response):
+        self._response = response
+        self.status = self.code = response.status_code
+
+    def getheaders(self):
+        return list(self._response.headers.items())
+
+    def info(self):
+        # Read after getheaders() by the SDK; case-insensitive like urllib's, so a
+        # lowercase content-type (HTTP/2, proxies) still gets the body parsed as JSON
+        return self._response.headers
+
+    def read(self):
+        return self._response.content
+
+
+class KeepAliveTransport:
+    """Drop-in for `urlopen` in the Amadeus client, reusing pooled connections."""
+
+    def __init__(self, timeout, pool_size):
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def __call__(self, http_request):
+        try:
+            response = self.session.request(
+                http_request.get_method(),
+                http_request.full_url,
+                data=http_request.data,
+                headers=dict(http_request.header_items()),
+                timeout=self.timeout,
+            )
+        except requests.RequestException as e:
+            # The SDK turns URLError into a NetworkError response
+            raise URLError(e)
+        return _UrllibResponse(response)
+
+
+def _amadeus_transient(error):
+    status = getattr(getattr(error, 'response', None), 'status_code', None)
+    return isinstance(error, (NetworkError, ServerError)) or status == 429
+
+
+amadeus = Upstream('amadeus', timeout=10, retries=2, concurrency=8)
+amadeus.is_transient = _amadeus_transient
+amadeus_transport = KeepAliveTransport(amadeus.timeout, amadeus.concurrency)
+
+# OpenSkyApi uses its own requests call (15s timeout); its payload is large, so allow few at once
+opensky = Upstream('opensky', timeout=15, retries=1, backoff_base=1.0, backoff_max=5.0, concurrency=2,
+                   transient=(requests.RequestException, UpstreamError))
+
+gemini = Upstream('gemini', timeout=30, retries=2, concurrency=8, transient=(
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.ResourceExhausted,
+    google_exceptions.InternalServerError,
+    google_exceptions.TooManyRequests,
+))
+
+providers = (amadeus, opensky, gemini)
+
+metrics.Gauge('upstream_circuit_open', "1 while the provider's circuit breaker is open or half-open.",
+              ('upstream',), lambda: {(u.name,): int(u.breaker.state != 'closed') for u in providers})
+
+
+def snapshot():
+    """Call stats and breaker state for every provider."""
+    return {
+        u.name: dict(u.stats, breaker=u.breaker.state, failures=u.breaker.failures, timeout=u.timeout)
+        for u in providers
+    }
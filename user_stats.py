@@ -0,0 +1,94 @@
+# user_stats.py
+"""
+Per-user booking and coupon statistics, maintained incrementally.
+
+The user_stats table holds one row per user with running totals plus the
+per-flight and per-coupon-code counts shown on the profile page (as JSON
+objects). The record_* helpers are called by the routes that write bookings
+and coupons, on the same connection and before the commit, so the stats
+change in the same transaction as the rows they summarise. Reading them is
+a single primary-key lookup however many bookings the user has.
+"""
+import json
+
+# Reference fare that savings are measured against
+STANDARD_PRICE = 500
+
+
+def _load(conn, username):
+    row = conn.execute(
+        "SELECT flight_counts, coupon_counts FROM user_stats WHERE username = ?", (username,)
+    ).fetchone()
+    if row is None:
+        return {}, {}
+    return json.loads(row[0] or '{}'), json.loads(row[1] or '{}')
+
+
+def _bump(counts, key, delta):
+    key = '' if key is None else str(key)
+    count = counts.get(key, 0) + delta
+    if count > 0:
+        counts[key] = count
+    else:
+        counts.pop(key, None)
+
+
+def _apply(conn, username, bookings=0, spend=0.0, coupons=0, discount=0.0, flight_id=None, coupon_code=None):
+    flight_counts, coupon_counts = _load(conn, username)
+    if bookings:
+        _bump(flight_counts, flight_id, bookings)
+    if coupons:
+        _bump(coupon_counts, coupon_code, coupons)
+    _save(conn, username, bookings, spend, coupons, discount, flight_counts, coupon_counts)
+
+
+def _save(conn, username, bookings, spend, coupons, discount, flight_counts, coupon_counts):
+    conn.execute('''
+        INSERT INTO user_stats (
+            username, booking_count, total_spend, coupon_count, coupon_discount, flight_counts, coupon_counts
+        ) VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(username) DO UPDATE SET
+            booking_count = booking_count + excluded.booking_count,
+            total_spend = total_spend + excluded.total_spend,
+            coupon_count = coupon_count + excluded.coupon_count,
+            coupon_discount = coupon_discount + excluded.coupon_discount,
+            flight_counts = excluded.flight_counts,
+            coupon_counts = excluded.coupon_counts
+    ''', (username, bookings, spend, coupons, discount, json.dumps(flight_counts), json.dumps(coupon_counts)))
+
+
+def record_bookings(conn, username, bookings):
+    """Record several (flight_id, price) bookings with one read and one write of the user's row."""
+    flight_counts, coupon_counts = _load(conn, username)
+    for flight_id, _ in bookings:
+        _bump(flight_counts, flight_id, 1)
+    spend = sum(price or 0.0 for _, price in bookings)
+    _save(conn, username, len(bookings), spend, 0, 0.0, flight_counts, coupon_counts)
+
+
+def record_cancellation(conn, username, flight_id, price):
+    _apply(conn, username, bookings=-1, spend=-(price or 0.0), flight_id=flight_id)
+
+
+def record_coupon(conn, username, coupon_code, discount):
+    _apply(conn, username, coupons=1, discount=discount or 0.0, coupon_code=coupon_code)
+
+
+def get_stats(conn, username):
+    """Return the user's stats as a dict (zeros if they have none yet)."""
+    row = conn.execute('''
+        SELECT booking_count, total_spend, coupon_count, coupon_discount, flight_counts, coupon_counts
+        FROM user_stats WHERE username = ?
+    ''', (username,)).fetchone()
+    booking_count, total_spend, coupon_count, coupon_discount, flight_counts, coupon_counts = (
+        row or (0, 0.0, 0, 0.0, '{}', '{}')
+    )
+    return {
+        'booking_count': booking_count,
+        'total_spend': total_spend,
+        'savings': STANDARD_PRICE * booking_count - total_spend if booking_count else 0,
+        'coupon_count': coupon_count,
+        'coupon_discount': coupon_discount,
+        'flight_counts': sorted(json.loads(flight_counts or '{}').items()),
+        'coupon_counts': sorted(json.loads(coupon_counts or '{}').items()),
+    }